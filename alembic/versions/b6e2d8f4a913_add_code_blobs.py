@@ -0,0 +1,148 @@
+"""Store code in a content-addressed, compressed blob table
+
+Revision ID: b6e2d8f4a913
+Revises: f3b8d6a2e471
+Create Date: 2025-08-05 10:07:32.184620
+
+"""
+import hashlib
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d8f4a913'
+down_revision: Union[str, None] = 'f3b8d6a2e471'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows moved per round trip
+BATCH_SIZE = 500
+
+code_blobs = sa.table(
+    'code_blobs',
+    sa.column('hash', sa.String),
+    sa.column('codec', sa.String),
+    sa.column('data', sa.LargeBinary),
+    sa.column('size', sa.Integer),
+)
+
+
+def _encode(text):
+    # Existing rows are written with zlib so the migration needs no optional package;
+    # the codec is stored per blob, so later writes may use zstd
+    raw = text.encode('utf-8')
+    data = zlib.compress(raw, 6)
+    if len(data) < len(raw):
+        return {'hash': hashlib.sha256(raw).hexdigest(), 'codec': 'zlib', 'data': data, 'size': len(raw)}
+    return {'hash': hashlib.sha256(raw).hexdigest(), 'codec': 'none', 'data': raw, 'size': len(raw)}
+
+
+def _decode(codec, data):
+    data = bytes(data)
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return data.decode('utf-8')
+
+
+def _batches(bind, query):
+    # Keyset batches over the primary key, so rows updated meanwhile are not revisited
+    last_id = None
+    while True:
+        rows = bind.execute(sa.text(query), {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.create_table('code_blobs',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('codec', sa.String(length=8), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    op.add_column('code_refactorings', sa.Column('original_hash', sa.String(length=64), nullable=True))
+    op.add_column('code_refactorings', sa.Column('refactored_hash', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    insert_blobs = postgresql.insert(code_blobs).on_conflict_do_nothing(index_elements=['hash'])
+    query = (
+        "SELECT id, original_code, refactored_code FROM code_refactorings"
+        " WHERE CAST(:last_id AS uuid) IS NULL OR id > CAST(:last_id AS uuid) ORDER BY id LIMIT :limit"
+    )
+    for rows in _batches(bind, query):
+        blobs = {}
+        updates = []
+        for refactoring_id, original_code, refactored_code in rows:
+            original = _encode(original_code)
+            refactored = _encode(refactored_code) if refactored_code is not None else None
+            for blob in filter(None, (original, refactored)):
+                blobs[blob['hash']] = blob
+            updates.append({
+                'row_id': refactoring_id,
+                'original_hash': original['hash'],
+                'refactored_hash': refactored['hash'] if refactored else None,
+            })
+        bind.execute(insert_blobs, [blob for _, blob in sorted(blobs.items())])
+        bind.execute(
+            sa.text(
+                "UPDATE code_refactorings SET original_hash = :original_hash, refactored_hash = :refactored_hash"
+                " WHERE id = :row_id"
+            ),
+            updates
+        )
+
+    op.alter_column('code_refactorings', 'original_hash', existing_type=sa.String(length=64), nullable=False)
+    op.create_index(op.f('ix_code_refactorings_original_hash'), 'code_refactorings', ['original_hash'], unique=False)
+    op.create_foreign_key('fk_code_refactorings_original_hash', 'code_refactorings', 'code_blobs', ['original_hash'], ['hash'])
+    op.create_foreign_key('fk_code_refactorings_refactored_hash', 'code_refactorings', 'code_blobs', ['refactored_hash'], ['hash'])
+    op.drop_column('code_refactorings', 'refactored_code')
+    op.drop_column('code_refactorings', 'original_code')
+
+
+def downgrade() -> None:
+    op.add_column('code_refactorings', sa.Column('original_code', sa.Text(), nullable=True))
+    op.add_column('code_refactorings', sa.Column('refactored_code', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    query = (
+        "SELECT r.id, o.codec, o.data, f.codec, f.data FROM code_refactorings r"
+        " JOIN code_blobs o ON o.hash = r.original_hash"
+        " LEFT JOIN code_blobs f ON f.hash = r.refactored_hash"
+        " WHERE CAST(:last_id AS uuid) IS NULL OR r.id > CAST(:last_id AS uuid) ORDER BY r.id LIMIT :limit"
+    )
+    for rows in _batches(bind, query):
+        bind.execute(
+            sa.text("UPDATE code_refactorings SET original_code = :original_code, refactored_code = :refactored_code WHERE id = :row_id"),
+            [
+                {
+                    'row_id': refactoring_id,
+                    'original_code': _decode(original_codec, original_data),
+                    'refactored_code': _decode(refactored_codec, refactored_data) if refactored_data is not None else None,
+                }
+                for refactoring_id, original_codec, original_data, refactored_codec, refactored_data in rows
+            ]
+        )
+
+    op.alter_column('code_refactorings', 'original_code', existing_type=sa.Text(), nullable=False)
+    op.drop_constraint('fk_code_refactorings_refactored_hash', 'code_refactorings', type_='foreignkey')
+    op.drop_constraint('fk_code_refactorings_original_hash', 'code_refactorings', type_='foreignkey')
+    op.drop_index(op.f('ix_code_refactorings_original_hash'), table_name='code_refactorings')
+    op.drop_column('code_refactorings', 'refactored_hash')
+    op.drop_column('code_refactorings', 'original_hash')
+    op.drop_table('code_blobs')
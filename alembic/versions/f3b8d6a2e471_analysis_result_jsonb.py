@@ -0,0 +1,38 @@
+"""Store analysis results as JSONB
+
+Revision ID: f3b8d6a2e471
+Revises: e7f1a3b9c524
+Create Date: 2025-08-01 11:18:45.520391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d6a2e471'
+down_revision: Union[str, None] = 'e7f1a3b9c524'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Analyses were always written with json.dumps, so every stored value casts cleanly
+    op.alter_column('code_refactorings', 'analysis_result',
+               existing_type=sa.Text(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=True,
+               postgresql_using='analysis_result::jsonb')
+    op.create_index('ix_code_refactorings_analysis_result', 'code_refactorings', ['analysis_result'], unique=False, postgresql_using='gin', postgresql_ops={'analysis_result': 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_code_refactorings_analysis_result', table_name='code_refactorings', postgresql_using='gin', postgresql_ops={'analysis_result': 'jsonb_path_ops'})
+    op.alter_column('code_refactorings', 'analysis_result',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.Text(),
+               existing_nullable=True,
+               postgresql_using='analysis_result::text')
@@ -0,0 +1,28 @@
+"""Store refactoring languages lowercase
+
+Revision ID: f8c3e6a1d249
+Revises: d2a7c5e9b184
+Create Date: 2025-08-11 10:04:31.518240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8c3e6a1d249'
+down_revision: Union[str, None] = 'd2a7c5e9b184'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Submitted languages used to be stored as given; the listing filter compares lowercase
+    op.execute("UPDATE code_refactorings SET language = lower(language) WHERE language <> lower(language)")
+
+
+def downgrade() -> None:
+    # The original spelling is not kept, so there is nothing to restore
+    pass
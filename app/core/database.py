@@ -1,14 +1,36 @@
 #AI assistance was used for creating this file
+from typing import AsyncIterator, Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-# Create database engine
+def _pool_options() -> dict:
+    """Connection pool settings shared by the sync and async engines."""
+    return {
+        "echo": settings.DATABASE_ECHO,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+
+def async_database_url() -> str:
+    """URL of the async engine: DATABASE_ASYNC_URL, or DATABASE_URL with the asyncpg driver."""
+    if settings.DATABASE_ASYNC_URL:
+        return settings.DATABASE_ASYNC_URL
+    return make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+# Create database engine (used by the worker, the result cache and LISTEN/NOTIFY)
 engine = create_engine(
     settings.DATABASE_URL,
-    echo=True
+    connect_args={"options": f"-c statement_timeout={settings.DATABASE_STATEMENT_TIMEOUT_MS}"},
+    **_pool_options()
 )
 
 # Create session factory
@@ -18,13 +40,50 @@ SessionLocal = sessionmaker(
     bind=engine        # Use our engine for database operations
 )
 
+# Async session factory for the API routes; bound to the async engine on first use
+# so the asyncpg driver is only needed by processes that serve requests
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False  # Responses are serialized after commit, where lazy loads cannot run
+)
+_async_engine: Optional[AsyncEngine] = None
+
 # Create base class for models
 Base = declarative_base()
 
+def get_async_engine() -> AsyncEngine:
+    """The shared async engine, created on first use."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            async_database_url(),
+            connect_args={"server_settings": {"statement_timeout": str(settings.DATABASE_STATEMENT_TIMEOUT_MS)}},
+            **_pool_options()
+        )
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+def async_session() -> AsyncSession:
+    """New async session on the shared async engine."""
+    get_async_engine()
+    return AsyncSessionLocal()
+
+async def dispose_async_engine() -> None:
+    """Close the async engine's pooled connections on shutdown."""
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
 def get_db():
     """Get database session."""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Get an async database session."""
+    async with async_session() as db:
+        yield db
@@ -1,9 +1,18 @@
 #No AI assistance used for creating this file
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from app.core.config import settings
+from app.core.database import dispose_async_engine
 from app.routes import code_refactoring
+from app.services.async_ai_refactoring import close_http_client
+from app.services.notifications import broadcaster
+from app.services.prompt_builder import PromptTooLargeError
+from app.services.traffic import ModelUnavailableError
+from app.worker import Worker
 
 app = FastAPI(
     title="AI Semantic Code Refactorer",
@@ -21,6 +30,46 @@ app.add_middleware(
 
 app.include_router(code_refactoring.router)
 
+@app.exception_handler(PromptTooLargeError)
+async def prompt_too_large_handler(request: Request, exc: PromptTooLargeError):
+    return JSONResponse(
+        status_code=413,
+        content={
+            "detail": str(exc),
+            "input_tokens": exc.input_tokens,
+            "context_window": exc.context_window
+        }
+    )
+
+@app.exception_handler(ModelUnavailableError)
+async def model_unavailable_handler(request: Request, exc: ModelUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+# Embedded queue worker, used when no separate `python -m app.worker` process runs
+worker_stop_event = asyncio.Event()
+worker_task = None
+
+@app.on_event("startup")
+async def startup():
+    global worker_task
+    broadcaster.start()
+    if settings.WORKER_EMBEDDED:
+        worker = Worker(code_refactoring.ai_service)
+        worker_task = asyncio.create_task(worker.run(worker_stop_event))
+
+@app.on_event("shutdown")
+async def shutdown():
+    if worker_task is not None:
+        worker_stop_event.set()
+        await worker_task
+    await broadcaster.stop()
+    await close_http_client()
+    await dispose_async_engine()
+
 @app.get("/")
 async def root():
     return JSONResponse(
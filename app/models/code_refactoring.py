@@ -1,36 +1,185 @@
 #AI assistance was used for creating this file
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, ARRAY
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, BigInteger, Float, Integer, LargeBinary, SmallInteger, String, Text, DateTime, ForeignKey, Index, event, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID, insert
+from sqlalchemy.orm import Session, relationship
+from sqlalchemy.sql import func
 from datetime import datetime, UTC
 import uuid
 
+from app.core.config import settings
 from app.core.database import Base
+from app.services.blobs import blob_hash, decode_blob, encode_blob
+from app.services.diffs import PatchError, apply_patch, unified_diff
+
+def _apply(original: str, diff: str):
+    """Apply a stored patch to its original, or None when it no longer applies cleanly."""
+    try:
+        return apply_patch(original, diff)
+    except PatchError:
+        return None
+
+class CodeBlob(Base):
+    """Model for compressed code text stored once per distinct content."""
+    __tablename__ = "code_blobs"
+    # SHA-256 of the UTF-8 text
+    hash = Column(String(64), primary_key=True)
+    # Compression of data: zstd, zlib or none
+    codec = Column(String(8), nullable=False)
+    # The (compressed) UTF-8 text
+    data = Column(LargeBinary, nullable=False)
+    # Length of the uncompressed text in bytes
+    size = Column(Integer, nullable=False)
+    # Timestamp of when the text was first stored
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC), server_default=func.now())
+
+    @property
+    def text(self) -> str:
+        return decode_blob(self.codec, self.data)
+
+    @staticmethod
+    def rows(texts) -> list:
+        """Column values of the blobs of ``texts``, ordered by hash so concurrent inserts lock in one order."""
+        encoded = {blob.hash: blob for blob in map(encode_blob, texts)}
+        return [blob._asdict() for _, blob in sorted(encoded.items())]
+
+    @staticmethod
+    def upsert():
+        """Insert statement for ``rows`` that leaves already stored blobs alone."""
+        return insert(CodeBlob).on_conflict_do_nothing(index_elements=["hash"])
 
 class CodeRefactoring(Base):
     """Model for storing code refactoring requests and results."""
     __tablename__ = "code_refactorings"
+    __table_args__ = (
+        # Keyset pagination of the listing, newest first, optionally filtered by status or language
+        Index("ix_code_refactorings_created_at_id", "created_at", "id"),
+        Index("ix_code_refactorings_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_code_refactorings_language_created_at_id", "language", "created_at", "id"),
+        # Containment queries on the analysis, e.g. refactorings with critical security issues
+        Index(
+            "ix_code_refactorings_analysis_result", "analysis_result",
+            postgresql_using="gin", postgresql_ops={"analysis_result": "jsonb_path_ops"}
+        ),
+    )
     # Primary key using UUID for better security and distribution
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    # The original code that needs to be refactored
-    original_code = Column(Text, nullable=False)
-    # The improved version of the code after refactoring
-    refactored_code = Column(Text, nullable=True)
+    # Blob of the original code that needs to be refactored
+    original_hash = Column(String(64), ForeignKey("code_blobs.hash"), nullable=False, index=True)
+    # Blob of the improved version of the code after refactoring, unless it is stored as refactored_patch
+    refactored_hash = Column(String(64), ForeignKey("code_blobs.hash"), nullable=True)
+    # Unified diff from original_code to the refactored code, kept instead of the full text when smaller
+    refactored_patch = Column(Text, nullable=True)
     # Explanation of what changes were made and why
     explanation = Column(Text, nullable=True)
     # Programming language of the code
     language = Column(String, nullable=True)
     # Areas to focus on during refactoring 
     focus_areas = Column(ARRAY(String), nullable=True)
-    # Analysis result as JSON string
-    analysis_result = Column(Text, nullable=True)
+    # Analysis result (CodeAnalysisResult fields) as JSONB
+    analysis_result = Column(JSONB, nullable=True)
+    # Improvement suggestions as JSON string (stored when the combined review is used)
+    suggestions = Column(Text, nullable=True)
     # Current status of the refactoring
     status = Column(String, nullable=False)
+    # Scheduling class (interactive or bulk), submitting tenant and optional deadline of the refactoring
+    priority = Column(String, nullable=False, default="interactive", server_default="interactive")
+    tenant = Column(String, nullable=False, default="anonymous", server_default="anonymous", index=True)
+    deadline = Column(DateTime, nullable=True)
+    # Model that produced the refactored code, after routing and escalation
+    ai_model = Column(String, nullable=True, index=True)
+    # Every model routing decision made for this refactoring, as a JSON string
+    routing_decisions = Column(Text, nullable=True)
+    # Batch this refactoring was submitted in, if any
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("refactoring_batches.id"), nullable=True, index=True)
+    # Completed refactoring of near-duplicate code whose result was reused or shown to the model as an example
+    reference_id = Column(UUID(as_uuid=True), ForeignKey("code_refactorings.id"), nullable=True)
+    # Identical refactoring whose in-flight job this one waits on instead of having its own (single-flight)
+    follows_id = Column(UUID(as_uuid=True), ForeignKey("code_refactorings.id"), nullable=True, index=True)
+    # Previous revision of the same file, when this refactoring was submitted as a revision
+    parent_id = Column(UUID(as_uuid=True), ForeignKey("code_refactorings.id"), nullable=True, index=True)
+    # Position in the revision chain (1 for a first submission)
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
+    # Refactored text of each top-level unit keyed by the hash of its original text, as a JSON string
+    unit_results = Column(Text, nullable=True)
     # Timestamps for tracking when the refactoring was created and last updated
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
     updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
     # Relationship to feedback entries
     feedback = relationship("RefactoringFeedback", back_populates="refactoring", cascade="all, delete-orphan")
+    # Relationship to queued processing jobs
+    jobs = relationship("RefactoringJob", back_populates="refactoring", cascade="all, delete-orphan")
+    # Relationship to the refactoring referenced by reference_id
+    reference = relationship("CodeRefactoring", remote_side=[id], foreign_keys=[reference_id])
+    # Relationship to the previous revision referenced by parent_id
+    parent = relationship("CodeRefactoring", remote_side=[id], foreign_keys=[parent_id])
+    # Relationship to the fingerprint of the original code
+    fingerprint = relationship("CodeFingerprint", back_populates="refactoring", uselist=False, cascade="all, delete-orphan")
+    # Relationships to the code blobs, loaded with the row (also by async sessions, which cannot lazy load)
+    original_blob = relationship("CodeBlob", foreign_keys=[original_hash], lazy="joined", innerjoin=True)
+    refactored_blob = relationship("CodeBlob", foreign_keys=[refactored_hash], lazy="joined")
+
+    def _stage_blob(self, text: str) -> str:
+        """Remember a text to be stored as a blob on the next flush and return its hash."""
+        key = blob_hash(text)
+        self.__dict__.setdefault("_blob_texts", {})[key] = text
+        self.__dict__.setdefault("_pending_blobs", {})[key] = text
+        return key
+
+    def _blob_text(self, key, blob_attribute: str):
+        """Text of a blob, decompressed once per instance."""
+        if key is None:
+            return None
+        texts = self.__dict__.setdefault("_blob_texts", {})
+        if key not in texts:
+            texts[key] = getattr(self, blob_attribute).text
+        return texts[key]
+
+    @property
+    def original_code(self):
+        """The original code that needs to be refactored."""
+        return self._blob_text(self.original_hash, "original_blob")
+
+    @original_code.setter
+    def original_code(self, value):
+        self.original_hash = self._stage_blob(value)
+
+    @property
+    def refactored_code(self):
+        """The refactored code, rebuilt from the stored diff when there is one."""
+        if self.refactored_patch is not None:
+            return apply_patch(self.original_code, self.refactored_patch)
+        return self._blob_text(self.refactored_hash, "refactored_blob")
+
+    @refactored_code.setter
+    def refactored_code(self, value):
+        diff = None
+        if value is not None and self.original_code is not None and settings.REFACTORED_DIFF_STORAGE:
+            diff = unified_diff(self.original_code, value)
+            # Only keep diffs that are smaller and reproduce the text exactly
+            if len(diff) >= len(value) or _apply(self.original_code, diff) != value:
+                diff = None
+        self.refactored_patch = diff
+        self.refactored_hash = self._stage_blob(value) if diff is None and value is not None else None
+
+@event.listens_for(Session, "before_flush")
+def _store_pending_blobs(session, flush_context, instances):
+    """Insert the blobs of newly set code ahead of the rows referencing them."""
+    texts = {}
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, CodeRefactoring):
+            texts.update(instance.__dict__.pop("_pending_blobs", {}))
+    if texts:
+        session.execute(CodeBlob.upsert(), CodeBlob.rows(texts.values()))
+
+class RefactoringBatch(Base):
+    """Model for a group of refactorings submitted in a single request."""
+    __tablename__ = "refactoring_batches"
+    # Primary key using UUID for better security and distribution
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Number of refactorings submitted in the batch
+    total = Column(Integer, nullable=False)
+    # Timestamp of when the batch was submitted
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
 
 class RefactoringFeedback(Base):
     """Model for storing user feedback on refactored code."""
@@ -38,7 +187,7 @@ class RefactoringFeedback(Base):
     # Primary key using UUID for better security and distribution
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     # Foreign key linking to the code refactoring this feedback is for
-    refactoring_id = Column(UUID(as_uuid=True), ForeignKey("code_refactorings.id"), nullable=False)
+    refactoring_id = Column(UUID(as_uuid=True), ForeignKey("code_refactorings.id"), nullable=False, index=True)
     # Numerical rating of the refactoring (e.g., 1-5 stars)
     rating = Column(Integer, nullable=False)
     # Optional text feedback about the refactoring
@@ -46,4 +195,94 @@ class RefactoringFeedback(Base):
     # Timestamp of when the feedback was given
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
     # Relationship to the parent refactoring
-    refactoring = relationship("CodeRefactoring", back_populates="feedback") 
\ No newline at end of file
+    refactoring = relationship("CodeRefactoring", back_populates="feedback") 
+
+
+class AIResultCache(Base):
+    """Model for persisting AI service results keyed by a content hash."""
+    __tablename__ = "ai_result_cache"
+    # SHA-256 of the normalized (operation, code, language, focus areas, model, prompt version)
+    key = Column(String(64), primary_key=True)
+    # Service operation that produced the result (analyze, refactor, suggest, explain)
+    operation = Column(String, nullable=False)
+    # Model that produced the result
+    model = Column(String, nullable=False)
+    # Result payload as JSON string
+    result = Column(Text, nullable=False)
+    # Number of times this entry has been served from the persistent tier
+    hit_count = Column(Integer, nullable=False, default=0)
+    # Timestamps for TTL and least-recently-used eviction
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    last_accessed_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC), index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class RefactoringJob(Base):
+    """Model for durable refactoring jobs claimed by workers."""
+    __tablename__ = "refactoring_jobs"
+    __table_args__ = (
+        Index("ix_refactoring_jobs_status_available_at", "status", "available_at"),
+        # Claim order: priority class, then weighted fair share between tenants
+        Index("ix_refactoring_jobs_status_priority_virtual_finish", "status", "priority", "virtual_finish"),
+        # Running jobs per tenant, for the per-tenant concurrency cap
+        Index("ix_refactoring_jobs_tenant_status", "tenant", "status"),
+        # At most one queued or running job per flight key
+        Index(
+            "ux_refactoring_jobs_active_flight_key", "flight_key",
+            unique=True, postgresql_where=text("status IN ('queued', 'running')")
+        ),
+    )
+    # Primary key using UUID for better security and distribution
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Foreign key linking to the refactoring this job processes
+    refactoring_id = Column(UUID(as_uuid=True), ForeignKey("code_refactorings.id"), nullable=False, index=True)
+    # Hash of what the job computes (normalized code, language, focus areas, parent); identical
+    # submissions made while the job is queued or running follow it instead of getting a job
+    flight_key = Column(String(64), nullable=True)
+    # Scheduling class rank (0 interactive, 1 bulk), tenant and deadline, copied from the refactoring
+    priority = Column(SmallInteger, nullable=False, default=0, server_default="0")
+    tenant = Column(String, nullable=False, default="anonymous", server_default="anonymous")
+    deadline = Column(DateTime, nullable=True)
+    # Virtual finish time for weighted fair queuing between tenants (see job_queue)
+    virtual_finish = Column(Float, nullable=False, default=0.0, server_default="0")
+    # Job state: queued, running, completed or dead (retries exhausted)
+    status = Column(String, nullable=False, default="queued")
+    # Number of times the job has been claimed and the retry limit
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    # Earliest time the job may be claimed (used for retry backoff)
+    available_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    # Worker holding the job and when its lease (visibility timeout) expires
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    # Error message from the most recent failed attempt
+    last_error = Column(Text, nullable=True)
+    # Timestamps for tracking when the job was created and last updated
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    # Relationship to the parent refactoring
+    refactoring = relationship("CodeRefactoring", back_populates="jobs")
+
+class CodeFingerprint(Base):
+    """Model for the normalized fingerprint of a refactoring's original code, used to find near-duplicates."""
+    __tablename__ = "code_fingerprints"
+    __table_args__ = (
+        Index("ix_code_fingerprints_bands", "bands", postgresql_using="gin"),
+    )
+    # The refactoring whose original code was fingerprinted
+    refactoring_id = Column(UUID(as_uuid=True), ForeignKey("code_refactorings.id"), primary_key=True)
+    # Programming language of the code (duplicates are only matched within a language)
+    language = Column(String, nullable=False)
+    # SHA-256 of the token stream without whitespace and comments
+    exact_hash = Column(String(64), nullable=False, index=True)
+    # SHA-256 of the token stream with identifiers and literals canonicalized
+    canonical_hash = Column(String(64), nullable=False, index=True)
+    # MinHash signature of the canonical token shingles
+    signature = Column(ARRAY(BigInteger), nullable=False)
+    # LSH band hashes of the signature; refactorings sharing a band are candidate near-duplicates
+    bands = Column(ARRAY(BigInteger), nullable=False)
+    # Number of tokens in the normalized code
+    token_count = Column(Integer, nullable=False)
+    # Timestamp of when the fingerprint was computed
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    # Relationship to the fingerprinted refactoring
+    refactoring = relationship("CodeRefactoring", back_populates="fingerprint")
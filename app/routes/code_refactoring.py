@@ -1,115 +1,529 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
-from uuid import UUID
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, load_only, raiseload, selectinload
+from typing import Dict, List, Optional, Set
+from uuid import UUID, uuid4
+import asyncio
 import json
 import logging
 
-from app.core.database import get_db
-from app.models.code_refactoring import CodeRefactoring, RefactoringFeedback
+from app.core.config import settings
+from app.core.database import SessionLocal, async_session, get_async_db
+from app.models.code_refactoring import CodeBlob, CodeRefactoring, RefactoringBatch, RefactoringFeedback
 from app.schemas.code_refactoring import (
     CodeRefactoringCreate,
+    CodeRefactoringBatchCreate,
+    CodeRefactoringBatchResponse,
+    RefactoringBatchStatus,
     CodeRefactoringResponse,
+    CodeRefactoringPage,
     RefactoringFeedbackCreate,
     RefactoringFeedbackResponse,
     CodeAnalysisResult,
     CodeSuggestionsResponse,
-    CodeSuggestion
+    CodeSuggestion,
+    TokenEstimateResponse
 )
-from app.services.mock_ai_refactoring import MockAIRefactoringService
+from app.services.backends import get_ai_service
+from app.services.blobs import blob_hash
+from app.services.deduplication import deduplicate
+from app.services.diffs import unified_diff
+from app.services.job_queue import JobSpec, enqueue_refactoring, enqueue_refactorings, flight_key
+from app.services.language_detection import DetectionResult
+from app.services.model_router import record_decisions
+from app.services.notifications import broadcaster, notify_status
+from app.services.pagination import InvalidCursorError, keyset_statement, to_page
+from app.services.prompt_builder import OUTPUT_BUDGETS, build_messages, estimate, fits_single_call
+from app.services.refactoring_pipeline import record_routing
+from app.services.scheduler import Schedule, scheduling, tenant_id
+from app.services.traffic import ModelUnavailableError
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/refactoring", tags=["code-refactoring"])
 
-ai_service = MockAIRefactoringService()
+ai_service = get_ai_service()
+
+# Interval between SSE comments that keep idle subscriptions open through proxies
+SSE_KEEPALIVE_SECONDS = 15
+
+# Fire-and-forget tasks, referenced here until they finish so they are not garbage collected
+_background_tasks: Set[asyncio.Task] = set()
+
+def get_tenant(x_api_key: Optional[str] = Header(None)) -> str:
+    """Tenant of the request, identified by its X-API-Key header; model calls are shared fairly between tenants."""
+    return tenant_id(x_api_key)
+
+def _sse_event(event: str, data) -> str:
+    """Format a Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_refactoring(
+    refactoring_id: UUID, code: str, language: str, focus_areas: List[str], schedule: Schedule, stream: bool = True
+):
+    """
+    Stream refactoring tokens as SSE, then store and emit the final result.
+
+    With ``stream`` False (code too large for one call) the file is refactored
+    in chunks and only the result is emitted. If the result is not stored, the
+    refactoring is queued for a worker.
+    """
+    yield _sse_event("created", {"id": str(refactoring_id), "status": "processing"})
+    
+    # Set here: the route's context does not reach the response body's iteration
+    with record_decisions() as decisions, scheduling(*schedule):
+        analysis_task = asyncio.create_task(ai_service.analyze_code_quality(code, language))
+        completed = False
+        try:
+            result = None
+            try:
+                if stream:
+                    async for event, value in ai_service.stream_refactor_code(code, language, focus_areas):
+                        if event == "token":
+                            yield _sse_event("token", {"text": value})
+                        else:
+                            result = value
+                else:
+                    refactored_code, explanation = await ai_service.refactor_code(code, language, focus_areas)
+                    result = {"refactored_code": refactored_code, "explanation": explanation}
+                analysis_result = await analysis_task
+            except ModelUnavailableError as e:
+                # The job is queued for a worker below; the client can follow it via /events
+                yield _sse_event("error", {"id": str(refactoring_id), "status": "processing", "detail": str(e)})
+                return
+            except Exception as e:
+                logger.error(f"Streaming refactoring {refactoring_id} failed: {e}")
+                yield _sse_event("error", {"id": str(refactoring_id), "status": "processing", "detail": str(e)})
+                return
+            
+            async with async_session() as db:
+                db_refactoring = await db.get(CodeRefactoring, refactoring_id)
+                db_refactoring.refactored_code = result["refactored_code"]
+                db_refactoring.explanation = result["explanation"]
+                db_refactoring.analysis_result = analysis_result
+                db_refactoring.status = "completed"
+                record_routing(db_refactoring, decisions)
+                await db.run_sync(notify_status, refactoring_id, "completed", db_refactoring.batch_id)
+                await db.commit()
+            completed = True
+            
+            yield _sse_event("result", {
+                "id": str(refactoring_id),
+                "status": "completed",
+                "refactored_code": result["refactored_code"],
+                "explanation": result["explanation"],
+                "analysis_result": analysis_result
+            })
+        finally:
+            if not completed:
+                # The client went away, the call failed or storing failed; let a worker finish the job.
+                # The enqueue runs in a thread, shielded so a disconnect's cancellation cannot abandon it.
+                analysis_task.cancel()
+                requeue = asyncio.create_task(
+                    asyncio.to_thread(_enqueue_stream_job, refactoring_id, schedule, len(code))
+                )
+                _background_tasks.add(requeue)
+                requeue.add_done_callback(_background_tasks.discard)
+                await asyncio.shield(requeue)
 
-async def process_refactoring_background(refactoring_id: UUID, db: Session):
-    """Background task to process refactoring with AI."""
-    logging.info(f"Starting background refactoring for ID: {refactoring_id}")
+def _enqueue_stream_job(refactoring_id: UUID, schedule: Schedule, cost: int) -> None:
+    """Queue a worker job for a streamed refactoring that was not stored (blocking; run in a thread)."""
+    db = SessionLocal()
     try:
-        refactoring = db.query(CodeRefactoring).filter(CodeRefactoring.id == refactoring_id).first()
-        if not refactoring:
-            logging.error(f"Refactoring ID not found in background task: {refactoring_id}")
-            return
-        
-        logging.info(f"Processing refactoring for language: {refactoring.language}")
-        
-        language = refactoring.language or ai_service.detect_language(refactoring.original_code)
-        
-        analysis_result = ai_service.analyze_code_quality(refactoring.original_code, language)
-        
-        refactored_code, explanation = ai_service.refactor_code(
-            refactoring.original_code, 
-            language,
-            refactoring.focus_areas
-        )
-        
-        refactoring.refactored_code = refactored_code
-        refactoring.explanation = explanation
-        refactoring.status = "completed"
-        refactoring.analysis_result = json.dumps(analysis_result)
-        
+        enqueue_refactoring(db, JobSpec(refactoring_id, None, *schedule, cost))
         db.commit()
-        logging.info(f"Successfully completed refactoring for ID: {refactoring_id}")
-        
-    except Exception as e:
-        logging.error(f"Error during background refactoring for ID {refactoring_id}: {e}", exc_info=True)
-        refactoring = db.query(CodeRefactoring).filter(CodeRefactoring.id == refactoring_id).first()
-        if refactoring:
-            refactoring.status = "failed"
-            refactoring.explanation = f"Refactoring failed: {str(e)}"
-            db.commit()
+    finally:
+        db.close()
+
+async def _batch_progress(db: AsyncSession, db_batch: RefactoringBatch) -> RefactoringBatchStatus:
+    """Count the refactorings of a batch per status."""
+    result = await db.execute(
+        select(CodeRefactoring.status, func.count(CodeRefactoring.id))
+        .where(CodeRefactoring.batch_id == db_batch.id)
+        .group_by(CodeRefactoring.status)
+    )
+    counts = dict(result.all())
+    
+    return RefactoringBatchStatus(
+        id=db_batch.id,
+        total=db_batch.total,
+        created_at=db_batch.created_at,
+        processing=counts.get("processing", 0),
+        completed=counts.get("completed", 0),
+        failed=counts.get("failed", 0)
+    )
+
+async def _next_notification(queue: asyncio.Queue):
+    """Wait for the next notification, returning None when the keep-alive interval passes."""
+    try:
+        return await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+    except asyncio.TimeoutError:
+        return None
+
+async def _read_status(refactoring_id: UUID) -> Optional[str]:
+    """Read the stored status of a refactoring."""
+    async with async_session() as db:
+        return await db.scalar(select(CodeRefactoring.status).where(CodeRefactoring.id == refactoring_id))
+
+async def _refactoring_events(refactoring_id: UUID, status: str, queue: asyncio.Queue):
+    """Emit the current status, then every pushed change until the refactoring finishes."""
+    try:
+        yield _sse_event("status", {"refactoring_id": str(refactoring_id), "status": status, "stage": None})
+        while status == "processing":
+            payload = await _next_notification(queue)
+            if payload is None:
+                # Notifications are lost while the listener reconnects or a queue is full,
+                # so every quiet interval re-reads the stored status
+                stored = await _read_status(refactoring_id)
+                if stored is None or stored == status:
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = {"refactoring_id": str(refactoring_id), "status": stored, "stage": None}
+            status = payload["status"]
+            yield _sse_event("status", payload)
+    finally:
+        broadcaster.unsubscribe(refactoring_id, queue)
+
+async def _batch_events(batch_id: UUID, queue: asyncio.Queue):
+    """Emit batch progress, recounting once per burst of notifications."""
+    try:
+        while True:
+            async with async_session() as db:
+                db_batch = await db.get(RefactoringBatch, batch_id)
+                progress = await _batch_progress(db, db_batch)
+            yield _sse_event("progress", progress.model_dump(mode="json"))
+            if progress.processing == 0:
+                return
+            
+            while await _next_notification(queue) is None:
+                yield ": keep-alive\n\n"
+            # Coalesce everything that arrived meanwhile into a single recount
+            while not queue.empty():
+                queue.get_nowait()
+    finally:
+        broadcaster.unsubscribe(batch_id, queue)
+
+async def _stream_explanation(code: str, language: str, tenant: str):
+    """Stream explanation tokens as SSE, then emit the full explanation."""
+    try:
+        with scheduling(tenant=tenant):
+            async for event, value in ai_service.stream_explain_code(code, language):
+                if event == "token":
+                    yield _sse_event("token", {"text": value})
+                else:
+                    yield _sse_event("result", {"explanation": value, "language": language})
+    except ModelUnavailableError as e:
+        yield _sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+
+def _load_parents(db: Session, items: List[CodeRefactoringCreate]) -> Dict[UUID, CodeRefactoring]:
+    """Load the refactorings the submitted items are revisions of, with one query."""
+    parent_ids = {item.parent_id for item in items if item.parent_id}
+    if not parent_ids:
+        return {}
+    parents = {
+        parent.id: parent
+        for parent in db.query(CodeRefactoring).filter(CodeRefactoring.id.in_(parent_ids)).all()
+    }
+    missing = parent_ids - parents.keys()
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Parent refactoring not found: {sorted(map(str, missing))[0]}")
+    return parents
+
+def _undetected_language(detection: DetectionResult) -> str:
+    """Error message for code whose language could not be detected reliably."""
+    return (
+        f"Could not detect the language of the code reliably (best guess: {detection.language}, "
+        f"confidence {detection.confidence:.2f}); pass language"
+    )
+
+def _detect_language(code: str) -> str:
+    """Detect the language of submitted code; ambiguous code is rejected rather than refactored as the wrong language."""
+    detection = ai_service.detect_language_with_confidence(code)
+    if not detection.confident:
+        raise HTTPException(status_code=422, detail=_undetected_language(detection))
+    return detection.language
+
+def _given_language(item: CodeRefactoringCreate, parent: Optional[CodeRefactoring]) -> Optional[str]:
+    """The language of a submission if it was passed or is inherited from the parent."""
+    return item.language or (parent.language if parent else None)
+
+def _submission_fields(
+    item: CodeRefactoringCreate, parent: Optional[CodeRefactoring], tenant: str, priority: str = "interactive",
+    language: Optional[str] = None
+) -> dict:
+    """Column values of a submission; a revision inherits its parent's language and focus areas."""
+    language = _given_language(item, parent) or language or _detect_language(item.original_code)
+    return {
+        "original_code": item.original_code,
+        "language": language,
+        "focus_areas": item.focus_areas if item.focus_areas is not None or parent is None else parent.focus_areas,
+        "parent_id": item.parent_id,
+        "revision": parent.revision + 1 if parent else 1,
+        "priority": item.priority or priority,
+        "tenant": tenant,
+        "deadline": item.deadline,
+        "status": "processing"
+    }
+
+# Columns loaded for every listed refactoring, and the code bodies loaded on request
+LIST_COLUMNS = (
+    CodeRefactoring.id,
+    CodeRefactoring.language,
+    CodeRefactoring.focus_areas,
+    CodeRefactoring.status,
+    CodeRefactoring.ai_model,
+    CodeRefactoring.batch_id,
+    CodeRefactoring.reference_id,
+    CodeRefactoring.parent_id,
+    CodeRefactoring.revision,
+    CodeRefactoring.created_at,
+    CodeRefactoring.updated_at,
+)
+CODE_COLUMNS = (
+    CodeRefactoring.original_hash,
+    CodeRefactoring.refactored_hash,
+    CodeRefactoring.refactored_patch,
+    CodeRefactoring.explanation,
+)
+
+def _refactored_diff(refactoring: CodeRefactoring) -> Optional[str]:
+    """Unified diff from the original to the refactored code; refactored code stored as a diff is served as stored."""
+    if refactoring.refactored_patch is not None:
+        return refactoring.refactored_patch
+    if refactoring.refactored_hash is None:
+        return None
+    return unified_diff(refactoring.original_code, refactoring.refactored_code)
+
+def _with_diff(refactoring: CodeRefactoring) -> CodeRefactoringResponse:
+    """Response carrying a unified diff against the original code in place of the refactored code."""
+    response = CodeRefactoringResponse.model_validate(refactoring)
+    response.refactored_diff = _refactored_diff(refactoring)
+    response.refactored_code = None
+    return response
+
+def _list_item(refactoring: CodeRefactoring, include_code: bool, include_analysis: bool, diff: bool) -> dict:
+    """Fields of a listed refactoring, touching only the columns that were loaded."""
+    item = {column.key: getattr(refactoring, column.key) for column in LIST_COLUMNS}
+    item["feedback"] = refactoring.feedback
+    if include_code:
+        item["original_code"] = refactoring.original_code
+        item["explanation"] = refactoring.explanation
+        if diff:
+            item["refactored_diff"] = _refactored_diff(refactoring)
+        else:
+            item["refactored_code"] = refactoring.refactored_code
+    if include_analysis:
+        # Decoded by the driver and validated once, by the response model
+        item["analysis_result"] = refactoring.analysis_result
+    return item
+
+def _create_refactoring(db: Session, refactoring: CodeRefactoringCreate, tenant: str) -> CodeRefactoringResponse:
+    """Store a submission and queue its job, unless a duplicate already answers it."""
+    parent = _load_parents(db, [refactoring]).get(refactoring.parent_id)
+    db_refactoring = CodeRefactoring(**_submission_fields(refactoring, parent, tenant))
+    db.add(db_refactoring)
+    db.flush()
+    # Code that was already refactored up to formatting and comments is served without a job
+    if settings.DEDUP_ENABLED:
+        deduplicate(db, db_refactoring)
+    if db_refactoring.status != "completed":
+        # Queue the job in the same transaction so a refactoring never exists without one;
+        # an identical submission already in flight is followed instead
+        key = flight_key(
+            db_refactoring.original_code, db_refactoring.language, db_refactoring.focus_areas, db_refactoring.parent_id,
+            db_refactoring.tenant
+        )
+        enqueue_refactoring(db, JobSpec.of(db_refactoring, key))
+    db.commit()
+    db.refresh(db_refactoring)
+    
+    return CodeRefactoringResponse.model_validate(db_refactoring)
 
 @router.post("/", response_model=CodeRefactoringResponse)
 async def create_refactoring(
     refactoring: CodeRefactoringCreate,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    tenant: str = Depends(get_tenant)
 ):
-    """Create a new code refactoring request."""
-    language = refactoring.language or ai_service.detect_language(refactoring.original_code)
+    """Create a new code refactoring request, optionally as a revision of an earlier one."""
+    # Deduplication and queueing are sync services; run_sync drives them over the async connection
+    return await db.run_sync(_create_refactoring, refactoring, tenant)
+
+@router.post("/stream")
+async def create_refactoring_stream(
+    refactoring: CodeRefactoringCreate,
+    db: AsyncSession = Depends(get_async_db),
+    tenant: str = Depends(get_tenant)
+):
+    """Create a refactoring and stream the result as Server-Sent Events."""
+    parents = await db.run_sync(_load_parents, [refactoring])
+    db_refactoring = CodeRefactoring(**_submission_fields(refactoring, parents.get(refactoring.parent_id), tenant))
+    db.add(db_refactoring)
+    await db.commit()
+    await db.refresh(db_refactoring)
     
-    db_refactoring = CodeRefactoring(
-        original_code=refactoring.original_code,
-        language=language,
-        focus_areas=refactoring.focus_areas,
-        status="processing"
+    # Streaming always refactors the whole file; the revision chain is still recorded.
+    # Code too large for one call is refactored in chunks, which cannot stream
+    stream = await asyncio.to_thread(
+        fits_single_call, ai_service.model, "refactor", db_refactoring.original_code, db_refactoring.language,
+        db_refactoring.focus_areas, ai_service.context_window
     )
-    db.add(db_refactoring)
-    db.commit()
-    db.refresh(db_refactoring)
+    return StreamingResponse(
+        _stream_refactoring(
+            db_refactoring.id, db_refactoring.original_code, db_refactoring.language, db_refactoring.focus_areas,
+            Schedule(db_refactoring.priority, tenant, db_refactoring.deadline), stream
+        ),
+        media_type="text/event-stream"
+    )
+
+@router.post("/batch", response_model=CodeRefactoringBatchResponse)
+async def create_refactoring_batch(
+    batch: CodeRefactoringBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    tenant: str = Depends(get_tenant)
+):
+    """Create many refactoring requests at once with a single bulk insert; items default to bulk priority."""
+    if len(batch.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds the maximum of {settings.BATCH_MAX_ITEMS} items")
     
-    background_tasks.add_task(process_refactoring_background, db_refactoring.id, db)
+    parents = await db.run_sync(_load_parents, batch.items)
+    db_batch = RefactoringBatch(total=len(batch.items))
+    db.add(db_batch)
+    await db.flush()
     
-    return db_refactoring
+    # Languages are detected in one pass off the event loop; an item whose language is
+    # ambiguous fails on its own instead of rejecting the whole batch
+    undetected = [
+        index for index, item in enumerate(batch.items) if not _given_language(item, parents.get(item.parent_id))
+    ]
+    detections = {}
+    if undetected:
+        codes = [batch.items[index].original_code for index in undetected]
+        detections = dict(zip(undetected, await asyncio.to_thread(ai_service.detect_languages, codes)))
+    
+    # IDs are generated here so the refactorings and their jobs can both be bulk inserted
+    rows = []
+    jobs = []
+    for index, item in enumerate(batch.items):
+        detection = detections.get(index)
+        fields = _submission_fields(
+            item, parents.get(item.parent_id), tenant, "bulk", detection.language if detection else None
+        )
+        original_code = fields.pop("original_code")
+        rows.append({"id": uuid4(), **fields, "original_hash": blob_hash(original_code), "batch_id": db_batch.id})
+        if detection is not None and not detection.confident:
+            rows[-1].update(language=None, status="failed", explanation=_undetected_language(detection))
+            continue
+        key = flight_key(original_code, fields["language"], fields["focus_areas"], fields["parent_id"], tenant)
+        jobs.append(JobSpec(rows[-1]["id"], key, fields["priority"], tenant, fields["deadline"], len(original_code)))
+    # Bulk inserts bypass the ORM, so the code blobs are stored here (once per distinct snippet);
+    # hashing and compressing up to BATCH_MAX_ITEMS snippets runs in a thread
+    blobs = await asyncio.to_thread(CodeBlob.rows, [item.original_code for item in batch.items])
+    await db.execute(CodeBlob.upsert(), blobs)
+    await db.execute(insert(CodeRefactoring), rows)
+    # Identical snippets, within the batch or already in flight, share one job
+    await db.run_sync(enqueue_refactorings, jobs)
+    await db.commit()
+    await db.refresh(db_batch)
+    
+    return db_batch
+
+@router.get("/batch/{batch_id}", response_model=RefactoringBatchStatus)
+async def get_refactoring_batch(
+    batch_id: UUID,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get aggregate progress of a refactoring batch."""
+    db_batch = await db.get(RefactoringBatch, batch_id)
+    if not db_batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return await _batch_progress(db, db_batch)
+
+@router.get("/batch/{batch_id}/events")
+async def stream_batch_events(
+    batch_id: UUID,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Push batch progress as Server-Sent Events until every refactoring has finished."""
+    queue = broadcaster.subscribe(batch_id)
+    db_batch = await db.get(RefactoringBatch, batch_id)
+    if not db_batch:
+        broadcaster.unsubscribe(batch_id, queue)
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return StreamingResponse(_batch_events(db_batch.id, queue), media_type="text/event-stream")
 
 @router.get("/{refactoring_id}", response_model=CodeRefactoringResponse)
 async def get_refactoring(
     refactoring_id: UUID,
-    db: Session = Depends(get_db)
+    diff: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get a specific refactoring by ID."""
-    refactoring = db.query(CodeRefactoring).filter(CodeRefactoring.id == refactoring_id).first()
+    """Get a specific refactoring by ID, with a unified diff instead of the refactored code if ``diff`` is set."""
+    refactoring = await db.get(CodeRefactoring, refactoring_id, options=[selectinload(CodeRefactoring.feedback)])
     if not refactoring:
         raise HTTPException(status_code=404, detail="Refactoring not found")
     
-    # Parse analysis result if it exists
-    if refactoring.analysis_result:
-        try:
-            analysis_data = json.loads(refactoring.analysis_result)
-            refactoring.analysis_result = CodeAnalysisResult(**analysis_data)
-        except:
-            refactoring.analysis_result = None
+    return _with_diff(refactoring) if diff else refactoring
+
+@router.get("/{refactoring_id}/events")
+async def stream_refactoring_events(
+    refactoring_id: UUID,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Push status changes of a refactoring as Server-Sent Events until it finishes."""
+    # Subscribe before reading the current status so no change is missed in between
+    queue = broadcaster.subscribe(refactoring_id)
+    status = await db.scalar(select(CodeRefactoring.status).where(CodeRefactoring.id == refactoring_id))
+    if status is None:
+        broadcaster.unsubscribe(refactoring_id, queue)
+        raise HTTPException(status_code=404, detail="Refactoring not found")
+    
+    return StreamingResponse(_refactoring_events(refactoring_id, status, queue), media_type="text/event-stream")
+
+@router.get("/{refactoring_id}/analysis", response_model=CodeAnalysisResult)
+async def get_refactoring_analysis(
+    refactoring_id: UUID,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the stored analysis of a refactoring without another model call."""
+    refactoring = await db.get(CodeRefactoring, refactoring_id)
+    if not refactoring:
+        raise HTTPException(status_code=404, detail="Refactoring not found")
+    if not refactoring.analysis_result:
+        raise HTTPException(status_code=404, detail="Analysis not available yet")
     
-    return refactoring
+    return refactoring.analysis_result
+
+@router.get("/{refactoring_id}/suggestions", response_model=CodeSuggestionsResponse)
+async def get_refactoring_suggestions(
+    refactoring_id: UUID,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the suggestions stored with a refactoring by the combined review."""
+    refactoring = await db.get(CodeRefactoring, refactoring_id)
+    if not refactoring:
+        raise HTTPException(status_code=404, detail="Refactoring not found")
+    if refactoring.suggestions is None:
+        raise HTTPException(status_code=404, detail="Suggestions not available yet")
+    
+    return CodeSuggestionsResponse(
+        suggestions=[CodeSuggestion(**suggestion) for suggestion in json.loads(refactoring.suggestions)],
+        language=refactoring.language or ai_service.detect_language(refactoring.original_code),
+        code_length=len(refactoring.original_code)
+    )
 
 @router.post("/{refactoring_id}/feedback", response_model=RefactoringFeedbackResponse)
 async def create_feedback(
     refactoring_id: UUID,
     feedback: RefactoringFeedbackCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add feedback to a refactoring."""
-    refactoring = db.query(CodeRefactoring).filter(CodeRefactoring.id == refactoring_id).first()
+    refactoring = await db.get(CodeRefactoring, refactoring_id)
     if not refactoring:
         raise HTTPException(status_code=404, detail="Refactoring not found")
     
@@ -119,32 +533,37 @@ async def create_feedback(
         comment=feedback.comment
     )
     db.add(db_feedback)
-    db.commit()
-    db.refresh(db_feedback)
+    await db.commit()
+    await db.refresh(db_feedback)
     return db_feedback
 
 @router.post("/analyze", response_model=CodeAnalysisResult)
 async def analyze_code(
     code: str,
-    language: str = None
+    language: str = None,
+    use_model: bool = False,
+    tenant: str = Depends(get_tenant)
 ):
-    """Analyze code quality without refactoring."""
+    """Analyze code quality without refactoring; set use_model to have the model reword the main issues."""
     if not language:
         language = ai_service.detect_language(code)
     
-    analysis_result = ai_service.analyze_code_quality(code, language)
+    with scheduling(tenant=tenant):
+        analysis_result = await ai_service.analyze_code_quality(code, language, use_model)
     return CodeAnalysisResult(**analysis_result)
 
 @router.post("/suggestions", response_model=CodeSuggestionsResponse)
 async def get_suggestions(
     code: str,
-    language: str = None
+    language: str = None,
+    tenant: str = Depends(get_tenant)
 ):
     """Get improvement suggestions for code."""
     if not language:
         language = ai_service.detect_language(code)
     
-    suggestions = ai_service.suggest_improvements(code, language)
+    with scheduling(tenant=tenant):
+        suggestions = await ai_service.suggest_improvements(code, language)
     
     # Convert to CodeSuggestion objects
     code_suggestions = [
@@ -160,30 +579,100 @@ async def get_suggestions(
 @router.post("/explain")
 async def explain_code(
     code: str,
-    language: str = None
+    language: str = None,
+    tenant: str = Depends(get_tenant)
 ):
     """Get a detailed explanation of what the code does."""
     if not language:
         language = ai_service.detect_language(code)
     
-    explanation = ai_service.explain_code(code, language)
+    with scheduling(tenant=tenant):
+        explanation = await ai_service.explain_code(code, language)
     return {"explanation": explanation, "language": language}
 
-@router.get("/", response_model=List[CodeRefactoringResponse])
+@router.post("/explain/stream")
+async def explain_code_stream(
+    code: str,
+    language: str = None,
+    tenant: str = Depends(get_tenant)
+):
+    """Stream a detailed explanation of the code as Server-Sent Events."""
+    if not language:
+        language = ai_service.detect_language(code)
+    
+    return StreamingResponse(_stream_explanation(code, language, tenant), media_type="text/event-stream")
+
+@router.post("/estimate", response_model=TokenEstimateResponse)
+async def estimate_tokens(
+    code: str,
+    operation: str = "refactor",
+    language: str = None
+):
+    """Estimate the token usage of an operation without calling the model."""
+    if operation not in OUTPUT_BUDGETS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation: {operation}")
+    if not language:
+        language = ai_service.detect_language(code)
+
+    # Sized for the active backend's model, e.g. AI_BACKEND_MODEL and its context window
+    messages, _ = build_messages(operation, code, language)
+    budget = estimate(ai_service.model, operation, messages, code, ai_service.context_window)
+    return TokenEstimateResponse(
+        operation=operation,
+        language=language,
+        model=ai_service.model,
+        input_tokens=budget.input_tokens,
+        max_output_tokens=budget.max_output_tokens,
+        context_window=budget.context_window
+    )
+
+@router.get("/", response_model=CodeRefactoringPage)
 async def list_refactorings(
-    skip: int = 0,
-    limit: int = 10,
-    db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    language: Optional[str] = None,
+    issue_type: Optional[str] = None,
+    issue_severity: Optional[str] = None,
+    include_code: bool = False,
+    include_analysis: bool = False,
+    diff: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all refactorings with pagination."""
-    refactorings = db.query(CodeRefactoring).offset(skip).limit(limit).all()
+    """
+    List refactorings newest first, one keyset-paginated page at a time.
+
+    Code, explanations and analyses are only loaded when requested; feedback
+    for the whole page is loaded with one extra query. ``issue_type`` and
+    ``issue_severity`` keep refactorings whose analysis has a matching issue,
+    e.g. ``issue_type=security&issue_severity=critical``.
+    """
+    columns = list(LIST_COLUMNS) + (list(CODE_COLUMNS) if include_code else [])
+    if include_analysis:
+        columns.append(CodeRefactoring.analysis_result)
+    blobs = [CodeRefactoring.original_blob, CodeRefactoring.refactored_blob]
+    statement = select(CodeRefactoring).options(
+        load_only(*columns, raiseload=True),
+        *(joinedload(blob) if include_code else raiseload(blob) for blob in blobs),
+        selectinload(CodeRefactoring.feedback)
+    )
+    if status:
+        statement = statement.where(CodeRefactoring.status == status)
+    if language:
+        statement = statement.where(CodeRefactoring.language == language.lower())
+    if issue_type or issue_severity:
+        # JSONB containment, served by the GIN index on analysis_result
+        issue = {key: value for key, value in (("type", issue_type), ("severity", issue_severity)) if value}
+        statement = statement.where(CodeRefactoring.analysis_result.contains({"issues": [issue]}))
     
-    for refactoring in refactorings:
-        if refactoring.analysis_result:
-            try:
-                analysis_data = json.loads(refactoring.analysis_result)
-                refactoring.analysis_result = CodeAnalysisResult(**analysis_data)
-            except:
-                refactoring.analysis_result = None
+    page_size = min(limit, settings.LIST_MAX_PAGE_SIZE)
+    try:
+        statement = keyset_statement(statement, page_size, cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page = to_page((await db.scalars(statement)).all(), page_size)
     
-    return refactorings 
\ No newline at end of file
+    return CodeRefactoringPage(
+        items=[_list_item(refactoring, include_code, include_analysis, diff) for refactoring in page.items],
+        next_cursor=page.next_cursor
+    )
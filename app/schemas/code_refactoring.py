@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, Field, field_validator
+from typing import Literal, Optional, List
+from datetime import datetime, UTC
 from uuid import UUID
 
 class CodeRefactoringBase(BaseModel):
@@ -9,7 +9,43 @@ class CodeRefactoringBase(BaseModel):
     focus_areas: Optional[List[str]] = Field(None, description="Areas to focus on during refactoring")
 
 class CodeRefactoringCreate(CodeRefactoringBase):
-    pass
+    parent_id: Optional[UUID] = Field(None, description="Refactoring this code is a new revision of; unchanged units reuse its result")
+    priority: Optional[Literal["interactive", "bulk"]] = Field(
+        None, description="Scheduling class; defaults to interactive for single submissions and bulk for batch items"
+    )
+    deadline: Optional[datetime] = Field(None, description="Time the result is wanted by; work due soon is scheduled first")
+
+    @field_validator("language")
+    @classmethod
+    def _lowercase(cls, language: Optional[str]) -> Optional[str]:
+        # Languages are stored lowercase, as detected ones are, so the listing filter matches either
+        if language is not None:
+            language = language.strip().lower() or None
+        return language
+
+    @field_validator("deadline")
+    @classmethod
+    def _naive_utc(cls, deadline: Optional[datetime]) -> Optional[datetime]:
+        # Stored timestamps are naive UTC; naive input is taken to be UTC already
+        if deadline is not None and deadline.tzinfo is not None:
+            deadline = deadline.astimezone(UTC).replace(tzinfo=None)
+        return deadline
+
+class CodeRefactoringBatchCreate(BaseModel):
+    items: List[CodeRefactoringCreate] = Field(..., min_length=1, description="Snippets to refactor")
+
+class CodeRefactoringBatchResponse(BaseModel):
+    id: UUID
+    total: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class RefactoringBatchStatus(CodeRefactoringBatchResponse):
+    processing: int = Field(0, description="Refactorings still in progress")
+    completed: int = Field(0, description="Refactorings completed successfully")
+    failed: int = Field(0, description="Refactorings that failed")
 
 class RefactoringFeedbackBase(BaseModel):
     rating: int = Field(..., ge=1, le=5, description="Rating from 1 to 5")
@@ -35,8 +71,15 @@ class CodeAnalysisResult(BaseModel):
 class CodeRefactoringResponse(CodeRefactoringBase):
     id: UUID
     refactored_code: Optional[str] = None
+    refactored_diff: Optional[str] = Field(None, description="Unified diff from original_code to the refactored code (diff=true only)")
     explanation: Optional[str] = None
     status: str
+    ai_model: Optional[str] = None
+    reference_id: Optional[UUID] = None
+    parent_id: Optional[UUID] = None
+    revision: int = 1
+    priority: str = "interactive"
+    deadline: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
     feedback: list[RefactoringFeedbackResponse] = []
@@ -45,6 +88,29 @@ class CodeRefactoringResponse(CodeRefactoringBase):
     class Config:
         from_attributes = True
 
+class CodeRefactoringListItem(BaseModel):
+    id: UUID
+    language: Optional[str] = None
+    focus_areas: Optional[List[str]] = None
+    status: str
+    ai_model: Optional[str] = None
+    batch_id: Optional[UUID] = None
+    reference_id: Optional[UUID] = None
+    parent_id: Optional[UUID] = None
+    revision: int = 1
+    created_at: datetime
+    updated_at: datetime
+    feedback: list[RefactoringFeedbackResponse] = []
+    original_code: Optional[str] = Field(None, description="Included with include_code=true")
+    refactored_code: Optional[str] = Field(None, description="Included with include_code=true, unless diff=true")
+    refactored_diff: Optional[str] = Field(None, description="Included with include_code=true and diff=true")
+    explanation: Optional[str] = Field(None, description="Included with include_code=true")
+    analysis_result: Optional[CodeAnalysisResult] = Field(None, description="Included with include_analysis=true")
+
+class CodeRefactoringPage(BaseModel):
+    items: List[CodeRefactoringListItem]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to fetch the next page; null on the last page")
+
 class CodeSuggestion(BaseModel):
     category: str = Field(..., description="Category of suggestion")
     priority: str = Field(..., description="Priority level")
@@ -56,4 +122,12 @@ class CodeSuggestion(BaseModel):
 class CodeSuggestionsResponse(BaseModel):
     suggestions: List[CodeSuggestion]
     language: str
-    code_length: int 
\ No newline at end of file
+    code_length: int 
+
+class TokenEstimateResponse(BaseModel):
+    operation: str
+    language: str
+    model: str
+    input_tokens: int = Field(..., description="Prompt tokens, counted locally")
+    max_output_tokens: int = Field(..., description="max_tokens that would be requested")
+    context_window: int = Field(..., description="Context window of the model")
@@ -1,17 +1,69 @@
+import json
 import openai
-import re
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 from app.core.config import settings
+from app.services.chunking import Chunk, is_valid, outline, split_into_chunks, stitch_results
+from app.services.diffs import PatchError, apply_patch
+from app.services.language_detection import DetectionResult, get_detector
+from app.services.model_router import ModelRouter, record_decision
+from app.services.prompt_builder import (
+    DEFAULT_FOCUS_AREAS,
+    DIFF_OPERATIONS,
+    PROMPT_VERSION,
+    FewShotExample,
+    TokenEstimate,
+    build_messages,
+    build_repair_request,
+    build_request,
+    count_message_tokens,
+    estimate,
+    fits_single_call
+)
+from app.services.response_parsing import (
+    ParsedResponse,
+    ResponseParseError,
+    merge_responses,
+    parse_json_response
+)
+from app.services.result_cache import ResultCache
+from app.services.static_analysis import analyze_code
+from app.services.traffic import ModelUnavailableError, get_traffic_controller
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Log message prefix used when an operation's model call fails
+OPERATION_ERRORS = {
+    "analyze": "Error analyzing code quality",
+    "refactor": "Error refactoring code",
+    "suggest": "Error generating suggestions",
+    "explain": "Error explaining code",
+    "review": "Error reviewing code",
+    "describe_issues": "Error describing analysis issues",
+    "refactor_diff": "Error refactoring code as a patch",
+    "review_diff": "Error reviewing code as a patch"
+}
+
+# Static-analysis issues worth a model call to reword, and how many at most
+WORDED_SEVERITIES = {"medium", "high", "critical"}
+MAX_WORDED_ISSUES = 10
+
+# Lines of code sent from each worded issue's first line
+ISSUE_EXCERPT_LINES = 30
+
 class AIRefactoringService:
     """Service for AI-powered code refactoring."""
     
     def __init__(self):
         """Initialize the AI refactoring service with OpenAI client."""
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = self._create_client()
+        self.model = settings.OPENAI_MODEL
+        # Context window of self.model, overriding MODEL_CONTEXT_WINDOWS (None uses the table)
+        self.context_window: Optional[int] = None
+        self.cache = ResultCache.from_settings()
+        self.traffic = get_traffic_controller()
+        self.router = ModelRouter.from_settings()
         self.supported_languages = {
             'python': '.py',
             'javascript': '.js',
@@ -35,6 +87,10 @@ class AIRefactoringService:
             'sass': '.sass'
         }
     
+    def _create_client(self):
+        """Create the OpenAI client used for completions; retries are handled by the traffic controller."""
+        return openai.OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+
     def detect_language(self, code: str) -> str:
         """
         Detect the programming language of the provided code.
@@ -45,110 +101,443 @@ class AIRefactoringService:
         Returns:
             str: Detected programming language
         """
-        # Simple heuristics for language detection
-        code_lower = code.lower()
-        
-        if 'def ' in code_lower and 'import ' in code_lower:
-            return 'python'
-        elif 'function ' in code_lower and ('var ' in code_lower or 'let ' in code_lower or 'const ' in code_lower):
-            return 'javascript'
-        elif 'function ' in code_lower and 'type ' in code_lower:
-            return 'typescript'
-        elif 'public class ' in code_lower or 'private ' in code_lower:
-            return 'java'
-        elif '#include ' in code_lower and ('int main' in code_lower or 'std::' in code_lower):
-            return 'cpp'
-        elif 'using System;' in code_lower or 'namespace ' in code_lower:
-            return 'csharp'
-        elif 'package ' in code_lower and 'func ' in code_lower:
-            return 'go'
-        elif 'fn ' in code_lower and 'let ' in code_lower:
-            return 'rust'
-        elif '<?php' in code_lower:
-            return 'php'
-        elif 'def ' in code_lower and 'end' in code_lower:
-            return 'ruby'
-        elif 'func ' in code_lower and 'import ' in code_lower:
-            return 'swift'
-        elif 'fun ' in code_lower and 'val ' in code_lower:
-            return 'kotlin'
-        elif 'def ' in code_lower and 'val ' in code_lower:
-            return 'scala'
-        elif '<!DOCTYPE html>' in code_lower or '<html>' in code_lower:
-            return 'html'
-        elif '{' in code_lower and ':' in code_lower and ';' in code_lower:
-            return 'css'
-        elif 'SELECT ' in code_lower or 'INSERT ' in code_lower or 'UPDATE ' in code_lower:
-            return 'sql'
-        else:
-            return 'python'  # Default fallback
-    
-    def analyze_code_quality(self, code: str, language: str) -> Dict[str, any]:
+        return get_detector().predict(code).language
+
+    def detect_language_with_confidence(self, code: str) -> DetectionResult:
         """
-        Analyze code quality and identify potential refactoring opportunities.
+        Detect the programming language together with a confidence in [0, 1].
         
         Args:
             code: The source code to analyze
-            language: Programming language of the code
             
         Returns:
-            Dict containing analysis results
+            DetectionResult: Detected language and confidence
         """
-        analysis_prompt = f"""
-        Analyze the following {language} code for potential refactoring opportunities. 
-        Focus on:
-        1. Code complexity and readability
-        2. Performance issues
-        3. Code smells (long methods, duplicate code, etc.)
-        4. Best practices violations
-        5. Security concerns
-        
-        Code:
-        {code}
-        
-        Provide a JSON response with the following structure:
-        {{
-            "complexity_score": 1-10,
-            "readability_score": 1-10,
-            "issues": [
-                {{
-                    "type": "complexity|readability|performance|security|best_practice",
-                    "severity": "low|medium|high|critical",
-                    "description": "Description of the issue",
-                    "line_numbers": [1, 2, 3],
-                    "suggestion": "How to fix this issue"
-                }}
-            ],
-            "overall_assessment": "Brief summary of code quality"
-        }}
+        return get_detector().predict(code)
+
+    def detect_languages(self, codes: List[str]) -> List[DetectionResult]:
         """
+        Detect the programming languages of many snippets in one pass.
         
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert code reviewer and refactoring specialist. Provide detailed, actionable analysis in JSON format."},
-                    {"role": "user", "content": analysis_prompt}
-                ],
-                temperature=0.1,
-                max_tokens=2000
-            )
-            
-            # Parse the JSON response
-            import json
-            analysis_result = json.loads(response.choices[0].message.content)
-            return analysis_result
+        Args:
+            codes: Source code snippets to analyze
             
+        Returns:
+            List of DetectionResult, in input order
+        """
+        return get_detector().predict_batch(codes)
+
+    def _cache_key(
+        self,
+        operation: str,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> str:
+        """Build the result cache key for a call made with ``model`` (default: the main model) and the current prompts."""
+        return ResultCache.make_key(operation, code, language, focus_areas, model or self.model, PROMPT_VERSION, context)
+
+    def _cache_get(self, key: str) -> Optional[Any]:
+        """Look up a cached result, returning None when caching is disabled or on a miss."""
+        if self.cache is None:
+            return None
+        return self.cache.get(key)
+
+    def _cache_set(self, key: str, operation: str, value: Any, model: Optional[str] = None) -> None:
+        """Store a successful result; fallback results are never cached."""
+        if self.cache is not None:
+            self.cache.set(key, operation, model or self.model, value)
+    
+
+    def _execute(
+        self,
+        operation: str,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        example: Optional[FewShotExample] = None
+    ) -> Any:
+        """
+        Run one service operation against the routed model, going through the result cache.
+
+        A call routed to the small model is retried once on the main model when
+        its output still fails validation after repair.
+
+        Args:
+            operation: One of analyze, refactor, suggest or explain
+            code: The source code sent to the model
+            language: Programming language of the code
+            focus_areas: Refactoring focus areas (refactor only)
+            context: Surrounding-file context for a chunk (refactor only)
+            example: Refactoring of similar code shown to the model (refactor and review only)
+
+        Returns:
+            The parsed, JSON-serializable result or the operation's fallback
+
+        Raises:
+            PromptTooLargeError: If the input cannot fit the model's context window
+            ModelUnavailableError: If the model endpoint is rate limited or failing
+        """
+        decision = self.router.route(operation, code, language, focus_areas)
+        cache_key = self._cache_key(operation, code, language, focus_areas, context, decision.model)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            record_decision(decision._replace(cached=True))
+            return cached
+
+        # Raises PromptTooLargeError before any network call if the input cannot fit
+        request = self._build_request(operation, code, language, focus_areas, context, decision.model, example)
+        try:
+            try:
+                result = self._generate(request, operation, code)
+            except ResponseParseError as e:
+                escalated = self.router.escalate(decision)
+                if escalated is None:
+                    raise
+                logger.warning(f"Escalating {operation} from {decision.model} to {escalated.model}: {e}")
+                decision = escalated
+                request = self._build_request(operation, code, language, focus_areas, context, decision.model, example)
+                result = self._generate(request, operation, code)
+                self._cache_set(
+                    self._cache_key(operation, code, language, focus_areas, context, decision.model),
+                    operation, result, decision.model
+                )
+            # Identical calls are routed the same way, so an escalated result is also served to them
+            self._cache_set(cache_key, operation, result, decision.model)
+            return result
+
+        except ModelUnavailableError:
+            # Not worth a degraded result: the caller should retry later
+            raise
         except Exception as e:
-            logger.error(f"Error analyzing code quality: {e}")
+            logger.error(f"{OPERATION_ERRORS[operation]}: {e}")
+            return self._fallback_result(operation, code, e)
+        finally:
+            record_decision(decision)
+
+    def _execute_code(
+        self,
+        operation: str,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """
+        Run refactor or review, asking for a patch when AI_DIFF_MODE is on.
+
+        Only code of at least ``AI_DIFF_MIN_LINES`` lines is sent as a patch
+        request. A patch that fails, does not apply or breaks code that parsed
+        before is discarded in favour of the full-text operation.
+        """
+        if self._use_diff(code):
+            result = self._execute(f"{operation}_diff", code, language, focus_areas, context, example)
+            if self._patch_usable(result, code, language):
+                return result
+            logger.warning(f"Unusable {operation} patch; requesting the full refactored code")
+        return self._execute(operation, code, language, focus_areas, context, example)
+
+    def _use_diff(self, code: str) -> bool:
+        return settings.AI_DIFF_MODE and code.count("\n") + 1 >= settings.AI_DIFF_MIN_LINES
+
+    def _patch_usable(self, result: Optional[Dict[str, Any]], code: str, language: str) -> bool:
+        return result is not None and (not is_valid(code, language) or is_valid(result["refactored_code"], language))
+
+    def _generate(self, request: Dict[str, Any], operation: str, code: str) -> Any:
+        """
+        Make one call, repair missing fields and return the validated result.
+
+        Raises:
+            ResponseParseError: If required fields are still missing after repair
+        """
+        response = self._complete(request)
+        parsed = self._parse_response(operation, response.choices[0].message.content)
+        return self._finish_result(operation, self._repair(request, operation, code, parsed), code)
+
+    def _complete(self, request: Dict[str, Any]) -> Any:
+        """Send a chat completion through the rate limiter, retries and circuit breaker."""
+        return self.traffic.call(lambda: self.client.chat.completions.create(**request), self._request_tokens(request))
+
+    def _request_tokens(self, request: Dict[str, Any]) -> int:
+        """Tokens a request counts against the tokens/min quota (prompt plus max_tokens)."""
+        return count_message_tokens(request["messages"], request["model"]) + request["max_tokens"]
+
+    def _build_request(
+        self,
+        operation: str,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        model: Optional[str] = None,
+        example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """Build the chat completion arguments for an operation, sized to the model's context window."""
+        model = model or self.model
+        return build_request(model, operation, code, language, focus_areas, context, example, self._window(model))
+
+    def _window(self, model: str) -> Optional[int]:
+        """The context window override for ``model``, if any."""
+        return self.context_window if model == self.model else None
+
+    def estimate_tokens(
+        self, operation: str, code: str, language: str, focus_areas: Optional[List[str]] = None
+    ) -> TokenEstimate:
+        """
+        Estimate the token usage of an operation without calling the model.
+        
+        Args:
+            operation: One of analyze, refactor, suggest or explain
+            code: The source code to send
+            language: Programming language of the code
+            focus_areas: Refactoring focus areas (refactor only)
+            
+        Returns:
+            TokenEstimate with input tokens, the max_tokens that would be requested and the context window
+
+        Raises:
+            PromptTooLargeError: If the request cannot fit the model's context window
+        """
+        messages, _ = build_messages(operation, code, language, focus_areas)
+        return estimate(self.model, operation, messages, code, self.context_window)
+
+    def _parse_response(self, operation: str, content: str) -> ParsedResponse:
+        """Extract and validate the fields of a raw model response."""
+        if operation == "explain":
+            return ParsedResponse(content, [])
+        return parse_json_response(operation, content)
+
+    def _repair(self, request: Dict[str, Any], operation: str, code: str, parsed: ParsedResponse) -> ParsedResponse:
+        """Ask the model once for the fields a response lacked, instead of redoing the whole call."""
+        if not parsed.missing:
+            return parsed
+        response = self._complete(self._build_repair_request(request, operation, code, parsed))
+        return self._merge_repair(operation, parsed, response.choices[0].message.content)
+
+    def _build_repair_request(
+        self, request: Dict[str, Any], operation: str, code: str, parsed: ParsedResponse
+    ) -> Dict[str, Any]:
+        """Build the follow-up request for the fields a response lacked."""
+        logger.warning(f"Requesting missing {operation} fields: {', '.join(parsed.missing)}")
+        return build_repair_request(
+            request["model"], request, operation, code, parsed.value, parsed.missing, self._window(request["model"])
+        )
+
+    def _merge_repair(self, operation: str, parsed: ParsedResponse, content: str) -> ParsedResponse:
+        """Merge the follow-up response into the fields already received."""
+        return merge_responses(operation, parsed, parse_json_response(operation, content))
+
+    def _finish_result(self, operation: str, parsed: ParsedResponse, code: str) -> Any:
+        """
+        Turn a validated response into the cacheable result for an operation.
+
+        A patch is applied to ``code``, so the result of a ``_diff`` operation
+        has the same fields as its full-text counterpart.
+
+        Raises:
+            ResponseParseError: If required fields are still missing or the patch does not apply
+        """
+        if parsed.missing:
+            raise ResponseParseError(operation, parsed.missing)
+        if operation == "suggest":
+            return parsed.value["suggestions"]
+        if operation in DIFF_OPERATIONS:
+            result = dict(parsed.value)
+            try:
+                result["refactored_code"] = apply_patch(code, result.pop("patch"))
+            except PatchError as e:
+                logger.warning(f"Discarding {operation} patch: {e}")
+                raise ResponseParseError(operation, ["patch"])
+            return result
+        return parsed.value
+
+    def _fallback_result(self, operation: str, code: str, error: Exception) -> Any:
+        """Degraded result returned when the model call fails."""
+        if operation == "analyze":
             return {
                 "complexity_score": 5,
                 "readability_score": 5,
                 "issues": [],
                 "overall_assessment": "Unable to analyze code quality due to an error."
             }
+        if operation == "refactor":
+            return {"refactored_code": code, "explanation": f"Unable to refactor code due to an error: {str(error)}"}
+        if operation == "suggest":
+            return []
+        if operation == "describe_issues":
+            # Keep the static wording
+            return {"issues": []}
+        if operation in DIFF_OPERATIONS:
+            # The caller retries with the full-text operation
+            return None
+        if operation == "review":
+            return {
+                "analysis": self._fallback_result("analyze", code, error),
+                "refactored_code": code,
+                "explanation": f"Unable to refactor code due to an error: {str(error)}",
+                "suggestions": []
+            }
+        return f"Unable to explain code due to an error: {str(error)}"
+
+    def _plan_chunks(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, operation: str = "refactor"
+    ) -> Optional[Tuple[List[Chunk], str]]:
+        """Split a large file into chunks plus a shared outline, or None if it fits one call."""
+        if (
+            len(code) <= settings.CHUNKING_THRESHOLD_CHARS
+            and fits_single_call(self.model, operation, code, language, focus_areas, self.context_window)
+        ):
+            return None
+        chunks = split_into_chunks(code, language, settings.CHUNK_MAX_CHARS)
+        if len(chunks) < 2:
+            return None
+        return chunks, outline(chunks, language)
+
+    def _stitch_chunks(self, chunks: List[Chunk], results: List[Dict[str, str]], language: str) -> Tuple[str, str]:
+        """Combine per-chunk refactor results into (refactored_code, explanation)."""
+        return stitch_results(
+            chunks, [(result["refactored_code"], result["explanation"]) for result in results], language
+        )
+
+    def _merge_reviews(self, chunks: List[Chunk], results: List[Dict[str, Any]], language: str) -> Dict[str, Any]:
+        """Combine per-chunk review results into one review of the whole file."""
+        refactored_code, explanation = self._stitch_chunks(chunks, results, language)
+        issues = []
+        for chunk, result in zip(chunks, results):
+            for issue in result["analysis"]["issues"]:
+                # Chunk line numbers are relative to the chunk; make them file-relative
+                line_numbers = issue.get("line_numbers")
+                if isinstance(line_numbers, list):
+                    issue = {**issue, "line_numbers": [
+                        line + chunk.start_line - 1 if isinstance(line, int) else line for line in line_numbers
+                    ]}
+                issues.append(issue)
+        analyses = [result["analysis"] for result in results]
+        return {
+            "analysis": {
+                "complexity_score": max(analysis["complexity_score"] for analysis in analyses),
+                "readability_score": min(analysis["readability_score"] for analysis in analyses),
+                "issues": issues,
+                "overall_assessment": "\n\n".join(
+                    f"{chunk.name or f'lines {chunk.start_line}-{chunk.end_line}'}: {analysis['overall_assessment']}"
+                    for chunk, analysis in zip(chunks, analyses)
+                )
+            },
+            "refactored_code": refactored_code,
+            "explanation": explanation,
+            "suggestions": [suggestion for result in results for suggestion in result["suggestions"]]
+        }
+
+    def review_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """
+        Analyze, refactor and suggest improvements in a single model call.
+        
+        Args:
+            code: The source code to review
+            language: Programming language of the code
+            focus_areas: Optional list of specific areas to focus the refactoring on
+            example: Optional review of near-duplicate code, shown to the model (ignored when chunking)
+            
+        Returns:
+            Dict with ``analysis`` (CodeAnalysisResult fields), ``refactored_code``,
+            ``explanation`` and ``suggestions`` (list of CodeSuggestion fields)
+        """
+        if focus_areas is None:
+            focus_areas = DEFAULT_FOCUS_AREAS
+
+        plan = self._plan_chunks(code, language, focus_areas, "review")
+        if plan is not None:
+            chunks, context = plan
+            with ThreadPoolExecutor(max_workers=settings.CHUNK_MAX_PARALLEL) as pool:
+                results = list(pool.map(
+                    lambda chunk: self._execute_code("review", chunk.text, language, focus_areas, context), chunks
+                ))
+            return self._merge_reviews(chunks, results, language)
+
+        return self._execute_code("review", code, language, focus_areas, example=example)
+
+    def _prepare_wording(
+        self, code: str, analysis: Dict[str, Any], use_model: Optional[bool] = None
+    ) -> Optional[Tuple[List[int], str, str]]:
+        """
+        Select the issues worth rewording and build the excerpts and issue list sent for them.
+
+        Returns:
+            Tuple of (indices of the selected issues, numbered code excerpts,
+            issues as JSON), or None if wording is off or no issue is worth a model call
+        """
+        if not (settings.ANALYSIS_MODEL_WORDING if use_model is None else use_model):
+            return None
+        selected = [
+            index for index, issue in enumerate(analysis["issues"]) if issue["severity"] in WORDED_SEVERITIES
+        ][:MAX_WORDED_ISSUES]
+        if not selected:
+            return None
+
+        lines = code.splitlines()
+        shown = set()
+        issues = []
+        for position, index in enumerate(selected):
+            issue = analysis["issues"][index]
+            for start in issue["line_numbers"] or [1]:
+                shown.update(range(start, min(len(lines), start + ISSUE_EXCERPT_LINES - 1) + 1))
+            issues.append({
+                "index": position,
+                "type": issue["type"],
+                "severity": issue["severity"],
+                "description": issue["description"],
+                "line_numbers": issue["line_numbers"]
+            })
+
+        excerpts = []
+        for number in sorted(shown):
+            if excerpts and number - 1 not in shown:
+                excerpts.append("...")
+            excerpts.append(f"{number}: {lines[number - 1]}")
+        return selected, "\n".join(excerpts), json.dumps(issues, indent=2)
+
+    def _apply_wording(self, analysis: Dict[str, Any], selected: List[int], wording: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the description and suggestion of each reworded issue."""
+        issues = [dict(issue) for issue in analysis["issues"]]
+        for item in wording["issues"]:
+            if 0 <= item["index"] < len(selected):
+                issues[selected[item["index"]]].update(description=item["description"], suggestion=item["suggestion"])
+        return {**analysis, "issues": issues}
+
+    def analyze_code_quality(self, code: str, language: str, use_model: Optional[bool] = None) -> Dict[str, any]:
+        """
+        Analyze code quality and identify potential refactoring opportunities.
+
+        With STATIC_ANALYSIS_ENABLED the scores and issues are computed locally
+        and the model is only asked to reword the more severe issues.
+        
+        Args:
+            code: The source code to analyze
+            language: Programming language of the code
+            use_model: Whether the model rewords the issues (default: ANALYSIS_MODEL_WORDING)
+            
+        Returns:
+            Dict containing analysis results
+        """
+        if settings.STATIC_ANALYSIS_ENABLED:
+            analysis = analyze_code(code, language)
+            wording = self._prepare_wording(code, analysis, use_model)
+            if wording is None:
+                return analysis
+            selected, excerpts, issues = wording
+            reworded = self._execute("describe_issues", excerpts, language, context=issues)
+            return self._apply_wording(analysis, selected, reworded)
+        return self._execute("analyze", code, language)
     
-    def refactor_code(self, code: str, language: str, focus_areas: Optional[List[str]] = None) -> Tuple[str, str]:
+    def refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Tuple[str, str]:
         """
         Refactor the provided code using AI.
         
@@ -156,62 +545,25 @@ class AIRefactoringService:
             code: The source code to refactor
             language: Programming language of the code
             focus_areas: Optional list of specific areas to focus on (e.g., ['performance', 'readability'])
+            example: Optional refactoring of near-duplicate code, shown to the model (ignored when chunking)
             
         Returns:
             Tuple of (refactored_code, explanation)
         """
         if focus_areas is None:
-            focus_areas = ['readability', 'performance', 'best_practices']
-        
-        focus_areas_str = ', '.join(focus_areas)
-        
-        refactoring_prompt = f"""
-        Refactor the following {language} code to improve {focus_areas_str}.
-        
-        Requirements:
-        1. Maintain the same functionality
-        2. Improve code quality and readability
-        3. Follow {language} best practices
-        4. Add helpful comments where appropriate
-        5. Optimize performance if possible
-        
-        Original Code:
-        {code}
-        
-        Please provide your response in the following JSON format:
-        {{
-            "refactored_code": "The improved code",
-            "explanation": "Detailed explanation of what was changed and why",
-            "improvements": [
-                {{
-                    "type": "readability|performance|security|best_practice",
-                    "description": "What was improved",
-                    "impact": "How this improvement helps"
-                }}
-            ]
-        }}
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": f"You are an expert {language} developer and refactoring specialist. Always maintain functionality while improving code quality."},
-                    {"role": "user", "content": refactoring_prompt}
-                ],
-                temperature=0.2,
-                max_tokens=3000
-            )
-            
-            # Parse the JSON response
-            import json
-            result = json.loads(response.choices[0].message.content)
-            
-            return result["refactored_code"], result["explanation"]
-            
-        except Exception as e:
-            logger.error(f"Error refactoring code: {e}")
-            return code, f"Unable to refactor code due to an error: {str(e)}"
+            focus_areas = DEFAULT_FOCUS_AREAS
+
+        plan = self._plan_chunks(code, language, focus_areas)
+        if plan is not None:
+            chunks, context = plan
+            with ThreadPoolExecutor(max_workers=settings.CHUNK_MAX_PARALLEL) as pool:
+                results = list(pool.map(
+                    lambda chunk: self._execute_code("refactor", chunk.text, language, focus_areas, context), chunks
+                ))
+            return self._stitch_chunks(chunks, results, language)
+
+        result = self._execute_code("refactor", code, language, focus_areas, example=example)
+        return result["refactored_code"], result["explanation"]
     
     def suggest_improvements(self, code: str, language: str) -> List[Dict[str, str]]:
         """
@@ -224,46 +576,7 @@ class AIRefactoringService:
         Returns:
             List of improvement suggestions
         """
-        suggestions_prompt = f"""
-        Analyze the following {language} code and suggest specific improvements.
-        Focus on actionable, specific suggestions that can be implemented.
-        
-        Code:
-        {code}
-        
-        Provide your response in JSON format:
-        {{
-            "suggestions": [
-                {{
-                    "category": "readability|performance|security|maintainability|best_practice",
-                    "priority": "low|medium|high|critical",
-                    "title": "Brief title of the suggestion",
-                    "description": "Detailed description of the improvement",
-                    "example": "Code example showing the improvement",
-                    "rationale": "Why this improvement is beneficial"
-                }}
-            ]
-        }}
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": f"You are an expert {language} developer providing actionable improvement suggestions."},
-                    {"role": "user", "content": suggestions_prompt}
-                ],
-                temperature=0.1,
-                max_tokens=2000
-            )
-            
-            import json
-            result = json.loads(response.choices[0].message.content)
-            return result.get("suggestions", [])
-            
-        except Exception as e:
-            logger.error(f"Error generating suggestions: {e}")
-            return []
+        return self._execute("suggest", code, language)
     
     def explain_code(self, code: str, language: str) -> str:
         """
@@ -276,33 +589,4 @@ class AIRefactoringService:
         Returns:
             Detailed explanation of the code
         """
-        explanation_prompt = f"""
-        Explain the following {language} code in detail. Include:
-        1. What the code does overall
-        2. How each major function/class works
-        3. Key algorithms or patterns used
-        4. Any important variables or data structures
-        5. Potential edge cases or considerations
-        
-        Code:
-        {code}
-        
-        Provide a clear, educational explanation suitable for developers.
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": f"You are an expert {language} developer and educator. Provide clear, detailed explanations."},
-                    {"role": "user", "content": explanation_prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1500
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Error explaining code: {e}")
-            return f"Unable to explain code due to an error: {str(e)}" 
\ No newline at end of file
+        return self._execute("explain", code, language)
@@ -0,0 +1,332 @@
+import asyncio
+import copy
+import functools
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+
+from app.core.config import settings
+from app.services.ai_refactoring import AIRefactoringService, DEFAULT_FOCUS_AREAS, OPERATION_ERRORS
+from app.services.chunking import Chunk
+from app.services.model_router import RoutingDecision, record_decision
+from app.services.prompt_builder import FewShotExample
+from app.services.response_parsing import ParsedResponse, ResponseParseError, StreamingJSONParser, parse_streamed_response
+from app.services.scheduler import get_scheduler
+from app.services.single_flight import SingleFlight
+from app.services.static_analysis import analyze_code
+from app.services.traffic import ModelUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Process-wide transport shared by every async service instance (model call
+# concurrency is bounded by the scheduler)
+_http_client: Optional[httpx.AsyncClient] = None
+# Identical model calls in flight in this process, keyed by their result cache key
+in_flight = SingleFlight()
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared, connection-pooled HTTP client for OpenAI calls."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=settings.OPENAI_TIMEOUT_SECONDS
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client; call on application shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+class AsyncAIRefactoringService(AIRefactoringService):
+    """
+    Non-blocking variant of AIRefactoringService built on openai.AsyncOpenAI.
+
+    Prompts, parsing and fallbacks are inherited; only the transport differs,
+    so awaiting these methods never blocks the event loop.
+    """
+
+    def _create_client(self):
+        """Create an AsyncOpenAI client on the shared connection pool."""
+        return openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=get_http_client(),
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
+            max_retries=0
+        )
+
+    async def _complete(self, request: Dict[str, Any]) -> Any:
+        """Send a chat completion through the traffic controller, holding a concurrency slot per attempt."""
+        async def send():
+            async with get_scheduler().slot():
+                return await self.client.chat.completions.create(**request)
+
+        return await self.traffic.acall(send, self._request_tokens(request))
+
+    async def _execute(
+        self,
+        operation: str,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        example: Optional[FewShotExample] = None
+    ) -> Any:
+        """Async counterpart of AIRefactoringService._execute."""
+        decision = self.router.route(operation, code, language, focus_areas)
+        cache_key = self._cache_key(operation, code, language, focus_areas, context, decision.model)
+        # The persistent cache tier does database I/O, so keep it off the event loop
+        cached = await asyncio.to_thread(self._cache_get, cache_key)
+        if cached is not None:
+            record_decision(decision._replace(cached=True))
+            return cached
+
+        call = functools.partial(
+            self._call_model, decision, cache_key, operation, code, language, focus_areas, context, example
+        )
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await call()
+        result, shared = await in_flight.run(cache_key, call)
+        if shared:
+            # Served by a call another request started, which records its own decision;
+            # each caller gets its own copy since callers may mutate results
+            record_decision(decision._replace(cached=True))
+            return copy.deepcopy(result)
+        return result
+
+    async def _call_model(
+        self,
+        decision: RoutingDecision,
+        cache_key: str,
+        operation: str,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]],
+        context: Optional[str],
+        example: Optional[FewShotExample]
+    ) -> Any:
+        """Call the model for a cache miss, falling back to a default result on errors."""
+        request = self._build_request(operation, code, language, focus_areas, context, decision.model, example)
+        try:
+            try:
+                response = await self._complete(request)
+                parsed = self._parse_response(operation, response.choices[0].message.content)
+                result = self._finish_result(operation, await self._repair(request, operation, code, parsed), code)
+            except ResponseParseError as e:
+                decision, result = await self._escalate(decision, e, code, language, focus_areas, context, example)
+            await asyncio.to_thread(self._cache_set, cache_key, operation, result, decision.model)
+            return result
+
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"{OPERATION_ERRORS[operation]}: {e}")
+            return self._fallback_result(operation, code, e)
+        finally:
+            record_decision(decision)
+
+    async def _execute_code(
+        self,
+        operation: str,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """Async counterpart of AIRefactoringService._execute_code."""
+        if self._use_diff(code):
+            result = await self._execute(f"{operation}_diff", code, language, focus_areas, context, example)
+            if self._patch_usable(result, code, language):
+                return result
+            logger.warning(f"Unusable {operation} patch; requesting the full refactored code")
+        return await self._execute(operation, code, language, focus_areas, context, example)
+
+    async def _escalate(
+        self,
+        decision: RoutingDecision,
+        error: ResponseParseError,
+        code: str,
+        language: str,
+        focus_areas: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        example: Optional[FewShotExample] = None
+    ) -> Tuple[RoutingDecision, Any]:
+        """Redo a call on the main model after the small model's output failed validation."""
+        escalated = self.router.escalate(decision)
+        if escalated is None:
+            raise error
+        operation = decision.operation
+        logger.warning(f"Escalating {operation} from {decision.model} to {escalated.model}: {error}")
+        request = self._build_request(operation, code, language, focus_areas, context, escalated.model, example)
+        response = await self._complete(request)
+        parsed = self._parse_response(operation, response.choices[0].message.content)
+        result = self._finish_result(operation, await self._repair(request, operation, code, parsed), code)
+        await asyncio.to_thread(
+            self._cache_set,
+            self._cache_key(operation, code, language, focus_areas, context, escalated.model),
+            operation, result, escalated.model
+        )
+        return escalated, result
+
+    async def _stream(
+        self, operation: str, code: str, language: str, focus_areas: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream an operation from the model.
+
+        Yields ``("token", text)`` as the output arrives, then exactly one
+        ``("result", value)`` with the parsed (or fallback) result. Explanations
+        stream as generated; JSON operations stream only the decoded
+        ``refactored_code``, never the JSON around it. Cache hits yield only the
+        result.
+        """
+        decision = self.router.route(operation, code, language, focus_areas)
+        cache_key = self._cache_key(operation, code, language, focus_areas, model=decision.model)
+        cached = await asyncio.to_thread(self._cache_get, cache_key)
+        if cached is not None:
+            record_decision(decision._replace(cached=True))
+            yield "result", cached
+            return
+
+        request = self._build_request(operation, code, language, focus_areas, model=decision.model)
+        fragments = []
+        # JSON responses are scanned as they arrive, so a cut-off stream can be repaired
+        parser = StreamingJSONParser("refactored_code") if operation != "explain" else None
+        try:
+            async with get_scheduler().slot():
+                # Only opening the stream is retried; a stream cut off later is repaired below
+                stream = await self.traffic.acall(
+                    lambda: self.client.chat.completions.create(**request, stream=True),
+                    self._request_tokens(request),
+                    hedge=False
+                )
+                try:
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if not delta:
+                            continue
+                        fragments.append(delta)
+                        text = parser.feed(delta) if parser is not None else delta
+                        if text:
+                            yield "token", text
+                except Exception as e:
+                    if parser is None or not fragments:
+                        raise
+                    logger.warning(f"{operation} stream interrupted, repairing partial response: {e}")
+
+            if parser is None:
+                parsed = self._parse_response(operation, "".join(fragments))
+            else:
+                parsed = parse_streamed_response(operation, parser)
+            try:
+                result = self._finish_result(operation, await self._repair(request, operation, code, parsed), code)
+            except ResponseParseError as e:
+                # The escalated result is not streamed; it replaces the tokens sent so far
+                decision, result = await self._escalate(decision, e, code, language, focus_areas)
+            await asyncio.to_thread(self._cache_set, cache_key, operation, result, decision.model)
+
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"{OPERATION_ERRORS[operation]}: {e}")
+            result = self._fallback_result(operation, code, e)
+        finally:
+            record_decision(decision)
+
+        yield "result", result
+
+    async def _execute_chunks(
+        self, operation: str, chunks: List[Chunk], language: str, focus_areas: List[str], context: str
+    ) -> List[Dict[str, Any]]:
+        """Run an operation on each chunk, at most CHUNK_MAX_PARALLEL at a time, in chunk order."""
+        # Like the sync service's thread pool: a large file cannot queue all its chunks at once
+        # and crowd out other refactorings waiting for the scheduler
+        semaphore = asyncio.Semaphore(settings.CHUNK_MAX_PARALLEL)
+
+        async def run(chunk: Chunk) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._execute_code(operation, chunk.text, language, focus_areas, context)
+
+        return await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+    async def review_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """Analyze, refactor and suggest improvements in a single model call."""
+        if focus_areas is None:
+            focus_areas = DEFAULT_FOCUS_AREAS
+
+        plan = self._plan_chunks(code, language, focus_areas, "review")
+        if plan is not None:
+            chunks, context = plan
+            results = await self._execute_chunks("review", chunks, language, focus_areas, context)
+            return self._merge_reviews(chunks, results, language)
+
+        return await self._execute_code("review", code, language, focus_areas, example=example)
+
+    async def _repair(
+        self, request: Dict[str, Any], operation: str, code: str, parsed: ParsedResponse
+    ) -> ParsedResponse:
+        """Async counterpart of AIRefactoringService._repair."""
+        if not parsed.missing:
+            return parsed
+        response = await self._complete(self._build_repair_request(request, operation, code, parsed))
+        return self._merge_repair(operation, parsed, response.choices[0].message.content)
+
+    async def analyze_code_quality(self, code: str, language: str, use_model: Optional[bool] = None) -> Dict[str, any]:
+        """Analyze code quality locally, optionally having the model reword the more severe issues."""
+        if settings.STATIC_ANALYSIS_ENABLED:
+            analysis = analyze_code(code, language)
+            wording = self._prepare_wording(code, analysis, use_model)
+            if wording is None:
+                return analysis
+            selected, excerpts, issues = wording
+            reworded = await self._execute("describe_issues", excerpts, language, context=issues)
+            return self._apply_wording(analysis, selected, reworded)
+        return await self._execute("analyze", code, language)
+
+    async def refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Tuple[str, str]:
+        """Refactor the provided code, returning (refactored_code, explanation)."""
+        if focus_areas is None:
+            focus_areas = DEFAULT_FOCUS_AREAS
+
+        plan = self._plan_chunks(code, language, focus_areas)
+        if plan is not None:
+            chunks, context = plan
+            results = await self._execute_chunks("refactor", chunks, language, focus_areas, context)
+            return self._stitch_chunks(chunks, results, language)
+
+        result = await self._execute_code("refactor", code, language, focus_areas, example=example)
+        return result["refactored_code"], result["explanation"]
+
+    async def suggest_improvements(self, code: str, language: str) -> List[Dict[str, str]]:
+        """Suggest specific improvements for the code without refactoring it."""
+        return await self._execute("suggest", code, language)
+
+    async def explain_code(self, code: str, language: str) -> str:
+        """Generate a detailed explanation of what the code does."""
+        return await self._execute("explain", code, language)
+
+    def stream_refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream a refactoring; the final result is a dict with refactored_code and explanation."""
+        if focus_areas is None:
+            focus_areas = DEFAULT_FOCUS_AREAS
+
+        return self._stream("refactor", code, language, focus_areas)
+
+    def stream_explain_code(self, code: str, language: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream an explanation; the final result is the full explanation text."""
+        return self._stream("explain", code, language)
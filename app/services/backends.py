@@ -0,0 +1,101 @@
+"""
+AI backend registry.
+
+Every backend exposes the async interface of ``AIBackend``; which one the API
+and the worker use is selected with ``Settings.AI_BACKEND``.
+"""
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Protocol, Tuple
+
+from app.core.config import settings
+from app.services.language_detection import DetectionResult
+from app.services.prompt_builder import FewShotExample
+
+class AIBackend(Protocol):
+    """Interface shared by every AI backend."""
+
+    # Model requests are sized for (its context window bounds token estimates)
+    model: str
+    # Context window of ``model`` in tokens, or None to use MODEL_CONTEXT_WINDOWS
+    context_window: Optional[int]
+
+    def detect_language(self, code: str) -> str: ...
+
+    def detect_language_with_confidence(self, code: str) -> DetectionResult: ...
+
+    def detect_languages(self, codes: List[str]) -> List[DetectionResult]: ...
+
+    async def analyze_code_quality(self, code: str, language: str, use_model: Optional[bool] = None) -> Dict[str, Any]: ...
+
+    async def refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Tuple[str, str]: ...
+
+    async def suggest_improvements(self, code: str, language: str) -> List[Dict[str, str]]: ...
+
+    async def explain_code(self, code: str, language: str) -> str: ...
+
+    async def review_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]: ...
+
+    def stream_refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]: ...
+
+    def stream_explain_code(self, code: str, language: str) -> AsyncIterator[Tuple[str, Any]]: ...
+
+_registry: Dict[str, Callable[[], AIBackend]] = {}
+
+def register_backend(name: str) -> Callable[[Callable[[], AIBackend]], Callable[[], AIBackend]]:
+    """Register a backend factory under ``name`` (usable as a decorator)."""
+    def decorator(factory: Callable[[], AIBackend]) -> Callable[[], AIBackend]:
+        _registry[name] = factory
+        return factory
+    return decorator
+
+def available_backends() -> List[str]:
+    """Names of the registered backends, sorted."""
+    return sorted(_registry)
+
+def create_backend(name: Optional[str] = None) -> AIBackend:
+    """
+    Instantiate a backend.
+
+    Args:
+        name: Registered backend name (default: ``Settings.AI_BACKEND``)
+
+    Raises:
+        ValueError: If no backend is registered under the name
+    """
+    name = name or settings.AI_BACKEND
+    if name not in _registry:
+        raise ValueError(f"Unknown AI backend '{name}'; available: {', '.join(available_backends())}")
+    return _registry[name]()
+
+@lru_cache(maxsize=1)
+def get_ai_service() -> AIBackend:
+    """Return the process-wide backend selected in settings."""
+    return create_backend()
+
+# Backends are imported lazily so unused ones cost nothing at startup
+
+@register_backend("openai")
+def _openai_backend() -> AIBackend:
+    from app.services.async_ai_refactoring import AsyncAIRefactoringService
+    return AsyncAIRefactoringService()
+
+@register_backend("openai_compatible")
+def _openai_compatible_backend() -> AIBackend:
+    from app.services.local_ai_refactoring import OpenAICompatibleAIRefactoringService
+    return OpenAICompatibleAIRefactoringService()
+
+@register_backend("deterministic")
+def _deterministic_backend() -> AIBackend:
+    from app.services.deterministic_ai_refactoring import DeterministicAIRefactoringService
+    return DeterministicAIRefactoringService()
+
+@register_backend("mock")
+def _mock_backend() -> AIBackend:
+    from app.services.mock_ai_refactoring import AsyncMockAIRefactoringService
+    return AsyncMockAIRefactoringService()
@@ -0,0 +1,77 @@
+"""
+Content-addressed, compressed storage of code text.
+
+Code is stored once per distinct text in ``code_blobs``, keyed by the SHA-256
+of its UTF-8 bytes, so a resubmitted snippet or a refactoring that reproduces
+an earlier result adds no data. Every blob records its codec, so zstd, zlib
+and uncompressed blobs can share the table and the compression settings can
+change at any time without rewriting what is already stored.
+"""
+import hashlib
+import zlib
+from typing import NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; blobs are compressed with zlib instead
+    zstandard = None
+
+from app.core.config import settings
+
+class BlobCodecError(ValueError):
+    """Raised when a blob's codec is unknown or its library is not installed."""
+
+class EncodedBlob(NamedTuple):
+    hash: str
+    codec: str     # zstd, zlib or none
+    data: bytes
+    size: int      # length of the uncompressed UTF-8 text in bytes
+
+def blob_hash(text: str) -> str:
+    """Content address of a text: the SHA-256 of its UTF-8 bytes."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _compress(raw: bytes) -> Optional[Tuple[str, bytes]]:
+    codec = settings.BLOB_COMPRESSION
+    if codec == "zstd" and zstandard is None:
+        codec = "zlib"
+    if codec == "zstd":
+        return codec, zstandard.ZstdCompressor(level=settings.BLOB_COMPRESSION_LEVEL).compress(raw)
+    if codec == "zlib":
+        return codec, zlib.compress(raw, min(settings.BLOB_COMPRESSION_LEVEL, 9))
+    return None
+
+def encode_blob(text: str) -> EncodedBlob:
+    """
+    Hash and compress a text for storage.
+
+    Texts shorter than BLOB_COMPRESSION_MIN_BYTES, and texts that do not
+    shrink, are stored uncompressed.
+    """
+    raw = text.encode('utf-8')
+    codec, data = "none", raw
+    if len(raw) >= settings.BLOB_COMPRESSION_MIN_BYTES:
+        compressed = _compress(raw)
+        if compressed is not None and len(compressed[1]) < len(raw):
+            codec, data = compressed
+    return EncodedBlob(hashlib.sha256(raw).hexdigest(), codec, data, len(raw))
+
+def decode_blob(codec: str, data: bytes) -> str:
+    """
+    Decompress a stored blob back to its text.
+
+    Raises:
+        BlobCodecError: If the codec is unknown, or zstd without ``zstandard`` installed
+    """
+    data = bytes(data)
+    if codec == "none":
+        raw = data
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    elif codec == "zstd":
+        if zstandard is None:
+            raise BlobCodecError("Blob is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raise BlobCodecError(f"Unknown blob codec: {codec}")
+    return raw.decode('utf-8')
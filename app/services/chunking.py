@@ -0,0 +1,247 @@
+"""
+Split large source files into semantically coherent chunks and stitch them back.
+
+Python is split on top-level ``ast`` nodes; brace languages on points where
+brace depth returns to zero; everything else on unindented lines that follow
+a blank line. Adjacent small units are merged up to a size limit so each
+chunk is worth a model call.
+"""
+import ast
+import re
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+BRACE_LANGUAGES = {
+    'javascript', 'typescript', 'java', 'cpp', 'csharp', 'go', 'rust', 'php',
+    'swift', 'kotlin', 'scala', 'css', 'scss', 'r'
+}
+
+# Brace languages where '#' starts a line comment (elsewhere it is a selector or attribute)
+HASH_COMMENT_LANGUAGES = {'php', 'r'}
+
+# Lines that continue the previous unit even when unindented
+CONTINUATION_PATTERN = re.compile(r"^(end\b|else\b|elif\b|elsif\b|except\b|finally\b|rescue\b|ensure\b|when\b|[)\]}])")
+
+class Chunk(NamedTuple):
+    kind: str          # function, class, block
+    name: str          # best-effort unit name, used in explanations
+    start_line: int    # 1-based, inclusive
+    end_line: int      # 1-based, inclusive
+    text: str
+
+def split_into_chunks(code: str, language: str, max_chars: int = 4000) -> List[Chunk]:
+    """
+    Split ``code`` into contiguous chunks that together reproduce it exactly.
+
+    Args:
+        code: Source code to split
+        language: Programming language of the code
+        max_chars: Soft size limit; a single unit larger than this stays whole
+
+    Returns:
+        List of chunks in file order
+    """
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    units = None
+    if language == 'python':
+        units = _python_units(code, lines)
+    if units is None and language in BRACE_LANGUAGES:
+        units = _brace_units(lines, language)
+    if units is None:
+        units = _indent_units(lines)
+
+    return _merge_units(units, lines, max_chars)
+
+def join_chunks(texts: List[str]) -> str:
+    """Stitch chunk texts back into one file, keeping chunks on separate lines."""
+    stitched = ""
+    for text in texts:
+        if stitched and not stitched.endswith("\n"):
+            stitched += "\n"
+        stitched += text
+    return stitched
+
+def is_valid(code: str, language: str) -> bool:
+    """Check that code parses (Python) or has balanced brackets (brace languages)."""
+    if not code.strip():
+        return False
+    if language == 'python':
+        try:
+            ast.parse(code)
+        except (SyntaxError, ValueError):
+            return False
+        return True
+    if language in BRACE_LANGUAGES:
+        depths = _scan_depths(code.splitlines(keepends=True), language)
+        return depths is not None and (not depths or depths[-1] == 0)
+    return True
+
+def outline(chunks: List[Chunk], language: str, max_chars: int = 2000) -> str:
+    """
+    Summarize the file for shared context: imports plus the first line of every unit.
+
+    Sent with each chunk so the model knows which names exist elsewhere.
+    """
+    summary = []
+    for chunk in chunks:
+        for line in chunk.text.splitlines():
+            stripped = line.strip()
+            if not stripped or stripped.startswith(("#", "//", "/*", "*", "@")) and not _is_import(stripped, language):
+                continue
+            if chunk.kind == 'block' and not _is_import(stripped, language):
+                continue
+            summary.append(line.rstrip() if chunk.kind == 'block' else stripped)
+            if chunk.kind != 'block':
+                break
+    return "\n".join(summary)[:max_chars]
+
+def _is_import(line: str, language: str) -> bool:
+    if language == 'python':
+        return line.startswith(("import ", "from "))
+    return line.startswith(("import ", "#include", "using ", "use ", "require", "package ", "library(", "@import"))
+
+def _python_units(code: str, lines: List[str]) -> Optional[List[Tuple[int, str, str]]]:
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    units = []
+    for node in tree.body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])]) - 1
+        # Attach comments directly above a unit to it
+        while start > 0 and lines[start - 1].lstrip().startswith("#"):
+            start -= 1
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            units.append((start, 'function', node.name))
+        elif isinstance(node, ast.ClassDef):
+            units.append((start, 'class', node.name))
+        else:
+            units.append((start, 'block', ''))
+    if not units:
+        return None
+    units[0] = (0,) + units[0][1:]
+    return units
+
+def _brace_units(lines: List[str], language: str) -> Optional[List[Tuple[int, str, str]]]:
+    depths = _scan_depths(lines, language)
+    if depths is None:
+        return None
+
+    units = [(0, 'block', '')]
+    for index in range(1, len(lines)):
+        if depths[index - 1] != 0 or not lines[index].strip():
+            continue
+        previous = lines[index - 1].strip()
+        if not previous or previous.endswith(("}", "};", "});")):
+            units.append((index, 'block', ''))
+    return [(start, *_describe(lines[start])) for start, _, _ in units]
+
+def _indent_units(lines: List[str]) -> List[Tuple[int, str, str]]:
+    units = [0]
+    for index in range(1, len(lines)):
+        line = lines[index]
+        if not line.strip() or line[0] in (" ", "\t") or CONTINUATION_PATTERN.match(line):
+            continue
+        if not lines[index - 1].strip():
+            units.append(index)
+    return [(start, *_describe(lines[start])) for start in units]
+
+def _describe(line: str) -> Tuple[str, str]:
+    match = re.search(r"\b(class|struct|interface|trait|object|impl|module)\s+([A-Za-z_][A-Za-z0-9_]*)", line)
+    if match:
+        return 'class', match.group(2)
+    match = re.search(r"\b(?:def|func|fn|fun|function)\s+([A-Za-z_][A-Za-z0-9_]*)", line)
+    if match:
+        return 'function', match.group(1)
+    return 'block', ''
+
+def _scan_depths(lines: List[str], language: str) -> Optional[List[int]]:
+    """Brace depth after each line, ignoring strings and comments; None if unbalanced."""
+    depth = 0
+    depths = []
+    in_block_comment = False
+    for line in lines:
+        index = 0
+        quote = None
+        while index < len(line):
+            char = line[index]
+            pair = line[index:index + 2]
+            if in_block_comment:
+                if pair == "*/":
+                    in_block_comment = False
+                    index += 1
+            elif quote:
+                if char == "\\":
+                    index += 1
+                elif char == quote:
+                    quote = None
+            elif pair == "/*":
+                in_block_comment = True
+                index += 1
+            elif pair == "//" or (char == "#" and language in HASH_COMMENT_LANGUAGES):
+                break
+            elif char in "\"'`":
+                quote = char
+            elif char in "{([":
+                depth += 1
+            elif char in "})]":
+                depth -= 1
+                if depth < 0:
+                    return None
+            index += 1
+        depths.append(depth)
+    return depths
+
+def _merge_units(units, lines: List[str], max_chars: int) -> List[Chunk]:
+    """Turn unit start lines into chunks, merging neighbours up to ``max_chars``."""
+    bounds = [start for start, _, _ in units] + [len(lines)]
+    pieces = [
+        (kind, name, bounds[i], bounds[i + 1], "".join(lines[bounds[i]:bounds[i + 1]]))
+        for i, (_, kind, name) in enumerate(units)
+    ]
+
+    chunks = []
+    for kind, name, start, end, text in pieces:
+        if chunks and len(chunks[-1].text) + len(text) <= max_chars:
+            last = chunks[-1]
+            merged_name = ", ".join(filter(None, [last.name, name]))
+            merged_kind = last.kind if last.kind == kind else 'block'
+            chunks[-1] = Chunk(merged_kind, merged_name, last.start_line, end, last.text + text)
+        else:
+            chunks.append(Chunk(kind, name, start + 1, end, text))
+    return chunks
+
+def stitch_results(
+    chunks: List[Chunk],
+    results: List[Tuple[str, str]],
+    language: str,
+    validate: Callable[[str, str], bool] = is_valid
+) -> Tuple[str, str]:
+    """
+    Combine per-chunk (refactored_code, explanation) results into one file.
+
+    A chunk whose output does not validate keeps its original text. If the
+    stitched file still does not validate, the original code is returned.
+
+    Returns:
+        Tuple of (refactored_code, explanation)
+    """
+    texts = []
+    explanations = []
+    for chunk, (refactored, explanation) in zip(chunks, results):
+        label = chunk.name or f"lines {chunk.start_line}-{chunk.end_line}"
+        if validate(chunk.text, language) and not validate(refactored, language):
+            texts.append(chunk.text)
+            explanations.append(f"{label}: left unchanged because the refactored version did not parse.")
+            continue
+        texts.append(refactored if refactored.endswith("\n") or not chunk.text.endswith("\n") else refactored + "\n")
+        explanations.append(f"{label}: {explanation}")
+
+    original = join_chunks([chunk.text for chunk in chunks])
+    stitched = join_chunks(texts)
+    if validate(original, language) and not validate(stitched, language):
+        return original, "Unable to refactor code: the combined refactored chunks did not parse."
+    return stitched, "\n\n".join(explanations)
@@ -0,0 +1,153 @@
+"""
+Reuse of completed refactorings for near-duplicate submissions.
+
+Each refactoring's original code is fingerprinted when it is first seen. A
+submission that matches a completed refactoring up to formatting and comments
+(same language and focus areas) copies its result without a model call; one
+that is merely similar is processed normally with the closest match shown to
+the model as a worked example. Matches are limited to the submitting tenant's
+refactorings unless ``DEDUP_ACROSS_TENANTS`` is set.
+"""
+import json
+import logging
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.code_refactoring import CodeFingerprint, CodeRefactoring
+from app.services.fingerprinting import fingerprint_code, similarity
+from app.services.prompt_builder import FewShotExample
+
+logger = logging.getLogger(__name__)
+
+class DuplicateMatch(NamedTuple):
+    refactoring: CodeRefactoring   # the completed refactoring that matched
+    similarity: float              # estimated Jaccard similarity of the normalized code
+    reusable: bool                 # same code up to formatting/comments, language and focus areas
+
+def same_focus_areas(a: Optional[List[str]], b: Optional[List[str]]) -> bool:
+    """Whether two focus area lists ask for the same refactoring (order and case ignored)."""
+    return {area.strip().lower() for area in a or []} == {area.strip().lower() for area in b or []}
+
+def index_refactoring(db: Session, refactoring: CodeRefactoring) -> CodeFingerprint:
+    """Fingerprint a refactoring's original code and add it to the index (not committed)."""
+    fingerprint = fingerprint_code(refactoring.original_code, refactoring.language or "")
+    row = CodeFingerprint(
+        refactoring_id=refactoring.id,
+        language=(refactoring.language or "").lower(),
+        exact_hash=fingerprint.exact_hash,
+        canonical_hash=fingerprint.canonical_hash,
+        signature=fingerprint.signature,
+        bands=fingerprint.bands,
+        token_count=fingerprint.token_count
+    )
+    db.add(row)
+    return row
+
+def find_duplicate(db: Session, refactoring: CodeRefactoring, fingerprint: CodeFingerprint) -> Optional[DuplicateMatch]:
+    """
+    Find the best completed refactoring of near-duplicate code.
+
+    Candidates belong to the same tenant (unless ``DEDUP_ACROSS_TENANTS``) and
+    share the exact hash or at least one LSH band; a reusable match
+    wins over any similarity, otherwise the most similar candidate at or above
+    ``DEDUP_SIMILARITY_THRESHOLD`` is returned.
+
+    Args:
+        db: Database session
+        refactoring: The refactoring being submitted
+        fingerprint: Its fingerprint
+
+    Returns:
+        DuplicateMatch or None if nothing is similar enough
+    """
+    query = (
+        db.query(CodeFingerprint, CodeRefactoring)
+        .join(CodeRefactoring, CodeRefactoring.id == CodeFingerprint.refactoring_id)
+        .filter(
+            CodeFingerprint.language == fingerprint.language,
+            CodeFingerprint.refactoring_id != refactoring.id,
+            CodeRefactoring.status == "completed",
+            # Refactored code is stored as a blob or as a patch against the original
+            or_(CodeRefactoring.refactored_hash.isnot(None), CodeRefactoring.refactored_patch.isnot(None)),
+            or_(
+                CodeFingerprint.exact_hash == fingerprint.exact_hash,
+                CodeFingerprint.bands.overlap(fingerprint.bands)
+            )
+        )
+    )
+    if not settings.DEDUP_ACROSS_TENANTS:
+        query = query.filter(CodeRefactoring.tenant == refactoring.tenant)
+    candidates = (
+        query
+        .order_by(CodeRefactoring.created_at.desc())
+        .limit(settings.DEDUP_MAX_CANDIDATES)
+        .all()
+    )
+
+    best: Optional[DuplicateMatch] = None
+    for candidate, candidate_refactoring in candidates:
+        if candidate.exact_hash == fingerprint.exact_hash:
+            score = 1.0
+            reusable = same_focus_areas(candidate_refactoring.focus_areas, refactoring.focus_areas)
+        else:
+            score = similarity(candidate.signature, fingerprint.signature)
+            reusable = False
+        if score < settings.DEDUP_SIMILARITY_THRESHOLD:
+            continue
+        if best is None or (reusable, score) > (best.reusable, best.similarity):
+            best = DuplicateMatch(candidate_refactoring, score, reusable)
+    return best
+
+def deduplicate(db: Session, refactoring: CodeRefactoring) -> Optional[DuplicateMatch]:
+    """
+    Index a new refactoring and reuse or reference a near-duplicate (not committed).
+
+    A reusable match's results are copied and the refactoring is marked
+    completed, so no job is needed; for any other match ``reference_id`` is
+    set so the pipeline passes it to the model as an example.
+
+    Args:
+        db: Database session
+        refactoring: A flushed refactoring that has not been processed yet
+
+    Returns:
+        The match that was used, or None
+    """
+    fingerprint = index_refactoring(db, refactoring)
+    match = find_duplicate(db, refactoring, fingerprint)
+    if match is None:
+        return None
+
+    source = match.refactoring
+    refactoring.reference_id = source.id
+    if match.reusable:
+        reuse_result(refactoring, source)
+        logger.info(f"Reused refactoring {source.id} for duplicate {refactoring.id}")
+    else:
+        logger.info(f"Refactoring {source.id} is {match.similarity:.0%} similar to {refactoring.id}; using it as an example")
+    return match
+
+def reuse_result(refactoring: CodeRefactoring, source: CodeRefactoring) -> None:
+    """Copy the results of a completed refactoring and mark ``refactoring`` completed (not committed)."""
+    refactoring.refactored_code = source.refactored_code
+    refactoring.explanation = source.explanation
+    refactoring.analysis_result = source.analysis_result
+    refactoring.suggestions = source.suggestions
+    refactoring.ai_model = source.ai_model
+    refactoring.status = "completed"
+
+def few_shot_example(refactoring: CodeRefactoring) -> Optional[FewShotExample]:
+    """The worked example for a refactoring from its referenced near-duplicate, if any."""
+    source = refactoring.reference
+    if source is None or source.refactored_code is None:
+        return None
+    return FewShotExample(
+        original_code=source.original_code,
+        refactored_code=source.refactored_code,
+        explanation=source.explanation or "",
+        analysis=source.analysis_result,
+        suggestions=json.loads(source.suggestions) if source.suggestions else None
+    )
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.chunking import split_into_chunks
+from app.services.language_detection import DetectionResult, get_detector
+from app.services.prompt_builder import FewShotExample
+
+logger = logging.getLogger(__name__)
+
+# Keywords that add a branch to the control flow, counted for the complexity score
+BRANCH_PATTERN = re.compile(r"\b(if|elif|else if|for|foreach|while|case|when|catch|except|and|or)\b|&&|\|\||\?")
+
+# Lines longer than this are reported as readability issues
+MAX_LINE_LENGTH = 100
+
+class DeterministicAIRefactoringService:
+    """
+    In-process backend with deterministic results and no network I/O.
+
+    Scores and issues come from simple source metrics and the "refactoring"
+    normalizes whitespace, so the whole pipeline can be load tested or run
+    offline with identical output for identical input. An optional simulated
+    latency models the time a real backend would take.
+    """
+
+    def __init__(self, latency_seconds: Optional[float] = None):
+        self.latency_seconds = settings.AI_BACKEND_SIMULATED_LATENCY_SECONDS if latency_seconds is None else latency_seconds
+        # No model is called; token estimates are sized for the configured one
+        self.model = settings.AI_BACKEND_MODEL or settings.OPENAI_MODEL
+        self.context_window = settings.AI_BACKEND_CONTEXT_WINDOW or None
+        logger.info("Using DeterministicAIRefactoringService.")
+
+    def detect_language(self, code: str) -> str:
+        """Detect the language with the local classifier."""
+        return get_detector().predict(code).language
+
+    def detect_language_with_confidence(self, code: str) -> DetectionResult:
+        """Detect the language and its confidence with the local classifier."""
+        return get_detector().predict(code)
+
+    def detect_languages(self, codes: List[str]) -> List[DetectionResult]:
+        """Detect the languages of many snippets in one pass of the local classifier."""
+        return get_detector().predict_batch(codes)
+
+    async def analyze_code_quality(self, code: str, language: str, use_model: Optional[bool] = None) -> Dict[str, Any]:
+        """Score the code from line lengths, nesting and branch counts."""
+        await self._simulate_latency()
+        return self._analysis(code)
+
+    async def refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Tuple[str, str]:
+        """Normalize whitespace; the result is always functionally identical."""
+        await self._simulate_latency()
+        return self._refactoring(code)
+
+    async def suggest_improvements(self, code: str, language: str) -> List[Dict[str, str]]:
+        """Turn each detected issue into a suggestion."""
+        await self._simulate_latency()
+        return self._suggestions(self._analysis(code))
+
+    async def explain_code(self, code: str, language: str) -> str:
+        """List the units the code defines."""
+        await self._simulate_latency()
+        return self._explanation(code, language)
+
+    async def review_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """Combined analysis, refactoring and suggestions."""
+        await self._simulate_latency()
+        analysis = self._analysis(code)
+        refactored_code, explanation = self._refactoring(code)
+        return {
+            "analysis": analysis,
+            "refactored_code": refactored_code,
+            "explanation": explanation,
+            "suggestions": self._suggestions(analysis)
+        }
+
+    async def stream_refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream the refactored code line by line."""
+        refactored_code, explanation = await self.refactor_code(code, language, focus_areas)
+        for line in refactored_code.splitlines(keepends=True):
+            yield "token", line
+        yield "result", {"refactored_code": refactored_code, "explanation": explanation}
+
+    async def stream_explain_code(self, code: str, language: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream the explanation one sentence at a time."""
+        explanation = await self.explain_code(code, language)
+        for sentence in re.split(r"(?<=\.) ", explanation):
+            yield "token", sentence + " "
+        yield "result", explanation
+
+    async def _simulate_latency(self) -> None:
+        if self.latency_seconds > 0:
+            await asyncio.sleep(self.latency_seconds)
+
+    def _analysis(self, code: str) -> Dict[str, Any]:
+        lines = code.splitlines()
+        branches = len(BRANCH_PATTERN.findall(code))
+        depth = max((len(line) - len(line.lstrip()) for line in lines if line.strip()), default=0) // 4
+        issues = []
+        long_lines = [number for number, line in enumerate(lines, 1) if len(line) > MAX_LINE_LENGTH]
+        if long_lines:
+            issues.append({
+                "type": "readability",
+                "severity": "low",
+                "description": f"{len(long_lines)} line(s) exceed {MAX_LINE_LENGTH} characters.",
+                "line_numbers": long_lines,
+                "suggestion": "Wrap long lines or extract sub-expressions into named variables."
+            })
+        if depth >= 4:
+            issues.append({
+                "type": "complexity",
+                "severity": "medium",
+                "description": f"Code is nested {depth} levels deep.",
+                "line_numbers": [],
+                "suggestion": "Use early returns or extract nested blocks into functions."
+            })
+        trailing = [number for number, line in enumerate(lines, 1) if line != line.rstrip()]
+        if trailing:
+            issues.append({
+                "type": "best_practice",
+                "severity": "low",
+                "description": "Lines end with trailing whitespace.",
+                "line_numbers": trailing,
+                "suggestion": "Strip trailing whitespace."
+            })
+        return {
+            "complexity_score": max(1, min(10, 1 + branches // 3 + depth)),
+            "readability_score": max(1, min(10, 10 - len(long_lines) - depth // 2 - (1 if trailing else 0))),
+            "issues": issues,
+            "overall_assessment": f"{len(lines)} lines with {branches} branch points and {len(issues)} issue(s) found."
+        }
+
+    def _refactoring(self, code: str) -> Tuple[str, str]:
+        refactored = "\n".join(line.rstrip() for line in code.strip("\n").splitlines()) + "\n"
+        if refactored == code:
+            return code, "No changes were needed."
+        return refactored, "Removed trailing whitespace and normalized blank lines at the start and end of the file."
+
+    def _suggestions(self, analysis: Dict[str, Any]) -> List[Dict[str, str]]:
+        return [
+            {
+                "category": issue["type"],
+                "priority": issue["severity"],
+                "title": issue["suggestion"].split(" or ")[0].rstrip("."),
+                "description": issue["description"],
+                "example": None,
+                "rationale": issue["suggestion"]
+            }
+            for issue in analysis["issues"]
+        ]
+
+    def _explanation(self, code: str, language: str) -> str:
+        units = [chunk for chunk in split_into_chunks(code, language, max_chars=1) if chunk.kind != "block"]
+        if not units:
+            return f"This {language} code is a {len(code.splitlines())}-line script without named functions or classes."
+        described = ", ".join(f"{chunk.kind} `{chunk.name}` (lines {chunk.start_line}-{chunk.end_line})" for chunk in units)
+        return f"This {language} code defines {len(units)} unit(s): {described}."
@@ -0,0 +1,166 @@
+"""
+Unified diffs between original and refactored code.
+
+Diffs are used in three places: the model can answer with a patch instead of
+the whole refactored file, API responses can carry a diff instead of the full
+refactored text, and refactored code is stored as a diff against the original
+when that is smaller.
+
+Patches written by a model rarely have exact hunk line numbers, so hunks are
+located by their context and removed lines (searching forward from the end of
+the previous hunk, nearest to the stated line first) and the numbers in the
+``@@`` headers are only used as a hint.
+"""
+import difflib
+import re
+from typing import List, NamedTuple, Optional
+
+# Context lines around each change in the diffs produced here
+DIFF_CONTEXT_LINES = 3
+
+NO_NEWLINE_MARKER = "\\ No newline at end of file"
+
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+class PatchError(ValueError):
+    """Raised when a patch is malformed or does not apply to the original code."""
+
+class Hunk(NamedTuple):
+    start_hint: int        # 0-based line the hunk claims to start at (-1 if unknown)
+    old_lines: List[str]
+    new_lines: List[str]
+    new_at_eof: bool       # the new side's last line has no trailing newline
+
+def unified_diff(original: str, refactored: str, context: int = DIFF_CONTEXT_LINES) -> str:
+    """
+    Unified diff turning ``original`` into ``refactored``.
+
+    Args:
+        original: The original code
+        refactored: The refactored code
+        context: Unchanged lines shown around each change
+
+    Returns:
+        The diff text, empty if the two are identical
+    """
+    lines = difflib.unified_diff(
+        original.splitlines(keepends=True),
+        refactored.splitlines(keepends=True),
+        fromfile="original",
+        tofile="refactored",
+        n=context
+    )
+    diff = []
+    for line in lines:
+        diff.append(line)
+        if not line.endswith("\n"):
+            diff.append(f"\n{NO_NEWLINE_MARKER}\n")
+    return "".join(diff)
+
+def parse_patch(patch: str) -> List[Hunk]:
+    """
+    Parse the hunks of a unified diff.
+
+    File headers and any text before the first hunk (prose, markdown fences)
+    are ignored. A hunk header without line numbers (``@@ ... @@``) is accepted.
+
+    Raises:
+        PatchError: If the patch has no hunks or a hunk line has an unknown prefix
+    """
+    hunks: List[Hunk] = []
+    current = None
+    previous = ""
+    # Empty lines count as blank context only when more hunk lines follow them
+    pending_blank = 0
+    text = patch.replace("\r\n", "\n")
+    for line in (text[:-1] if text.endswith("\n") else text).split("\n"):
+        if line.startswith(("@@", "```")):
+            if current is not None:
+                hunks.append(Hunk(*current))
+            match = HUNK_HEADER_PATTERN.match(line)
+            current = [int(match.group(1)) - 1 if match else -1, [], [], False] if line.startswith("@@") else None
+            pending_blank = 0
+        elif current is None:
+            continue
+        elif line == "":
+            # Models often drop the leading space of blank context lines
+            pending_blank += 1
+        elif line.startswith("\\"):
+            # Only the new side matters: the original's own final newline is known
+            if previous in (" ", "+"):
+                current[3] = True
+        elif line[:1] in (" ", "-", "+"):
+            current[1].extend(["\n"] * pending_blank)
+            current[2].extend(["\n"] * pending_blank)
+            pending_blank = 0
+            previous = line[:1]
+            if previous in (" ", "-"):
+                current[1].append(line[1:] + "\n")
+            if previous in (" ", "+"):
+                current[2].append(line[1:] + "\n")
+                current[3] = False
+        else:
+            raise PatchError(f"Unexpected line in patch: {line[:80]!r}")
+    if current is not None:
+        hunks.append(Hunk(*current))
+
+    if not hunks:
+        raise PatchError("Patch contains no hunks")
+    return hunks
+
+def _find_hunk(stripped: List[str], old_lines: List[str], start: int, hint: int) -> Optional[int]:
+    """Index at or after ``start`` where ``old_lines`` occur, nearest to ``hint``; trailing whitespace is ignored."""
+    wanted = [line.rstrip() for line in old_lines]
+    size = len(wanted)
+    matches = [
+        index for index in range(start, len(stripped) - size + 1)
+        if stripped[index] == wanted[0] and stripped[index:index + size] == wanted
+    ]
+    if not matches:
+        return None
+    return min(matches, key=lambda index: abs(index - hint)) if hint >= 0 else matches[0]
+
+def apply_patch(original: str, patch: str) -> str:
+    """
+    Apply a unified diff to ``original``.
+
+    Args:
+        original: The code the patch was made against
+        patch: Unified diff text
+
+    Returns:
+        The patched code (``original`` itself for an empty patch)
+
+    Raises:
+        PatchError: If the patch is malformed or a hunk's context is not found
+    """
+    if not patch.strip():
+        return original
+    lines = original.splitlines(keepends=True)
+    ends_with_newline = not lines or lines[-1].endswith("\n")
+    if not ends_with_newline:
+        lines[-1] += "\n"
+
+    stripped = [line.rstrip() for line in lines]
+    patched: List[str] = []
+    position = 0
+    for number, hunk in enumerate(parse_patch(patch), start=1):
+        if hunk.old_lines:
+            index = _find_hunk(stripped, hunk.old_lines, position, hunk.start_hint)
+            if index is None:
+                raise PatchError(f"Hunk {number} does not match the original code")
+        else:
+            # A pure insertion has nothing to match, so its header is all there is
+            index = min(max(hunk.start_hint + 1, position), len(lines)) if hunk.start_hint >= 0 else len(lines)
+        patched.extend(lines[position:index])
+        patched.extend(hunk.new_lines)
+        position = index + len(hunk.old_lines)
+        if position == len(lines) and hunk.new_lines:
+            # The hunk reaches the end of the file, so it decides the final newline
+            ends_with_newline = not hunk.new_at_eof
+    patched.extend(lines[position:])
+
+    result = "".join(patched)
+    if not ends_with_newline and result.endswith("\n"):
+        result = result[:-1]
+    return result
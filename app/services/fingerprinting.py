@@ -0,0 +1,205 @@
+"""
+Normalized code fingerprints for near-duplicate detection.
+
+Code is reduced to a token stream without whitespace or comments. Two hashes
+come from it: an exact hash over the tokens as written (line breaks kept), equal
+for submissions that differ only in formatting and comments, and a canonical
+hash where identifiers and literals are replaced by placeholders, so renamed
+copies match as well. Shingles of the canonical stream are winnowed and
+summarized by a MinHash signature; its LSH band hashes are stored in an indexed
+array column so candidate near-duplicates are found without comparing every pair.
+"""
+import hashlib
+import io
+import keyword
+import random
+import re
+import tokenize
+import zlib
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+# Tokens per shingle and shingles per winnowing window
+SHINGLE_SIZE = 5
+WINNOW_WINDOW = 4
+
+# 16 bands of 4 rows: pairs above ~0.5 similarity almost always share a band
+NUM_PERMUTATIONS = 64
+BAND_ROWS = 4
+
+MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed: signatures are stored, so the permutations must never change
+_rng = random.Random(0x5EED)
+PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)
+]
+
+# Words kept verbatim in the canonical stream; every other identifier becomes a placeholder
+KEYWORDS = frozenset(keyword.kwlist) | frozenset("""
+    abstract auto begin bool boolean break byte case catch char class const continue def default defer
+    delete do double elif else elsif end enum export extends extern final finally float fn for foreach
+    func function go goto if impl implements import in instanceof int interface let long loop match
+    module mut namespace new nil null override package private protected pub public readonly return
+    select self short signed sizeof static struct super switch synchronized template then this throw
+    throws trait try typeof typename undefined unless unsigned until use using val var virtual void
+    volatile when where while yield
+""".split())
+
+# SQL keywords, matched case-insensitively
+SQL_KEYWORDS = frozenset("""
+    add all alter and as asc between by case create delete desc distinct drop else end exists foreign
+    from group having in index inner insert into is join key left like limit not null offset on or order
+    outer primary references right select set table then union update values when where with
+""".split())
+
+# Comment syntax per language; languages not listed use C-style comments
+COMMENT_PATTERNS = {
+    'python': r"#[^\n]*",
+    'ruby': r"#[^\n]*|^=begin.*?^=end",
+    'r': r"#[^\n]*",
+    'php': r"#[^\n]*|//[^\n]*|/\*.*?\*/",
+    'sql': r"--[^\n]*|/\*.*?\*/",
+    'matlab': r"%[^\n]*",
+    'html': r"<!--.*?-->",
+    'css': r"/\*.*?\*/",
+}
+C_COMMENT_PATTERN = r"//[^\n]*|/\*.*?\*/"
+
+TOKEN_PATTERN = (
+    r"|(?P<string>\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)"
+    r"|(?P<number>\d[\w.]*)"
+    r"|(?P<name>[A-Za-z_$][\w$]*)"
+    r"|(?P<newline>\n)"
+    r"|(?P<op>[^\s\w])"
+)
+
+class Fingerprint(NamedTuple):
+    exact_hash: str        # SHA-256 of the token stream as written
+    canonical_hash: str    # SHA-256 of the stream with identifiers and literals replaced
+    signature: List[int]   # MinHash of the winnowed canonical shingles
+    bands: List[int]       # LSH band hashes of the signature, (band index << 32) | hash
+    token_count: int
+
+@lru_cache(maxsize=None)
+def _pattern(language: str) -> "re.Pattern":
+    comment = COMMENT_PATTERNS.get(language, C_COMMENT_PATTERN)
+    return re.compile(f"(?P<comment>{comment})" + TOKEN_PATTERN, re.S | re.M)
+
+def tokenize_code(code: str, language: str) -> List[Tuple[str, str, int]]:
+    """
+    Split code into (kind, text, line) tokens without whitespace or comments.
+
+    Kinds are name, number, string, op and newline (one per run of line
+    breaks); Python code also yields indent and dedent tokens, since its
+    indentation is part of the program.
+
+    Args:
+        code: Source code to tokenize
+        language: Programming language of the code
+
+    Returns:
+        List of (kind, text, 1-based line number) tuples
+    """
+    if language == 'python':
+        try:
+            return _python_tokens(code)
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            pass
+
+    tokens = []
+    line = 1
+    for match in _pattern(language).finditer(code.replace('\r\n', '\n')):
+        kind = match.lastgroup
+        text = match.group()
+        if not (kind == 'comment' or (kind == 'newline' and (not tokens or tokens[-1][0] == 'newline'))):
+            tokens.append((kind, text, line))
+        # Newlines between matches are only ever inside comments, strings or the newline token
+        line += text.count('\n')
+    if tokens and tokens[-1][0] == 'newline':
+        tokens.pop()
+    return tokens
+
+def _python_tokens(code: str) -> List[Tuple[str, str, int]]:
+    kinds = {
+        tokenize.NAME: 'name',
+        tokenize.NUMBER: 'number',
+        tokenize.STRING: 'string',
+        tokenize.NEWLINE: 'newline',
+        tokenize.INDENT: 'indent',
+        tokenize.DEDENT: 'dedent',
+    }
+    skipped = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(code).readline):
+        if token.type in skipped:
+            continue
+        kind = kinds.get(token.type, 'op')
+        # Indentation width is irrelevant once it is expressed as indent/dedent tokens
+        tokens.append((kind, '' if kind in ('indent', 'dedent', 'newline') else token.string, token.start[0]))
+    return tokens
+
+def canonical_tokens(tokens: List[Tuple[str, str, int]], language: str) -> List[str]:
+    """Replace identifiers and literals with placeholders and drop line breaks."""
+    canonical = []
+    for kind, text, _ in tokens:
+        if kind == 'name':
+            word = text.lower() if language == 'sql' else text
+            keywords = SQL_KEYWORDS if language == 'sql' else KEYWORDS
+            canonical.append(word if word in keywords else 'ID')
+        elif kind == 'number':
+            canonical.append('NUM')
+        elif kind == 'string':
+            canonical.append('STR')
+        elif kind != 'newline':
+            canonical.append(text or kind.upper())
+    return canonical
+
+def winnow(hashes: List[int], window: int = WINNOW_WINDOW) -> List[int]:
+    """Keep the minimum hash of every window of consecutive shingle hashes."""
+    if len(hashes) <= window:
+        return sorted(set(hashes))
+    return sorted({min(hashes[start:start + window]) for start in range(len(hashes) - window + 1)})
+
+def minhash(values: List[int]) -> List[int]:
+    """MinHash signature of a set of 32-bit hashes under the fixed permutations."""
+    return [min((a * value + b) % MERSENNE_PRIME for value in values) for a, b in PERMUTATIONS]
+
+def lsh_bands(signature: List[int]) -> List[int]:
+    """Hash each band of ``BAND_ROWS`` signature rows, tagged with the band index."""
+    bands = []
+    for index, start in enumerate(range(0, len(signature), BAND_ROWS)):
+        rows = ",".join(str(value) for value in signature[start:start + BAND_ROWS])
+        bands.append(index << 32 | zlib.crc32(rows.encode('utf-8')))
+    return bands
+
+def similarity(signature: List[int], other: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    if not signature or len(signature) != len(other):
+        return 0.0
+    return sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+
+def _digest(tokens: List[str]) -> str:
+    return hashlib.sha256("\x1f".join(tokens).encode('utf-8')).hexdigest()
+
+def fingerprint_code(code: str, language: str) -> Fingerprint:
+    """
+    Fingerprint code for exact and near-duplicate matching.
+
+    Args:
+        code: Source code to fingerprint
+        language: Programming language of the code
+
+    Returns:
+        Fingerprint with both hashes, the MinHash signature and its band hashes
+    """
+    language = (language or '').lower()
+    tokens = tokenize_code(code, language)
+    exact = [text or kind.upper() for kind, text, _ in tokens]
+    canonical = canonical_tokens(tokens, language)
+
+    shingles = [
+        zlib.crc32("\x1f".join(canonical[start:start + SHINGLE_SIZE]).encode('utf-8'))
+        for start in range(max(1, len(canonical) - SHINGLE_SIZE + 1))
+    ]
+    signature = minhash(winnow(shingles))
+    return Fingerprint(_digest(exact), _digest(canonical), signature, lsh_bands(signature), len(tokens))
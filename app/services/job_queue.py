@@ -0,0 +1,394 @@
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from uuid import UUID
+
+from sqlalchemy import and_, bindparam, case, func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.models.code_refactoring import CodeRefactoring, RefactoringJob
+from app.services.deduplication import reuse_result
+from app.services.notifications import notify_status
+from app.services.result_cache import ResultCache
+from app.services.scheduler import DEFAULT_TENANT, PRIORITY_CLASSES, tenant_weight
+
+logger = logging.getLogger(__name__)
+
+# Job states in which a job holds its flight key (see ux_refactoring_jobs_active_flight_key)
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+def flight_key(
+    code: str, language: Optional[str], focus_areas: Optional[List[str]], parent_id: Optional[UUID] = None,
+    tenant: str = DEFAULT_TENANT
+) -> Optional[str]:
+    """
+    Key shared by submissions that would produce the same refactoring.
+
+    Submissions of different tenants only share a job when
+    ``DEDUP_ACROSS_TENANTS`` is set.
+
+    Returns:
+        SHA-256 of the normalized code, language, focus areas, parent and
+        tenant, or None when single-flight is disabled
+    """
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return None
+    payload = json.dumps([
+        ResultCache.normalize_code(code),
+        (language or "").lower(),
+        sorted(focus_areas) if focus_areas is not None else None,
+        str(parent_id) if parent_id else None,
+        None if settings.DEDUP_ACROSS_TENANTS else tenant
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _lock_flights(db: Session, keys: Iterable[Optional[str]]) -> None:
+    """
+    Take transaction-scoped advisory locks on flight keys.
+
+    Attaching to a job and finishing it both hold the key's lock, so a
+    follower is either committed before the job finishes (and released with
+    it) or sees the job finished and queues its own. Keys are locked in sorted
+    order so concurrent lockers cannot deadlock.
+    """
+    keys = sorted({key for key in keys if key})
+    if keys:
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(hashtextextended(key, 0)) FROM unnest(CAST(:keys AS text[])) AS key"),
+            {"keys": keys}
+        )
+
+class JobSpec(NamedTuple):
+    """A refactoring to queue, with its flight key and scheduling."""
+    refactoring_id: UUID
+    flight_key: Optional[str] = None
+    priority: str = "interactive"
+    tenant: str = DEFAULT_TENANT
+    deadline: Optional[datetime] = None
+    # Relative amount of work (the code length), charged to the tenant's fair share
+    cost: float = 1.0
+
+    @classmethod
+    def of(cls, refactoring: CodeRefactoring, key: Optional[str] = None) -> "JobSpec":
+        """Spec of a stored refactoring."""
+        return cls(
+            refactoring.id, key, refactoring.priority, refactoring.tenant, refactoring.deadline,
+            len(refactoring.original_code)
+        )
+
+def enqueue_refactoring(db: Session, job: JobSpec) -> Optional[UUID]:
+    """
+    Add a job for a refactoring to the queue.
+
+    The job is inserted but not committed, so callers can commit it in the
+    same transaction as the refactoring row itself.
+
+    Returns:
+        The refactoring it follows instead, if an identical one (same flight
+        key) already has a queued or running job, else None
+    """
+    return enqueue_refactorings(db, [job]).get(job.refactoring_id)
+
+def _virtual_finishes(db: Session, jobs: List[JobSpec]) -> List[float]:
+    """
+    Virtual finish times of new jobs for weighted fair queuing between tenants.
+
+    Each tenant's jobs are laid out one after another from the later of its
+    last active job and the queue's virtual time (the earliest active job), each
+    taking ``cost / weight``. Claiming in finish order then serves backlogged
+    tenants in proportion to their weights, and a tenant with one job waits
+    behind at most one job of every other tenant rather than behind their
+    whole backlog.
+    """
+    active = RefactoringJob.status.in_(ACTIVE_JOB_STATUSES)
+    virtual_time = db.query(func.min(RefactoringJob.virtual_finish)).filter(active).scalar() or 0.0
+    tenants = {job.tenant for job in jobs}
+    last = dict(
+        db.query(RefactoringJob.tenant, func.max(RefactoringJob.virtual_finish))
+        .filter(RefactoringJob.tenant.in_(tenants), active)
+        .group_by(RefactoringJob.tenant)
+        .all()
+    )
+    finishes = []
+    for job in jobs:
+        start = max(virtual_time, last.get(job.tenant) or 0.0)
+        last[job.tenant] = start + max(job.cost, 1.0) / tenant_weight(job.tenant)
+        finishes.append(last[job.tenant])
+    return finishes
+
+def enqueue_refactorings(db: Session, jobs: List[JobSpec]) -> Dict[UUID, UUID]:
+    """
+    Queue jobs for many refactorings with a single bulk insert (not committed).
+
+    Refactorings whose flight key is held by an active job, or by an earlier
+    refactoring of the same call, get no job: their ``follows_id`` is set and
+    they receive the result when that job completes. The job they follow is
+    raised to their priority and deadline if those are more urgent.
+
+    Args:
+        db: Database session
+        jobs: Flushed refactorings to queue (a None flight key never coalesces)
+
+    Returns:
+        Mapping of each following refactoring to the refactoring it follows
+    """
+    _lock_flights(db, [job.flight_key for job in jobs])
+
+    now = datetime.now(UTC)
+    rows = []
+    first: Dict[str, dict] = {}
+    duplicates = []
+    for job, virtual_finish in zip(jobs, _virtual_finishes(db, jobs)):
+        rank = PRIORITY_CLASSES.get(job.priority, 0)
+        if job.flight_key in first:
+            leader = first[job.flight_key]
+            leader["priority"] = min(leader["priority"], rank)
+            leader["deadline"] = min(filter(None, (leader["deadline"], job.deadline)), default=None)
+            duplicates.append(job)
+            continue
+        row = {
+            "id": uuid.uuid4(),
+            "refactoring_id": job.refactoring_id,
+            "flight_key": job.flight_key,
+            "tenant": job.tenant,
+            "priority": rank,
+            "deadline": job.deadline,
+            "virtual_finish": virtual_finish,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": settings.JOB_MAX_ATTEMPTS,
+            "available_at": now
+        }
+        if job.flight_key:
+            first[job.flight_key] = row
+        rows.append(row)
+    statement = (
+        insert(RefactoringJob)
+        .on_conflict_do_nothing(index_elements=["flight_key"], index_where=text("status IN ('queued', 'running')"))
+        .returning(RefactoringJob.refactoring_id)
+    )
+    queued = set(db.execute(statement, rows).scalars())
+
+    taken = {row["flight_key"]: row for row in rows if row["refactoring_id"] not in queued}
+    leaders = dict(
+        db.query(RefactoringJob.flight_key, RefactoringJob.refactoring_id)
+        .filter(RefactoringJob.flight_key.in_(taken), RefactoringJob.status.in_(ACTIVE_JOB_STATUSES))
+        .all()
+    ) if taken else {}
+    if leaders:
+        # LEAST ignores NULLs, so a job without a deadline takes its follower's
+        jobs_table = RefactoringJob.__table__
+        db.execute(
+            update(jobs_table)
+            .where(jobs_table.c.flight_key == bindparam("key"), jobs_table.c.status.in_(ACTIVE_JOB_STATUSES))
+            .values(
+                priority=func.least(jobs_table.c.priority, bindparam("rank")),
+                deadline=func.least(jobs_table.c.deadline, bindparam("due"))
+            ),
+            [{"key": key, "rank": row["priority"], "due": row["deadline"]} for key, row in taken.items()]
+        )
+    followers = {row["refactoring_id"]: leaders[key] for key, row in taken.items()}
+    followers.update({
+        job.refactoring_id: leaders.get(job.flight_key, first[job.flight_key]["refactoring_id"]) for job in duplicates
+    })
+    if followers:
+        db.execute(update(CodeRefactoring), [
+            {"id": refactoring_id, "follows_id": leader_id} for refactoring_id, leader_id in followers.items()
+        ])
+        logger.info(f"{len(followers)} refactorings follow identical in-flight jobs")
+    return followers
+
+def claim_job(db: Session, worker_id: str, max_priority: Optional[int] = None) -> Optional[RefactoringJob]:
+    """
+    Claim the next runnable job for ``worker_id``.
+
+    Runnable jobs are queued jobs whose backoff has elapsed and running jobs
+    whose lease expired (their worker died or stalled). Rows are locked with
+    ``FOR UPDATE SKIP LOCKED`` so concurrent workers never claim the same job.
+    Expired jobs that already used all attempts are dead-lettered instead.
+
+    Jobs are claimed by priority class, then by deadline for jobs due within
+    SCHEDULER_DEADLINE_SLACK_SECONDS, then in fair-share (virtual finish)
+    order. Tenants already running SCHEDULER_TENANT_MAX_RUNNING jobs are
+    skipped; the cap is soft, as workers claiming at the same moment do not
+    see each other's claims.
+
+    Args:
+        db: Database session
+        worker_id: Lease holder recorded on the job
+        max_priority: Only claim jobs of this priority rank or better
+
+    Returns:
+        The claimed job, or None if nothing is runnable
+    """
+    while True:
+        now = datetime.now(UTC)
+        query = db.query(RefactoringJob).filter(
+            or_(
+                and_(RefactoringJob.status == "queued", RefactoringJob.available_at <= now),
+                and_(RefactoringJob.status == "running", RefactoringJob.locked_until < now)
+            )
+        )
+        if max_priority is not None:
+            query = query.filter(RefactoringJob.priority <= max_priority)
+        if settings.SCHEDULER_TENANT_MAX_RUNNING:
+            running = aliased(RefactoringJob)
+            busy = (
+                select(running.tenant)
+                .where(running.status == "running", running.locked_until >= now)
+                .group_by(running.tenant)
+                .having(func.count() >= settings.SCHEDULER_TENANT_MAX_RUNNING)
+            )
+            query = query.filter(RefactoringJob.tenant.not_in(busy))
+        urgent = case(
+            (RefactoringJob.deadline <= now + timedelta(seconds=settings.SCHEDULER_DEADLINE_SLACK_SECONDS),
+             RefactoringJob.deadline),
+            else_=None
+        )
+        job = query.order_by(
+            RefactoringJob.priority,
+            urgent.asc().nulls_last(),
+            RefactoringJob.virtual_finish,
+            RefactoringJob.available_at
+        ).with_for_update(skip_locked=True).first()
+
+        if job is None:
+            db.commit()
+            return None
+
+        if job.attempts >= job.max_attempts:
+            _dead_letter(db, job, job.last_error or "Job lease expired after its final attempt")
+            db.commit()
+            continue
+
+        job.status = "running"
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_until = now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS)
+        db.commit()
+        return job
+
+def extend_lease(db: Session, job_id: UUID, worker_id: str) -> bool:
+    """Push back the lease of a running job; returns False if the lease was lost."""
+    updated = db.query(RefactoringJob).filter(
+        RefactoringJob.id == job_id,
+        RefactoringJob.status == "running",
+        RefactoringJob.locked_by == worker_id
+    ).update(
+        {RefactoringJob.locked_until: datetime.now(UTC) + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS)},
+        synchronize_session=False
+    )
+    db.commit()
+    return updated > 0
+
+def complete_job(db: Session, job_id: UUID, worker_id: str) -> None:
+    """Mark a job completed if ``worker_id`` still holds it."""
+    job = _owned_job(db, job_id, worker_id)
+    if job is not None:
+        _lock_flights(db, [job.flight_key])
+        job.status = "completed"
+        job.locked_by = None
+        job.locked_until = None
+        _release_followers(db, job)
+    db.commit()
+
+def fail_job(db: Session, job_id: UUID, worker_id: str, error: str, retryable: bool = True) -> None:
+    """
+    Record a failed attempt.
+
+    The job is requeued with exponential backoff, or dead-lettered (and its
+    refactoring marked failed) once ``max_attempts`` is reached or the error
+    is not ``retryable``.
+    """
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        db.commit()
+        return
+
+    job.last_error = error
+    job.locked_by = None
+    job.locked_until = None
+    if not retryable or job.attempts >= job.max_attempts:
+        _dead_letter(db, job, error)
+    else:
+        delay = settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        job.status = "queued"
+        job.available_at = datetime.now(UTC) + timedelta(seconds=delay)
+        logger.warning(f"Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay}s: {error}")
+    db.commit()
+
+def defer_job(db: Session, job_id: UUID, worker_id: str, delay_seconds: float, reason: str) -> None:
+    """
+    Requeue a job that could not run because the model endpoint is unavailable.
+
+    Unlike ``fail_job`` the attempt is not counted, so an outage does not
+    dead-letter jobs that never reached the model.
+    """
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        db.commit()
+        return
+
+    job.status = "queued"
+    job.attempts = max(job.attempts - 1, 0)
+    job.last_error = reason
+    job.locked_by = None
+    job.locked_until = None
+    job.available_at = datetime.now(UTC) + timedelta(seconds=delay_seconds)
+    logger.info(f"Job {job.id} deferred for {delay_seconds:.0f}s: {reason}")
+    db.commit()
+
+def _owned_job(db: Session, job_id: UUID, worker_id: str) -> Optional[RefactoringJob]:
+    job = db.query(RefactoringJob).filter(RefactoringJob.id == job_id).with_for_update().first()
+    if job is None or job.status != "running" or job.locked_by != worker_id:
+        logger.warning(f"Worker {worker_id} lost the lease on job {job_id}")
+        return None
+    return job
+
+def _dead_letter(db: Session, job: RefactoringJob, error: str) -> None:
+    _lock_flights(db, [job.flight_key])
+    job.status = "dead"
+    job.last_error = error
+    job.locked_by = None
+    job.locked_until = None
+    refactoring = db.query(CodeRefactoring).filter(CodeRefactoring.id == job.refactoring_id).first()
+    if refactoring:
+        refactoring.status = "failed"
+        refactoring.explanation = f"Refactoring failed: {error}"
+        notify_status(db, refactoring.id, "failed", refactoring.batch_id)
+    logger.error(f"Job {job.id} dead-lettered after {job.attempts} attempts: {error}")
+    _release_followers(db, job)
+
+def _release_followers(db: Session, job: RefactoringJob) -> None:
+    """
+    Hand the result of a finished job to the refactorings following it (not committed).
+
+    If the job did not produce a result they are queued again, one of them
+    leading the next attempt. The caller holds the job's flight key lock.
+    """
+    followers = db.query(CodeRefactoring).filter(
+        CodeRefactoring.follows_id == job.refactoring_id,
+        CodeRefactoring.status == "processing"
+    ).all()
+    if not followers:
+        return
+
+    leader = db.query(CodeRefactoring).filter(CodeRefactoring.id == job.refactoring_id).first()
+    for follower in followers:
+        follower.follows_id = None
+    if job.status == "completed" and leader is not None and leader.status == "completed":
+        for follower in followers:
+            reuse_result(follower, leader)
+            follower.reference_id = leader.id
+            notify_status(db, follower.id, "completed", follower.batch_id)
+        logger.info(f"Completed {len(followers)} refactorings following {leader.id}")
+        return
+
+    # The job's key must be free before the followers take it over
+    db.flush()
+    enqueue_refactorings(db, [JobSpec.of(follower, job.flight_key) for follower in followers])
@@ -0,0 +1,832 @@
+"""
+Training corpus for the local language detector.
+
+A few short, idiomatic snippets per supported language. Keep every language
+in AIRefactoringService.supported_languages represented; held-out accuracy
+samples live in tests/test_language_detection.py.
+"""
+
+TRAINING_SAMPLES = {
+    'python': [
+        '''import os
+from typing import List
+
+def list_files(path: str) -> List[str]:
+    """Return files in path."""
+    return [name for name in os.listdir(path) if not name.startswith('.')]
+''',
+        '''class Stack:
+    def __init__(self):
+        self.items = []
+
+    def push(self, item):
+        self.items.append(item)
+
+    def pop(self):
+        if not self.items:
+            raise IndexError("pop from empty stack")
+        return self.items.pop()
+''',
+        '''def inefficient_sum(numbers):
+    s = 0
+    for n in numbers:
+        s += n
+    return s
+''',
+        '''async def fetch(session, url):
+    async with session.get(url) as response:
+        return await response.json()
+
+if __name__ == "__main__":
+    print(f"Done: {len(results)} items")
+''',
+        '''try:
+    value = int(raw)
+except ValueError as e:
+    logger.error(f"Invalid value: {e}")
+    value = None
+finally:
+    cleanup()
+''',
+    ],
+    'javascript': [
+        '''const express = require('express');
+const app = express();
+
+app.get('/', (req, res) => {
+  res.send('Hello World');
+});
+''',
+        '''function debounce(fn, wait) {
+  let timeout;
+  return function (...args) {
+    clearTimeout(timeout);
+    timeout = setTimeout(() => fn.apply(this, args), wait);
+  };
+}
+''',
+        '''var items = document.querySelectorAll('.item');
+for (var i = 0; i < items.length; i++) {
+  items[i].addEventListener('click', function () {
+    console.log(this.dataset.id);
+  });
+}
+''',
+        '''export default async function loadUsers() {
+  const response = await fetch('/api/users');
+  const data = await response.json();
+  return data.filter(user => user.active === true);
+}
+''',
+        '''module.exports = {
+  sum: (a, b) => a + b,
+  isEmpty: obj => Object.keys(obj).length === 0,
+};
+''',
+    ],
+    'typescript': [
+        '''interface User {
+  id: number;
+  name: string;
+  email?: string;
+}
+
+function greet(user: User): string {
+  return `Hello, ${user.name}`;
+}
+''',
+        '''type Result<T> = { ok: true; value: T } | { ok: false; error: string };
+
+export function parse(input: string): Result<number> {
+  const value = Number(input);
+  return isNaN(value) ? { ok: false, error: 'NaN' } : { ok: true, value };
+}
+''',
+        '''export class UserService {
+  private readonly cache: Map<string, User> = new Map();
+
+  constructor(private http: HttpClient) {}
+
+  public async get(id: string): Promise<User | undefined> {
+    return this.cache.get(id);
+  }
+}
+''',
+        '''import { Component, OnInit } from '@angular/core';
+
+@Component({ selector: 'app-root', templateUrl: './app.component.html' })
+export class AppComponent implements OnInit {
+  title: string = 'app';
+  ngOnInit(): void {}
+}
+''',
+        '''enum Direction { Up, Down }
+const move = (d: Direction, steps: number = 1): void => {
+  let position: number = 0;
+  position += d === Direction.Up ? steps : -steps;
+};
+''',
+    ],
+    'java': [
+        '''public class HelloWorld {
+    public static void main(String[] args) {
+        System.out.println("Hello, World!");
+    }
+}
+''',
+        '''import java.util.ArrayList;
+import java.util.List;
+
+public class Inventory {
+    private final List<String> items = new ArrayList<>();
+
+    public void add(String item) {
+        items.add(item);
+    }
+}
+''',
+        '''@Override
+public boolean equals(Object o) {
+    if (this == o) return true;
+    if (!(o instanceof Point)) return false;
+    Point other = (Point) o;
+    return x == other.x && y == other.y;
+}
+''',
+        '''package com.example.service;
+
+@Service
+public class OrderService implements IOrderService {
+    @Autowired
+    private OrderRepository repository;
+
+    public Optional<Order> find(Long id) throws NotFoundException {
+        return repository.findById(id);
+    }
+}
+''',
+    ],
+    'cpp': [
+        '''#include <iostream>
+#include <vector>
+
+int main() {
+    std::vector<int> v = {1, 2, 3};
+    for (auto x : v) std::cout << x << std::endl;
+    return 0;
+}
+''',
+        '''template <typename T>
+class Stack {
+public:
+    void push(const T& value) { data_.push_back(value); }
+    T pop();
+private:
+    std::vector<T> data_;
+};
+''',
+        '''#include <memory>
+using namespace std;
+
+struct Node {
+    int value;
+    unique_ptr<Node> next;
+};
+
+void print(const Node* node) { cout << node->value << "\\n"; }
+''',
+        '''#pragma once
+#include <string>
+
+namespace util {
+std::string trim(const std::string& s);
+int parse(const char* text, size_t length);
+}  // namespace util
+''',
+    ],
+    'csharp': [
+        '''using System;
+using System.Collections.Generic;
+
+namespace Demo
+{
+    public class Program
+    {
+        public static void Main(string[] args)
+        {
+            Console.WriteLine("Hello");
+        }
+    }
+}
+''',
+        '''public class Person
+{
+    public string Name { get; set; }
+    public int Age { get; private set; }
+}
+''',
+        '''using System.Linq;
+
+public async Task<List<Order>> GetOrdersAsync(int customerId)
+{
+    var orders = await _context.Orders.Where(o => o.CustomerId == customerId).ToListAsync();
+    return orders;
+}
+''',
+        '''[HttpGet("{id}")]
+public IActionResult Get(int id)
+{
+    var item = _repository.Find(id);
+    if (item == null) return NotFound();
+    return Ok(item);
+}
+''',
+    ],
+    'go': [
+        '''package main
+
+import "fmt"
+
+func main() {
+    fmt.Println("Hello, World!")
+}
+''',
+        '''func Sum(numbers []int) int {
+    total := 0
+    for _, n := range numbers {
+        total += n
+    }
+    return total
+}
+''',
+        '''type Server struct {
+    addr string
+    mux  *http.ServeMux
+}
+
+func (s *Server) Start() error {
+    return http.ListenAndServe(s.addr, s.mux)
+}
+''',
+        '''package store
+
+import (
+    "errors"
+    "sync"
+)
+
+func (c *Cache) Get(key string) (string, error) {
+    c.mu.Lock()
+    defer c.mu.Unlock()
+    if v, ok := c.items[key]; ok {
+        return v, nil
+    }
+    return "", errors.New("not found")
+}
+''',
+    ],
+    'rust': [
+        '''fn main() {
+    let numbers = vec![1, 2, 3];
+    let total: i32 = numbers.iter().sum();
+    println!("{}", total);
+}
+''',
+        '''use std::collections::HashMap;
+
+pub struct Cache {
+    items: HashMap<String, String>,
+}
+
+impl Cache {
+    pub fn get(&self, key: &str) -> Option<&String> {
+        self.items.get(key)
+    }
+}
+''',
+        '''fn parse(input: &str) -> Result<u32, ParseIntError> {
+    let value = input.trim().parse::<u32>()?;
+    Ok(value)
+}
+''',
+        '''#[derive(Debug, Clone)]
+enum Shape {
+    Circle(f64),
+    Square(f64),
+}
+
+fn area(shape: &Shape) -> f64 {
+    match shape {
+        Shape::Circle(r) => 3.14 * r * r,
+        Shape::Square(s) => s * s,
+    }
+}
+''',
+    ],
+    'php': [
+        '''<?php
+function greet($name) {
+    return "Hello, " . $name;
+}
+echo greet("World");
+?>
+''',
+        '''<?php
+namespace App\\Http\\Controllers;
+
+class UserController extends Controller
+{
+    public function show($id)
+    {
+        $user = User::find($id);
+        return view('user.show', ['user' => $user]);
+    }
+}
+''',
+        '''<?php
+$items = array(1, 2, 3);
+foreach ($items as $item) {
+    echo $item . "\\n";
+}
+$count = count($items);
+''',
+        '''<?php
+$pdo = new PDO($dsn, $user, $password);
+$stmt = $pdo->prepare('SELECT * FROM users WHERE id = :id');
+$stmt->execute(['id' => $id]);
+$row = $stmt->fetch();
+''',
+    ],
+    'ruby': [
+        '''def greet(name)
+  puts "Hello, #{name}"
+end
+
+greet("World")
+''',
+        '''class User < ApplicationRecord
+  has_many :posts
+  validates :email, presence: true
+
+  def full_name
+    "#{first_name} #{last_name}"
+  end
+end
+''',
+        '''[1, 2, 3].each do |n|
+  puts n * 2
+end
+
+total = numbers.map { |n| n * 2 }.select(&:even?).sum
+''',
+        '''require 'json'
+
+module Parser
+  def self.parse(text)
+    JSON.parse(text, symbolize_names: true)
+  rescue JSON::ParserError => e
+    nil
+  end
+end
+''',
+        '''attr_accessor :name, :age
+
+def initialize(name, age)
+  @name = name
+  @age = age
+end
+
+unless @age.nil?
+  puts @name
+end
+''',
+    ],
+    'swift': [
+        '''import Foundation
+
+func greet(name: String) -> String {
+    return "Hello, \\(name)"
+}
+
+let message = greet(name: "World")
+print(message)
+''',
+        '''import UIKit
+
+class ViewController: UIViewController {
+    override func viewDidLoad() {
+        super.viewDidLoad()
+        view.backgroundColor = .white
+    }
+}
+''',
+        '''struct Point {
+    var x: Double
+    var y: Double
+
+    mutating func move(by dx: Double) {
+        x += dx
+    }
+}
+
+guard let value = optionalValue else { return }
+''',
+        '''enum NetworkError: Error {
+    case badURL
+    case timeout
+}
+
+func load(url: URL, completion: @escaping (Result<Data, NetworkError>) -> Void) {
+    if let cached = cache[url] {
+        completion(.success(cached))
+    }
+}
+''',
+    ],
+    'kotlin': [
+        '''fun main() {
+    val numbers = listOf(1, 2, 3)
+    println(numbers.sum())
+}
+''',
+        '''data class User(val id: Int, val name: String)
+
+fun findUser(users: List<User>, id: Int): User? {
+    return users.firstOrNull { it.id == id }
+}
+''',
+        '''class MainActivity : AppCompatActivity() {
+    override fun onCreate(savedInstanceState: Bundle?) {
+        super.onCreate(savedInstanceState)
+        setContentView(R.layout.activity_main)
+    }
+}
+''',
+        '''package com.example
+
+import kotlinx.coroutines.launch
+
+suspend fun load(): String {
+    var result = ""
+    when (val status = fetch()) {
+        is Success -> result = status.data
+        else -> result = "error"
+    }
+    return result
+}
+''',
+    ],
+    'scala': [
+        '''object HelloWorld {
+  def main(args: Array[String]): Unit = {
+    println("Hello, world!")
+  }
+}
+''',
+        '''case class Person(name: String, age: Int)
+
+val people = List(Person("A", 30), Person("B", 25))
+val adults = people.filter(_.age >= 18).map(_.name)
+''',
+        '''trait Shape {
+  def area: Double
+}
+
+class Circle(r: Double) extends Shape {
+  override def area: Double = math.Pi * r * r
+}
+''',
+        '''import scala.concurrent.Future
+
+def describe(x: Any): String = x match {
+  case i: Int if i > 0 => "positive"
+  case s: String => s"string $s"
+  case _ => "other"
+}
+
+implicit val ec: ExecutionContext = ExecutionContext.global
+''',
+        '''object Config extends App {
+  val settings = Map("env" -> "prod")
+  settings.foreach { case (k, v) => println(s"$k=$v") }
+  lazy val total = Seq(1, 2, 3).foldLeft(0)(_ + _)
+}
+''',
+    ],
+    'r': [
+        '''library(ggplot2)
+
+data <- read.csv("data.csv")
+summary(data)
+ggplot(data, aes(x = age, y = income)) + geom_point()
+''',
+        '''square <- function(x) {
+  return(x^2)
+}
+
+values <- c(1, 2, 3, 4)
+result <- sapply(values, square)
+print(result)
+''',
+        '''df <- data.frame(name = c("a", "b"), score = c(90, 85))
+df$passed <- df$score > 50
+mean_score <- mean(df$score, na.rm = TRUE)
+''',
+        '''for (i in 1:10) {
+  if (i %% 2 == 0) {
+    cat(i, "is even\\n")
+  }
+}
+model <- lm(y ~ x, data = df)
+''',
+    ],
+    'matlab': [
+        '''function result = square(x)
+    result = x.^2;
+end
+''',
+        '''A = [1 2 3; 4 5 6; 7 8 9];
+B = A';
+C = A * B;
+disp(C);
+''',
+        '''x = linspace(0, 2*pi, 100);
+y = sin(x);
+plot(x, y);
+xlabel('x');
+title('Sine wave');
+''',
+        '''% Compute the mean of each column
+for i = 1:size(M, 2)
+    avg(i) = mean(M(:, i));
+end
+fprintf('Done\\n');
+''',
+    ],
+    'sql': [
+        '''SELECT id, name, email
+FROM users
+WHERE active = 1
+ORDER BY created_at DESC;
+''',
+        '''CREATE TABLE orders (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    total NUMERIC(10, 2) NOT NULL
+);
+''',
+        '''INSERT INTO products (name, price) VALUES ('Widget', 9.99);
+UPDATE products SET price = 10.99 WHERE name = 'Widget';
+DELETE FROM products WHERE price IS NULL;
+''',
+        '''select u.name, count(o.id) as order_count
+from users u
+left join orders o on o.user_id = u.id
+group by u.name
+having count(o.id) > 5;
+''',
+        '''insert into audit_log (user_id, action) values (1, 'login');
+update users set last_login = now() where id = 1;
+delete from sessions where expires_at < now();
+''',
+    ],
+    'html': [
+        '''<!DOCTYPE html>
+<html>
+<head>
+  <title>Page</title>
+</head>
+<body>
+  <h1>Hello</h1>
+</body>
+</html>
+''',
+        '''<div class="container">
+  <ul>
+    <li><a href="/home">Home</a></li>
+    <li><a href="/about">About</a></li>
+  </ul>
+</div>
+''',
+        '''<form action="/login" method="post">
+  <label for="user">User</label>
+  <input type="text" id="user" name="user">
+  <button type="submit">Login</button>
+</form>
+''',
+        '''<meta charset="utf-8">
+<link rel="stylesheet" href="style.css">
+<script src="app.js"></script>
+<p>Welcome to <strong>our</strong> site.</p>
+<img src="logo.png" alt="Logo">
+''',
+    ],
+    'css': [
+        '''body {
+  margin: 0;
+  font-family: Arial, sans-serif;
+  background-color: #f5f5f5;
+}
+''',
+        '''.container {
+  display: flex;
+  justify-content: center;
+  align-items: center;
+}
+
+#header h1 {
+  color: #333;
+  font-size: 2em;
+}
+''',
+        '''@media (max-width: 600px) {
+  .sidebar {
+    display: none;
+  }
+}
+
+a:hover {
+  text-decoration: underline;
+}
+''',
+        ''':root {
+  --primary: #0066cc;
+}
+
+.button {
+  padding: 10px 20px;
+  border-radius: 4px;
+  color: var(--primary);
+}
+''',
+    ],
+    'scss': [
+        '''$primary-color: #333;
+
+body {
+  color: $primary-color;
+
+  a {
+    &:hover {
+      color: darken($primary-color, 10%);
+    }
+  }
+}
+''',
+        '''@mixin flex-center {
+  display: flex;
+  justify-content: center;
+}
+
+.card {
+  @include flex-center;
+  padding: $spacing;
+}
+''',
+        '''@import 'variables';
+
+.nav {
+  ul {
+    margin: 0;
+    li { display: inline-block; }
+  }
+  &__item { color: $link-color; }
+}
+''',
+        '''%message-shared {
+  border: 1px solid #ccc;
+}
+
+.error {
+  @extend %message-shared;
+  border-color: red;
+}
+
+$spacing: 8px;
+$radius: 4px;
+
+.panel {
+  margin: $spacing;
+  border-radius: $radius;
+  &:focus { outline: none; }
+}
+
+@each $name in $icons {
+  .icon-#{$name} { background: url("#{$name}.png"); }
+}
+''',
+    ],
+    'sass': [
+        '''$primary-color: #333
+
+body
+  color: $primary-color
+  font: 100% $font-stack
+''',
+        '''=flex-center
+  display: flex
+  justify-content: center
+
+.card
+  +flex-center
+  padding: $spacing
+''',
+        '''@import variables
+
+nav
+  ul
+    margin: 0
+    padding: 0
+  li
+    display: inline-block
+  a
+    &:hover
+      color: red
+''',
+        '''.error
+  @extend %message-shared
+  border-color: red
+
+@mixin theme($theme: DarkGray)
+  background: $theme
+''',
+    ],
+}
+
+# One-line snippets, so single statements (the most ambiguous inputs) have
+# something to match; every one is also a training sample of its language
+SHORT_SAMPLES = {
+    'python': [
+        "print(total)\n", "print('done')\n", "count = 0\n", "name = 'x'\n", "items = []\n",
+        "result = compute(a, b)\n", "import sys\n", "from os import path\n", "return None\n",
+        "values = [v * 2 for v in values]\n", "data = {'a': 1}\n", "if x is None:\n    x = 0\n",
+        "for i in range(10):\n    print(i)\n", "total += 1\n", "assert value == 1\n",
+    ],
+    'javascript': [
+        "console.log(total);\n", "const count = 0;\n", "let items = [];\n", "var name = 'x';\n",
+        "document.getElementById('app');\n", "module.exports = app;\n", "items.forEach(item => render(item));\n",
+    ],
+    'typescript': [
+        "let count: number = 0;\n", "const name: string = 'x';\n", "type Id = string | number;\n",
+        "export interface User { id: number; }\n",
+    ],
+    'java': [
+        "System.out.println(total);\n", "int count = 0;\n", "String name = \"x\";\n",
+        "List<String> items = new ArrayList<>();\n",
+    ],
+    'cpp': [
+        "std::cout << total << std::endl;\n", "int count = 0;\n", "std::vector<int> items;\n", "#include <vector>\n",
+    ],
+    'csharp': [
+        "Console.WriteLine(total);\n", "var items = new List<string>();\n", "using System.Linq;\n",
+    ],
+    'go': [
+        "fmt.Println(total)\n", "count := 0\n", "var items []string\n", "import \"fmt\"\n",
+    ],
+    'rust': [
+        "println!(\"{}\", total);\n", "let count = 0;\n", "let mut items = Vec::new();\n", "use std::io;\n",
+    ],
+    'php': [
+        "echo $total;\n", "$count = 0;\n", "$items = [];\n", "<?php echo 'x'; ?>\n",
+    ],
+    'ruby': [
+        "puts total\n", "require 'json'\n", "items = []\n", "attr_reader :name\n",
+    ],
+    'swift': [
+        "print(\"\\(total)\")\n", "let count = 0\n", "var items: [String] = []\n", "import Foundation\n",
+    ],
+    'kotlin': [
+        "println(total)\n", "val count = 0\n", "var items = mutableListOf<String>()\n",
+    ],
+    'scala': [
+        "println(total)\n", "val count = 0\n", "var items = List[String]()\n",
+    ],
+    'r': [
+        "count <- 0\n", "items <- c()\n", "library(dplyr)\n", "cat(total, \"\\n\")\n",
+        "n <- length(v)\n", "z <- a / b\n", "hist(x)\n",
+    ],
+    'matlab': [
+        "count = 0;\n", "disp(total);\n", "items = zeros(1, 10);\n", "fprintf('%d\\n', total);\n",
+    ],
+    'sql': [
+        "SELECT * FROM orders;\n", "select * from orders;\n", "SELECT COUNT(*) FROM accounts;\n",
+        "SELECT id, name FROM customers WHERE id = 1;\n", "INSERT INTO logs VALUES (1, 'x');\n",
+        "DROP TABLE sessions;\n", "UPDATE accounts SET active = 0;\n", "DELETE FROM logs;\n",
+        "SELECT DISTINCT city FROM customers;\n",
+    ],
+    'html': [
+        "<p>Hello</p>\n", "<span class=\"x\">y</span>\n", "<br>\n", "<img src=\"a.png\" alt=\"\">\n",
+    ],
+    'css': [
+        "body { margin: 0; }\n", ".hidden { display: none; }\n", "a { color: red; }\n",
+    ],
+    'scss': [
+        "$gap: 8px;\n", ".card { &:hover { color: red; } }\n", "@include flex-center;\n",
+    ],
+    'sass': [
+        "$gap: 8px\n", "+flex-center\n", ".card\n  color: red\n",
+    ],
+}
+
+for _language, _snippets in SHORT_SAMPLES.items():
+    TRAINING_SAMPLES[_language].extend(_snippets)
@@ -0,0 +1,37 @@
+import logging
+
+import openai
+
+from app.core.config import settings
+from app.services.async_ai_refactoring import AsyncAIRefactoringService, get_http_client
+from app.services.model_router import ModelRouter
+
+logger = logging.getLogger(__name__)
+
+class OpenAICompatibleAIRefactoringService(AsyncAIRefactoringService):
+    """
+    AsyncAIRefactoringService pointed at any server speaking the OpenAI chat API.
+
+    Use it with a locally hosted model server (vLLM, llama.cpp, Ollama, TGI, ...)
+    for offline or air-gapped installs. Model routing is disabled because
+    the server usually hosts a single model.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.model = settings.AI_BACKEND_MODEL or settings.OPENAI_MODEL
+        self.router = ModelRouter(large_model=self.model)
+        self.context_window = settings.AI_BACKEND_CONTEXT_WINDOW or None
+        logger.info(f"Using OpenAI-compatible backend at {settings.AI_BACKEND_BASE_URL} with model {self.model}")
+
+    def _create_client(self):
+        """Create an AsyncOpenAI client for the configured base URL on the shared connection pool."""
+        if not settings.AI_BACKEND_BASE_URL:
+            raise ValueError("AI_BACKEND_BASE_URL must be set for the openai_compatible backend")
+        return openai.AsyncOpenAI(
+            api_key=settings.AI_BACKEND_API_KEY or settings.OPENAI_API_KEY,
+            base_url=settings.AI_BACKEND_BASE_URL,
+            http_client=get_http_client(),
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
+            max_retries=0
+        )
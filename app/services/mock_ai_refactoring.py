@@ -1,20 +1,38 @@
+import asyncio
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import logging
 
+from app.core.config import settings
+from app.services.language_detection import DetectionResult
+from app.services.prompt_builder import FewShotExample
+
 logger = logging.getLogger(__name__)
 
+REFACTORED_CODE = "def efficient_sum(numbers):\n    \"\"\"Calculates the sum of a list of numbers.\"\"\"\n    return sum(numbers)"
+REFACTORING_EXPLANATION = "The original for-loop was replaced with Python's built-in `sum()` function. This is more efficient, readable, and less prone to errors."
+
 class MockAIRefactoringService:
     """A mock service for AI-powered code refactoring that returns dummy data."""
     
     def __init__(self):
+        self.model = settings.OPENAI_MODEL
+        self.context_window = None
         logger.info("Using MockAIRefactoringService.")
 
     def detect_language(self, code: str) -> str:
         """Mock language detection."""
         return 'python'
 
-    def analyze_code_quality(self, code: str, language: str) -> Dict[str, any]:
+    def detect_language_with_confidence(self, code: str) -> DetectionResult:
+        """Mock language detection, always confident."""
+        return DetectionResult('python', 1.0)
+
+    def detect_languages(self, codes: List[str]) -> List[DetectionResult]:
+        """Mock batch language detection."""
+        return [DetectionResult('python', 1.0) for _ in codes]
+
+    def analyze_code_quality(self, code: str, language: str, use_model: Optional[bool] = None) -> Dict[str, any]:
         """Mock code quality analysis."""
         return {
             "complexity_score": 3,
@@ -31,14 +49,13 @@ class MockAIRefactoringService:
             "overall_assessment": "The code is functional but can be more concise and Pythonic."
         }
 
-    def refactor_code(self, code: str, language:str, focus_areas: Optional[List[str]] = None) -> Tuple[str, str]:
+    def refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Tuple[str, str]:
         """Mock code refactoring."""
         time.sleep(2)
         
-        refactored_code = "def efficient_sum(numbers):\n    \"\"\"Calculates the sum of a list of numbers.\"\"\"\n    return sum(numbers)"
-        explanation = "The original for-loop was replaced with Python's built-in `sum()` function. This is more efficient, readable, and less prone to errors."
-        
-        return refactored_code, explanation
+        return REFACTORED_CODE, REFACTORING_EXPLANATION
 
     def suggest_improvements(self, code: str, language: str) -> List[Dict[str, str]]:
         """Mock improvement suggestions."""
@@ -53,6 +70,69 @@ class MockAIRefactoringService:
             }
         ]
 
+    def review_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """Mock combined analysis, refactoring and suggestions."""
+        time.sleep(2)
+        return {
+            "analysis": self.analyze_code_quality(code, language),
+            "refactored_code": REFACTORED_CODE,
+            "explanation": REFACTORING_EXPLANATION,
+            "suggestions": self.suggest_improvements(code, language)
+        }
+
     def explain_code(self, code: str, language: str) -> str:
         """Mock code explanation."""
-        return "This Python function `inefficient_sum` takes a list of numbers, initializes a variable `s` to 0, iterates through the list, adds each number to `s`, and finally returns the total sum." 
\ No newline at end of file
+        return "This Python function `inefficient_sum` takes a list of numbers, initializes a variable `s` to 0, iterates through the list, adds each number to `s`, and finally returns the total sum."
+
+class AsyncMockAIRefactoringService(MockAIRefactoringService):
+    """Async variant of the mock service; mirrors AsyncAIRefactoringService."""
+
+    async def analyze_code_quality(self, code: str, language: str, use_model: Optional[bool] = None) -> Dict[str, any]:
+        """Mock code quality analysis."""
+        return super().analyze_code_quality(code, language)
+
+    async def refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Tuple[str, str]:
+        """Mock code refactoring without blocking the event loop."""
+        await asyncio.sleep(2)
+        return REFACTORED_CODE, REFACTORING_EXPLANATION
+
+    async def suggest_improvements(self, code: str, language: str) -> List[Dict[str, str]]:
+        """Mock improvement suggestions."""
+        return super().suggest_improvements(code, language)
+
+    async def review_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None, example: Optional[FewShotExample] = None
+    ) -> Dict[str, Any]:
+        """Mock combined review without blocking the event loop."""
+        await asyncio.sleep(2)
+        return {
+            "analysis": super().analyze_code_quality(code, language),
+            "refactored_code": REFACTORED_CODE,
+            "explanation": REFACTORING_EXPLANATION,
+            "suggestions": super().suggest_improvements(code, language)
+        }
+
+    async def explain_code(self, code: str, language: str) -> str:
+        """Mock code explanation."""
+        return super().explain_code(code, language)
+
+    async def stream_refactor_code(
+        self, code: str, language: str, focus_areas: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Mock streamed refactoring, emitting the refactored code line by line."""
+        for line in REFACTORED_CODE.splitlines(keepends=True):
+            await asyncio.sleep(0.1)
+            yield "token", line
+        yield "result", {"refactored_code": REFACTORED_CODE, "explanation": REFACTORING_EXPLANATION}
+
+    async def stream_explain_code(self, code: str, language: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Mock streamed explanation, emitting one word at a time."""
+        explanation = super().explain_code(code, language)
+        for word in explanation.split(" "):
+            await asyncio.sleep(0.02)
+            yield "token", word + " "
+        yield "result", explanation
@@ -0,0 +1,148 @@
+"""
+Per-call model selection.
+
+Small snippets in well-supported languages go to a fast, cheap model; large
+inputs, less common languages and demanding refactoring focus areas go to
+the main model. A call routed to the small model is escalated to the main
+model when its output fails validation. Decisions made while handling a
+refactoring are collected with ``record_decisions`` so they can be stored.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.services.prompt_builder import CODE_OUTPUT_OPERATIONS, count_tokens, output_tokens
+
+class ModelProfile(NamedTuple):
+    input_cost_per_1k: float    # USD per 1000 prompt tokens
+    output_cost_per_1k: float   # USD per 1000 completion tokens
+    tokens_per_second: float    # typical generation speed
+    first_token_seconds: float  # typical time to first token
+
+# Approximate list prices and speeds, used only to compare models against the budgets
+MODEL_PROFILES = {
+    "gpt-4": ModelProfile(0.03, 0.06, 20, 1.0),
+    "gpt-4-32k": ModelProfile(0.06, 0.12, 20, 1.0),
+    "gpt-4-turbo": ModelProfile(0.01, 0.03, 35, 0.8),
+    "gpt-4o": ModelProfile(0.005, 0.015, 60, 0.5),
+    "gpt-4o-mini": ModelProfile(0.00015, 0.0006, 80, 0.4),
+    "gpt-3.5-turbo": ModelProfile(0.0005, 0.0015, 80, 0.4),
+}
+DEFAULT_PROFILE = MODEL_PROFILES["gpt-4"]
+
+# Prompt tokens added around the code by the templates, for projections
+PROMPT_OVERHEAD_TOKENS = 400
+
+class RoutingDecision(NamedTuple):
+    operation: str
+    model: str
+    reason: str             # small_snippet, size, language, focus_areas, budget or routing_disabled
+    escalated: bool = False
+    cached: bool = False
+
+_decisions: ContextVar[Optional[List[RoutingDecision]]] = ContextVar("routing_decisions", default=None)
+
+@contextmanager
+def record_decisions() -> Iterator[List[RoutingDecision]]:
+    """Collect the routing decisions of every call made inside the block (including child tasks)."""
+    decisions: List[RoutingDecision] = []
+    token = _decisions.set(decisions)
+    try:
+        yield decisions
+    finally:
+        _decisions.reset(token)
+
+def record_decision(decision: RoutingDecision) -> None:
+    decisions = _decisions.get()
+    if decisions is not None:
+        decisions.append(decision)
+
+def project(model: str, operation: str, code_tokens: int) -> Tuple[float, float]:
+    """Projected (cost in USD, latency in seconds) of one call."""
+    profile = MODEL_PROFILES.get(model, DEFAULT_PROFILE)
+    completion = output_tokens(operation, code_tokens)
+    cost = (
+        (code_tokens + PROMPT_OVERHEAD_TOKENS) * profile.input_cost_per_1k
+        + completion * profile.output_cost_per_1k
+    ) / 1000
+    return cost, profile.first_token_seconds + completion / profile.tokens_per_second
+
+class ModelRouter:
+    """Chooses the model for each call."""
+
+    def __init__(
+        self,
+        large_model: str,
+        small_model: str = "",
+        small_max_code_tokens: int = 400,
+        small_max_refactor_tokens: int = 200,
+        small_languages: Optional[List[str]] = None,
+        large_focus_areas: Optional[List[str]] = None,
+        latency_budget_seconds: float = 0.0,
+        cost_budget_usd: float = 0.0
+    ):
+        self.large_model = large_model
+        self.small_model = small_model
+        self.small_max_code_tokens = small_max_code_tokens
+        self.small_max_refactor_tokens = small_max_refactor_tokens
+        self.small_languages = set(small_languages or [])
+        self.large_focus_areas = {area.lower() for area in large_focus_areas or []}
+        self.latency_budget_seconds = latency_budget_seconds
+        self.cost_budget_usd = cost_budget_usd
+
+    @classmethod
+    def from_settings(cls) -> "ModelRouter":
+        return cls(
+            large_model=settings.OPENAI_MODEL,
+            small_model=settings.ROUTER_SMALL_MODEL,
+            small_max_code_tokens=settings.ROUTER_SMALL_MAX_CODE_TOKENS,
+            small_max_refactor_tokens=settings.ROUTER_SMALL_MAX_REFACTOR_TOKENS,
+            small_languages=settings.ROUTER_SMALL_LANGUAGES,
+            large_focus_areas=settings.ROUTER_LARGE_FOCUS_AREAS,
+            latency_budget_seconds=settings.ROUTER_LATENCY_BUDGET_SECONDS,
+            cost_budget_usd=settings.ROUTER_COST_BUDGET_USD
+        )
+
+    def route(
+        self, operation: str, code: str, language: str, focus_areas: Optional[List[str]] = None
+    ) -> RoutingDecision:
+        """
+        Pick the model for one call.
+
+        Args:
+            operation: One of analyze, refactor, suggest, explain or review
+            code: The code sent with the call
+            language: Programming language of the code
+            focus_areas: Requested refactoring focus areas
+
+        Returns:
+            RoutingDecision naming the model and why it was chosen
+        """
+        if not self.small_model or self.small_model == self.large_model:
+            return RoutingDecision(operation, self.large_model, "routing_disabled")
+        if language not in self.small_languages:
+            return RoutingDecision(operation, self.large_model, "language")
+        if operation in CODE_OUTPUT_OPERATIONS and self.large_focus_areas & {area.lower() for area in focus_areas or []}:
+            return RoutingDecision(operation, self.large_model, "focus_areas")
+
+        code_tokens = count_tokens(code, self.large_model)
+        limit = self.small_max_refactor_tokens if operation in CODE_OUTPUT_OPERATIONS else self.small_max_code_tokens
+        if code_tokens <= limit:
+            return RoutingDecision(operation, self.small_model, "small_snippet")
+        if self._over_budget(self.large_model, operation, code_tokens) and not self._over_budget(self.small_model, operation, code_tokens):
+            return RoutingDecision(operation, self.small_model, "budget")
+        return RoutingDecision(operation, self.large_model, "size")
+
+    def escalate(self, decision: RoutingDecision) -> Optional[RoutingDecision]:
+        """The decision to retry with after the small model's output failed validation, or None."""
+        if decision.model == self.large_model:
+            return None
+        return decision._replace(model=self.large_model, escalated=True)
+
+    def _over_budget(self, model: str, operation: str, code_tokens: int) -> bool:
+        cost, latency = project(model, operation, code_tokens)
+        return (
+            (self.cost_budget_usd > 0 and cost > self.cost_budget_usd)
+            or (self.latency_budget_seconds > 0 and latency > self.latency_budget_seconds)
+        )
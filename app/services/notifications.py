@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Optional, Set
+from uuid import UUID
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel carrying refactoring status changes between processes
+STATUS_CHANNEL = "refactoring_status"
+
+def notify_status(
+    db: Session,
+    refactoring_id: UUID,
+    status: str,
+    batch_id: Optional[UUID] = None,
+    stage: Optional[str] = None
+) -> None:
+    """
+    Publish a status change for a refactoring.
+
+    The notification is sent with ``pg_notify`` inside the caller's transaction,
+    so subscribers only hear about it once the change is committed.
+
+    Args:
+        db: Session whose transaction carries the change
+        refactoring_id: Refactoring whose status changed
+        status: New status of the refactoring
+        batch_id: Batch the refactoring belongs to, if any
+        stage: Pipeline stage that produced a partial result (e.g. "analysis")
+    """
+    payload = {
+        "refactoring_id": str(refactoring_id),
+        "batch_id": str(batch_id) if batch_id else None,
+        "status": status,
+        "stage": stage
+    }
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": STATUS_CHANNEL, "payload": json.dumps(payload)})
+
+class StatusBroadcaster:
+    """
+    Fans refactoring status notifications out to in-process subscribers.
+
+    A single LISTEN connection per process receives notifications from every
+    API and worker process; each subscriber gets its own bounded queue keyed
+    by refactoring id or batch id.
+    """
+
+    RECONNECT_DELAY_SECONDS = 5
+    QUEUE_SIZE = 1000
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, key: UUID) -> asyncio.Queue:
+        """Register a queue receiving notifications for a refactoring or batch id."""
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self._subscribers[str(key)].add(queue)
+        return queue
+
+    def unsubscribe(self, key: UUID, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(str(key))
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[str(key)]
+
+    def start(self) -> None:
+        """Start listening for notifications in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def dispatch(self, payload: dict) -> None:
+        """Deliver a notification payload to the matching subscribers."""
+        for key in (payload.get("refactoring_id"), payload.get("batch_id")):
+            for queue in self._subscribers.get(key, ()):
+                try:
+                    queue.put_nowait(payload)
+                except asyncio.QueueFull:
+                    # Slow consumer; subscribers re-read the stored state when idle, so dropping is safe
+                    logger.warning(f"Dropping status notification for slow subscriber of {key}")
+
+    async def _listen_forever(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Status listener failed, reconnecting: {e}")
+            await asyncio.sleep(self.RECONNECT_DELAY_SECONDS)
+
+    async def _listen(self) -> None:
+        raw_connection = engine.raw_connection()
+        raw_connection.detach()
+        connection = raw_connection.driver_connection
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {STATUS_CHANNEL}")
+
+        loop = asyncio.get_running_loop()
+        lost = loop.create_future()
+
+        def on_readable():
+            try:
+                connection.poll()
+            except Exception as e:
+                if not lost.done():
+                    lost.set_exception(e)
+                return
+            while connection.notifies:
+                notification = connection.notifies.pop(0)
+                try:
+                    self.dispatch(json.loads(notification.payload))
+                except ValueError:
+                    logger.warning(f"Ignoring malformed status notification: {notification.payload}")
+
+        loop.add_reader(connection.fileno(), on_readable)
+        try:
+            await lost
+        finally:
+            loop.remove_reader(connection.fileno())
+            connection.close()
+
+broadcaster = StatusBroadcaster()
@@ -0,0 +1,75 @@
+"""
+Keyset pagination over refactorings.
+
+Pages are ordered newest first by ``(created_at, id)`` and a page continues
+strictly after the last row of the previous one, so each page is an index
+range scan whose cost does not grow with the page number. The position is
+handed to clients as an opaque cursor.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import Select, tuple_
+
+from app.models.code_refactoring import CodeRefactoring
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+class Page(NamedTuple):
+    items: List[CodeRefactoring]
+    next_cursor: Optional[str]   # None on the last page
+
+def encode_cursor(created_at: datetime, refactoring_id: UUID) -> str:
+    """Opaque cursor pointing just after the given row."""
+    raw = f"{created_at.isoformat()}|{refactoring_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode('utf-8')
+        created_at, refactoring_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(refactoring_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+def keyset_statement(statement: Select, limit: int, cursor: Optional[str] = None) -> Select:
+    """
+    Restrict a refactoring select to one page, newest first.
+
+    One extra row is selected to tell whether another page follows; pass the
+    fetched rows to ``to_page``.
+
+    Args:
+        statement: Select of CodeRefactoring with filters and loader options applied
+        limit: Maximum number of rows in the page
+        cursor: Cursor returned with the previous page, or None for the first page
+
+    Returns:
+        The paginated statement
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    if cursor:
+        statement = statement.where(tuple_(CodeRefactoring.created_at, CodeRefactoring.id) < decode_cursor(cursor))
+    return (
+        statement.order_by(CodeRefactoring.created_at.desc(), CodeRefactoring.id.desc())
+        .limit(limit + 1)
+    )
+
+def to_page(rows: Sequence[CodeRefactoring], limit: int) -> Page:
+    """Page of the rows fetched by a ``keyset_statement`` with the same limit."""
+    if len(rows) <= limit:
+        return Page(list(rows), None)
+    last = rows[limit - 1]
+    return Page(list(rows[:limit]), encode_cursor(last.created_at, last.id))
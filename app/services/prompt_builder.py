@@ -0,0 +1,497 @@
+"""
+Prompt construction with local token accounting.
+
+Builds the chat messages for every service operation, counts their tokens
+locally and sizes ``max_tokens`` from the input and the model's context
+window, so oversized requests are rejected (or routed to chunking) before
+any network call is made.
+"""
+import json
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a code-aware estimate
+    tiktoken = None
+
+from app.services.diffs import unified_diff
+
+# Bump whenever a prompt template changes so cached results are not reused
+PROMPT_VERSION = "2"
+
+DEFAULT_FOCUS_AREAS = ['readability', 'performance', 'best_practices']
+
+# Context window (prompt + completion tokens) per model; unknown models use the default
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Per operation: (base output tokens, output tokens per code token, minimum, maximum)
+OUTPUT_BUDGETS = {
+    "analyze": (400, 0.25, 600, 2000),
+    "refactor": (400, 1.2, 512, 4096),
+    "suggest": (400, 0.4, 600, 2000),
+    "explain": (300, 0.5, 400, 1500),
+    "review": (1000, 1.4, 1024, 6000),
+    "describe_issues": (200, 0.2, 300, 1500),
+    "refactor_diff": (400, 0.5, 512, 4096),
+    "review_diff": (1000, 0.7, 1024, 6000),
+}
+
+# Variants of the code-rewriting operations whose answer is a unified diff
+# against the input instead of the whole refactored code
+DIFF_OPERATIONS = {"refactor_diff": "refactor", "review_diff": "review"}
+
+# Operations whose output rewrites the input code
+CODE_OUTPUT_OPERATIONS = {"refactor", "review"} | set(DIFF_OPERATIONS)
+
+# Response fields that rewrite the whole input code
+CODE_OUTPUT_FIELDS = {"refactored_code", "patch"}
+
+# Tokens added by the chat format per message and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+class PromptTooLargeError(ValueError):
+    """Raised when a request cannot fit the model's context window."""
+
+    def __init__(self, operation: str, input_tokens: int, required_output_tokens: int, context_window: int):
+        self.operation = operation
+        self.input_tokens = input_tokens
+        self.required_output_tokens = required_output_tokens
+        self.context_window = context_window
+        super().__init__(
+            f"{operation} request needs {input_tokens} input and at least {required_output_tokens} output tokens, "
+            f"but the model context window is {context_window} tokens"
+        )
+
+class FewShotExample(NamedTuple):
+    """A completed refactoring of similar code, shown to the model as a worked example."""
+    original_code: str
+    refactored_code: str
+    explanation: str
+    analysis: Optional[Dict] = None
+    suggestions: Optional[List[Dict]] = None
+
+class TokenEstimate(NamedTuple):
+    input_tokens: int
+    max_output_tokens: int
+    context_window: int
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str) -> int:
+    """Count tokens with the model's tokenizer, or estimate them if tiktoken is unavailable."""
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text))
+    # Roughly one token per punctuation mark and per four characters of a word
+    return sum(math.ceil(len(piece) / 4) for piece in WORD_PATTERN.findall(text))
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    """Count the prompt tokens of a chat request, including per-message overhead."""
+    return sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(message["content"], model) for message in messages) + REPLY_OVERHEAD_TOKENS
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+def estimate(
+    model: str, operation: str, messages: List[Dict[str, str]], code: str, window: Optional[int] = None
+) -> TokenEstimate:
+    """
+    Size a request for ``model``.
+
+    Args:
+        model: Model the request is sent to
+        operation: One of analyze, refactor, suggest, explain or review
+        messages: Chat messages of the request
+        code: The code embedded in the messages (drives the expected output size)
+        window: Context window of the model in tokens (default: MODEL_CONTEXT_WINDOWS)
+
+    Returns:
+        TokenEstimate with the prompt size and the ``max_tokens`` to request
+
+    Raises:
+        PromptTooLargeError: If the minimum useful output does not fit the context window
+    """
+    minimum = OUTPUT_BUDGETS[operation][2]
+    window = window or context_window(model)
+    input_tokens = count_message_tokens(messages, model)
+    code_tokens = count_tokens(code, model)
+
+    # A full-text refactoring must at least be able to repeat the code it rewrites
+    repeats_code = operation in CODE_OUTPUT_OPERATIONS and operation not in DIFF_OPERATIONS
+    required = max(minimum, code_tokens + 200) if repeats_code else minimum
+    available = window - input_tokens
+    if available < required:
+        raise PromptTooLargeError(operation, input_tokens, required, window)
+
+    return TokenEstimate(input_tokens, min(output_tokens(operation, code_tokens), available), window)
+
+def output_tokens(operation: str, code_tokens: int) -> int:
+    """Output budget for an operation on ``code_tokens`` tokens of code, ignoring the context window."""
+    base, per_code_token, minimum, maximum = OUTPUT_BUDGETS[operation]
+    return min(maximum, max(minimum, int(base + per_code_token * code_tokens)))
+
+def build_messages(
+    operation: str,
+    code: str,
+    language: str,
+    focus_areas: Optional[List[str]] = None,
+    context: Optional[str] = None,
+    example: Optional[FewShotExample] = None
+) -> Tuple[List[Dict[str, str]], float]:
+    """
+    Build the chat messages and sampling temperature for an operation.
+
+    An ``example`` (refactor and review only) is inserted before the request as
+    a prior exchange answering the same prompt for the example's code. For
+    describe_issues, ``code`` holds excerpts and ``context`` the issues as JSON.
+    The ``_diff`` variants of refactor and review ask for a patch instead of
+    the refactored code.
+    """
+    if operation == "analyze":
+        return _analysis_messages(code, language)
+    if operation == "suggest":
+        return _suggestions_messages(code, language)
+    if operation == "explain":
+        return _explanation_messages(code, language)
+    if operation == "describe_issues":
+        return _issue_wording_messages(code, language, context)
+    diff = operation in DIFF_OPERATIONS
+    if DIFF_OPERATIONS.get(operation, operation) == "refactor":
+        messages, temperature = _refactoring_messages(code, language, focus_areas, context, diff)
+    elif DIFF_OPERATIONS.get(operation, operation) == "review":
+        messages, temperature = _review_messages(code, language, focus_areas, context, diff)
+    else:
+        raise ValueError(f"Unknown operation: {operation}")
+    if example is not None:
+        messages = messages[:1] + _example_messages(operation, example, language, focus_areas) + messages[1:]
+    return messages, temperature
+
+def build_request(
+    model: str,
+    operation: str,
+    code: str,
+    language: str,
+    focus_areas: Optional[List[str]] = None,
+    context: Optional[str] = None,
+    example: Optional[FewShotExample] = None,
+    window: Optional[int] = None
+) -> Dict:
+    """
+    Build complete chat completion arguments, with ``max_tokens`` sized to the input.
+
+    A few-shot ``example`` that would not fit the context window is left out.
+
+    Raises:
+        PromptTooLargeError: If the request cannot fit the model's context window
+    """
+    messages, temperature = build_messages(operation, code, language, focus_areas, context, example)
+    try:
+        budget = estimate(model, operation, messages, code, window)
+    except PromptTooLargeError:
+        if example is None:
+            raise
+        return build_request(model, operation, code, language, focus_areas, context, window=window)
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": budget.max_output_tokens
+    }
+
+def build_repair_request(
+    model: str,
+    request: Dict,
+    operation: str,
+    code: str,
+    partial: Dict,
+    missing: List[str],
+    window: Optional[int] = None
+) -> Dict:
+    """
+    Build a follow-up request asking only for the fields a response lacked.
+
+    The original conversation is replayed with the valid part of the answer,
+    so the model regenerates the missing fields instead of the whole result.
+
+    Raises:
+        PromptTooLargeError: If the follow-up cannot fit the model's context window
+    """
+    messages = request["messages"] + [
+        {"role": "assistant", "content": json.dumps(partial)},
+        {"role": "user", "content": (
+            "Your JSON response was incomplete or invalid. Reply with a JSON object containing only "
+            f"these fields, in the format requested above: {', '.join(missing)}"
+        )}
+    ]
+    # Only size the output to the code when the code itself must be regenerated
+    budget = estimate(model, operation, messages, code if CODE_OUTPUT_FIELDS & set(missing) else "", window)
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": request["temperature"],
+        "max_tokens": budget.max_output_tokens
+    }
+
+def fits_single_call(
+    model: str, operation: str, code: str, language: str, focus_areas: Optional[List[str]] = None,
+    window: Optional[int] = None
+) -> bool:
+    """Whether the whole code fits one request (used to route large refactors to chunking)."""
+    messages, _ = build_messages(operation, code, language, focus_areas)
+    try:
+        estimate(model, operation, messages, code, window)
+    except PromptTooLargeError:
+        return False
+    return True
+
+def _example_messages(
+    operation: str, example: FewShotExample, language: str, focus_areas: Optional[List[str]]
+) -> List[Dict[str, str]]:
+    if operation in DIFF_OPERATIONS:
+        answer = {"patch": unified_diff(example.original_code, example.refactored_code), "explanation": example.explanation}
+    else:
+        answer = {"refactored_code": example.refactored_code, "explanation": example.explanation}
+    if DIFF_OPERATIONS.get(operation, operation) == "review":
+        if example.analysis is None:
+            # A review answer without its analysis would teach the model to omit it
+            return []
+        answer = {"analysis": example.analysis, **answer, "suggestions": example.suggestions or []}
+    messages, _ = build_messages(operation, example.original_code, language, focus_areas)
+    return [messages[-1], {"role": "assistant", "content": json.dumps(answer)}]
+
+def _patch_instructions() -> str:
+    return """
+    Do not repeat the whole code. Return the refactoring as a unified diff against
+    the code below: hunks starting with @@ headers, unchanged context lines prefixed
+    with a space, removed lines with - and added lines with +. Include three lines
+    of context around each change and copy context and removed lines exactly.
+    """
+
+def _code_field(diff: bool) -> str:
+    if diff:
+        return '"patch": "Unified diff that turns the original code into the improved code"'
+    return '"refactored_code": "The improved code"'
+
+def _analysis_messages(code: str, language: str) -> Tuple[List[Dict[str, str]], float]:
+    analysis_prompt = f"""
+    Analyze the following {language} code for potential refactoring opportunities. 
+    Focus on:
+    1. Code complexity and readability
+    2. Performance issues
+    3. Code smells (long methods, duplicate code, etc.)
+    4. Best practices violations
+    5. Security concerns
+
+    Code:
+    {code}
+
+    Provide a JSON response with the following structure:
+    {{
+        "complexity_score": 1-10,
+        "readability_score": 1-10,
+        "issues": [
+            {{
+                "type": "complexity|readability|performance|security|best_practice",
+                "severity": "low|medium|high|critical",
+                "description": "Description of the issue",
+                "line_numbers": [1, 2, 3],
+                "suggestion": "How to fix this issue"
+            }}
+        ],
+        "overall_assessment": "Brief summary of code quality"
+    }}
+    """
+    return [
+        {"role": "system", "content": "You are an expert code reviewer and refactoring specialist. Provide detailed, actionable analysis in JSON format."},
+        {"role": "user", "content": analysis_prompt}
+    ], 0.1
+
+def _refactoring_messages(
+    code: str, language: str, focus_areas: List[str], context: Optional[str] = None, diff: bool = False
+) -> Tuple[List[Dict[str, str]], float]:
+    focus_areas_str = ', '.join(focus_areas or DEFAULT_FOCUS_AREAS)
+    context_section = f"""
+    This code is one part of a larger file. The rest of the file declares
+    (for reference only; do not include it in your response):
+    {context}
+    """ if context else ""
+
+    refactoring_prompt = f"""
+    Refactor the following {language} code to improve {focus_areas_str}.
+
+    Requirements:
+    1. Maintain the same functionality
+    2. Improve code quality and readability
+    3. Follow {language} best practices
+    4. Add helpful comments where appropriate
+    5. Optimize performance if possible
+    {context_section}{_patch_instructions() if diff else ""}
+    Original Code:
+    {code}
+
+    Please provide your response in the following JSON format:
+    {{
+        {_code_field(diff)},
+        "explanation": "Detailed explanation of what was changed and why",
+        "improvements": [
+            {{
+                "type": "readability|performance|security|best_practice",
+                "description": "What was improved",
+                "impact": "How this improvement helps"
+            }}
+        ]
+    }}
+    """
+    return [
+        {"role": "system", "content": f"You are an expert {language} developer and refactoring specialist. Always maintain functionality while improving code quality."},
+        {"role": "user", "content": refactoring_prompt}
+    ], 0.2
+
+def _suggestions_messages(code: str, language: str) -> Tuple[List[Dict[str, str]], float]:
+    suggestions_prompt = f"""
+    Analyze the following {language} code and suggest specific improvements.
+    Focus on actionable, specific suggestions that can be implemented.
+
+    Code:
+    {code}
+
+    Provide your response in JSON format:
+    {{
+        "suggestions": [
+            {{
+                "category": "readability|performance|security|maintainability|best_practice",
+                "priority": "low|medium|high|critical",
+                "title": "Brief title of the suggestion",
+                "description": "Detailed description of the improvement",
+                "example": "Code example showing the improvement",
+                "rationale": "Why this improvement is beneficial"
+            }}
+        ]
+    }}
+    """
+    return [
+        {"role": "system", "content": f"You are an expert {language} developer providing actionable improvement suggestions."},
+        {"role": "user", "content": suggestions_prompt}
+    ], 0.1
+
+def _explanation_messages(code: str, language: str) -> Tuple[List[Dict[str, str]], float]:
+    explanation_prompt = f"""
+    Explain the following {language} code in detail. Include:
+    1. What the code does overall
+    2. How each major function/class works
+    3. Key algorithms or patterns used
+    4. Any important variables or data structures
+    5. Potential edge cases or considerations
+
+    Code:
+    {code}
+
+    Provide a clear, educational explanation suitable for developers.
+    """
+    return [
+        {"role": "system", "content": f"You are an expert {language} developer and educator. Provide clear, detailed explanations."},
+        {"role": "user", "content": explanation_prompt}
+    ], 0.1
+
+def _review_messages(
+    code: str, language: str, focus_areas: List[str], context: Optional[str] = None, diff: bool = False
+) -> Tuple[List[Dict[str, str]], float]:
+    focus_areas_str = ', '.join(focus_areas or DEFAULT_FOCUS_AREAS)
+    context_section = f"""
+    This code is one part of a larger file. The rest of the file declares
+    (for reference only; do not include it in your response):
+    {context}
+    """ if context else ""
+
+    review_prompt = f"""
+    Review the following {language} code in three steps and answer all of them at once.
+
+    1. Analyze it for complexity, readability, performance issues, code smells,
+       best practices violations and security concerns.
+    2. Suggest specific, actionable improvements.
+    3. Refactor it to improve {focus_areas_str}, maintaining the same functionality
+       and following {language} best practices.
+    {context_section}{_patch_instructions() if diff else ""}
+    Code:
+    {code}
+
+    Provide a single JSON response with the following structure:
+    {{
+        "analysis": {{
+            "complexity_score": 1-10,
+            "readability_score": 1-10,
+            "issues": [
+                {{
+                    "type": "complexity|readability|performance|security|best_practice",
+                    "severity": "low|medium|high|critical",
+                    "description": "Description of the issue",
+                    "line_numbers": [1, 2, 3],
+                    "suggestion": "How to fix this issue"
+                }}
+            ],
+            "overall_assessment": "Brief summary of code quality"
+        }},
+        "suggestions": [
+            {{
+                "category": "readability|performance|security|maintainability|best_practice",
+                "priority": "low|medium|high|critical",
+                "title": "Brief title of the suggestion",
+                "description": "Detailed description of the improvement",
+                "example": "Code example showing the improvement",
+                "rationale": "Why this improvement is beneficial"
+            }}
+        ],
+        {_code_field(diff)},
+        "explanation": "Detailed explanation of what was changed and why"
+    }}
+    """
+    return [
+        {"role": "system", "content": f"You are an expert {language} code reviewer and refactoring specialist. Always maintain functionality while improving code quality, and answer in JSON format."},
+        {"role": "user", "content": review_prompt}
+    ], 0.1
+
+def _issue_wording_messages(code: str, language: str, issues: str) -> Tuple[List[Dict[str, str]], float]:
+    wording_prompt = f"""
+    Static analysis found the following issues in a {language} program. For each
+    issue, rewrite the description so a developer understands the problem in this
+    specific code, and give one concrete suggestion to fix it.
+
+    Issues:
+    {issues}
+
+    Relevant code (each line prefixed with its line number):
+    {code}
+
+    Please provide your response in the following JSON format, with one entry per issue:
+    {{
+        "issues": [
+            {{
+                "index": 0,
+                "description": "What is wrong in this code",
+                "suggestion": "How to fix it"
+            }}
+        ]
+    }}
+    """
+    return [
+        {"role": "system", "content": f"You are an expert {language} code reviewer. Be specific and concise."},
+        {"role": "user", "content": wording_prompt}
+    ], 0.2
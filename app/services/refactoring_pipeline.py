@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.code_refactoring import CodeRefactoring
+from app.services.deduplication import deduplicate, few_shot_example
+from app.services.model_router import RoutingDecision, record_decisions
+from app.services.notifications import notify_status
+from app.services.prompt_builder import FewShotExample
+from app.services.revisions import refactor_revision
+from app.services.static_analysis import analyze_code
+
+logger = logging.getLogger(__name__)
+
+async def process_refactoring(refactoring_id: UUID, db: Session, ai_service) -> None:
+    """
+    Run the AI pipeline for a refactoring and store the results.
+
+    The session does blocking I/O, so every database step runs in a thread;
+    the event loop is shared with the worker's other slots (and the API, when
+    the worker is embedded). Exceptions propagate to the caller (the worker),
+    which decides whether the job is retried or dead-lettered.
+
+    Args:
+        refactoring_id: ID of the CodeRefactoring row to process
+        db: Session owned by the caller for the duration of the job
+        ai_service: Async AI service used for analysis and refactoring
+    """
+    logger.info(f"Starting refactoring for ID: {refactoring_id}")
+    prepared = await asyncio.to_thread(_prepare, db, refactoring_id, ai_service)
+    if prepared is None:
+        return
+    refactoring, language, example = prepared
+    
+    with record_decisions() as decisions:
+        # A revision only sends the units changed since its parent to the model
+        revised = refactoring.parent_id is not None and await refactor_revision(refactoring, ai_service, language)
+        if not revised and settings.AI_FUSED_MODE:
+            await _run_review(refactoring, db, ai_service, language, example)
+        elif not revised:
+            await _run_stages(refactoring, db, ai_service, language, example)
+    
+    await asyncio.to_thread(_complete, db, refactoring, decisions)
+    logger.info(f"Successfully completed refactoring for ID: {refactoring_id}")
+
+def _prepare(
+    db: Session, refactoring_id: UUID, ai_service
+) -> Optional[Tuple[CodeRefactoring, str, Optional[FewShotExample]]]:
+    """
+    Load a refactoring and everything the model stages read from the database.
+
+    Returns:
+        The refactoring, its language and its worked example, or None if there
+        is nothing left to do (missing, or completed from a duplicate)
+    """
+    refactoring = db.query(CodeRefactoring).filter(CodeRefactoring.id == refactoring_id).first()
+    if not refactoring:
+        logger.error(f"Refactoring ID not found for job: {refactoring_id}")
+        return None
+    
+    logger.info(f"Processing refactoring for language: {refactoring.language}")
+    language = refactoring.language or ai_service.detect_language(refactoring.original_code)
+    
+    if settings.DEDUP_ENABLED and refactoring.fingerprint is None:
+        # Batch items are fingerprinted here rather than when they are bulk inserted
+        deduplicate(db, refactoring)
+        if refactoring.status == "completed":
+            notify_status(db, refactoring_id, "completed", refactoring.batch_id)
+            db.commit()
+            logger.info(f"Completed refactoring {refactoring_id} from a duplicate")
+            return None
+    example = few_shot_example(refactoring) if refactoring.reference_id else None
+    # Revisions read their parent's code; load it here rather than lazily on the event loop
+    if refactoring.parent_id is not None:
+        refactoring.parent
+    return refactoring, language, example
+
+def _complete(db: Session, refactoring: CodeRefactoring, decisions: List[RoutingDecision]) -> None:
+    record_routing(refactoring, decisions)
+    refactoring.status = "completed"
+    notify_status(db, refactoring.id, "completed", refactoring.batch_id)
+    db.commit()
+
+def record_routing(refactoring: CodeRefactoring, decisions: List[RoutingDecision]) -> None:
+    """Store the routing decisions of a refactoring and the model that produced its code."""
+    if not decisions:
+        return
+    refactoring.routing_decisions = json.dumps([decision._asdict() for decision in decisions])
+    code_decisions = [decision for decision in decisions if decision.operation in ("refactor", "review")]
+    if code_decisions:
+        refactoring.ai_model = code_decisions[-1].model
+
+def _save_stage(db: Session, refactoring: CodeRefactoring, stage: str, values: dict) -> None:
+    """Store the result of one stage and announce it, before the refactoring completes (blocking)."""
+    for name, value in values.items():
+        setattr(refactoring, name, value)
+    notify_status(db, refactoring.id, "processing", refactoring.batch_id, stage=stage)
+    db.commit()
+
+async def _run_review(
+    refactoring: CodeRefactoring, db: Session, ai_service, language: str, example: Optional[FewShotExample] = None
+) -> None:
+    if settings.STATIC_ANALYSIS_ENABLED:
+        # The deterministic analysis is stored first, while the model call runs, and kept
+        analysis = await asyncio.to_thread(analyze_code, refactoring.original_code, language)
+        await asyncio.to_thread(_save_stage, db, refactoring, "analysis", {"analysis_result": analysis})
+    # One model call returns the analysis, the refactoring and the suggestions
+    review = await ai_service.review_code(refactoring.original_code, language, refactoring.focus_areas, example)
+    if not settings.STATIC_ANALYSIS_ENABLED:
+        refactoring.analysis_result = review["analysis"]
+    refactoring.refactored_code = review["refactored_code"]
+    refactoring.explanation = review["explanation"]
+    refactoring.suggestions = json.dumps(review["suggestions"])
+
+async def _run_stages(
+    refactoring: CodeRefactoring, db: Session, ai_service, language: str, example: Optional[FewShotExample] = None
+) -> None:
+    # Saves run in a thread one at a time: the session must not be used concurrently
+    save_lock = asyncio.Lock()
+    
+    # Analysis and refactoring are independent, so run them concurrently and
+    # persist each result as soon as it arrives
+    async def run_analysis():
+        analysis_result = await ai_service.analyze_code_quality(refactoring.original_code, language)
+        async with save_lock:
+            await asyncio.to_thread(_save_stage, db, refactoring, "analysis", {"analysis_result": analysis_result})
+    
+    async def run_refactoring():
+        refactored_code, explanation = await ai_service.refactor_code(
+            refactoring.original_code, 
+            language,
+            refactoring.focus_areas,
+            example
+        )
+        async with save_lock:
+            await asyncio.to_thread(
+                _save_stage, db, refactoring, "refactoring", {"refactored_code": refactored_code, "explanation": explanation}
+            )
+    
+    results = await asyncio.gather(run_analysis(), run_refactoring(), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise errors[0]
@@ -0,0 +1,360 @@
+"""
+Tolerant parsing of JSON model responses.
+
+Models wrap JSON in markdown fences, add prose around it or stop mid-object
+when they run out of tokens. ``StreamingJSONParser`` scans the response once,
+as it streams in, for the first JSON object (optionally decoding one string
+field as it arrives, so clients see code rather than the JSON envelope); if the
+object never closes it is cut back to the last complete value and closed, and
+the top-level field that was being written is reported as incomplete. If that
+object is not valid JSON (a stray brace in leading prose), later braces are
+tried in turn. ``validate_response`` then checks each field against the API
+schemas so only the missing or invalid fields need to be requested again.
+"""
+import json
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.schemas.code_refactoring import CodeAnalysisResult, CodeSuggestion
+
+logger = logging.getLogger(__name__)
+
+# Top-level fields each JSON operation must return
+REQUIRED_FIELDS = {
+    "analyze": ["complexity_score", "readability_score", "issues", "overall_assessment"],
+    "refactor": ["refactored_code", "explanation"],
+    "suggest": ["suggestions"],
+    "review": ["analysis", "refactored_code", "explanation", "suggestions"],
+    "describe_issues": ["issues"],
+    "refactor_diff": ["patch", "explanation"],
+    "review_diff": ["analysis", "patch", "explanation", "suggestions"],
+}
+
+# Characters that end a number or a true/false/null literal
+SCALAR_TERMINATORS = ",}] \t\r\n"
+
+# Single-character JSON string escapes (\uXXXX is decoded separately)
+JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class ResponseParseError(ValueError):
+    """Raised when a model response lacks required fields even after repair."""
+
+    def __init__(self, operation: str, missing: List[str]):
+        self.operation = operation
+        self.missing = missing
+        super().__init__(f"{operation} response is missing or has invalid fields: {', '.join(missing)}")
+
+class ParsedResponse(NamedTuple):
+    value: Any              # validated fields (or the raw text for explanations)
+    missing: List[str]      # required fields that are absent, invalid or truncated
+
+class StreamingJSONParser:
+    """
+    Incremental scanner for the first JSON object in a model response.
+
+    ``feed`` processes each fragment once, so the cost over a whole stream is
+    linear in its length. Text before the opening brace (fences, prose) and
+    after the matching closing brace is ignored.
+
+    Args:
+        stream_field: Top-level string field whose decoded value ``feed``
+            returns as it arrives, e.g. ``refactored_code``
+    """
+
+    def __init__(self, stream_field: Optional[str] = None):
+        self._chunks: List[str] = []
+        self._position = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        # One [closer, expecting_key] entry per open container
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._in_scalar = False
+        self._key_chars: List[str] = []
+        self._last_key: Optional[str] = None
+        self._open_key: Optional[str] = None
+        # Longest prefix that can be closed into valid JSON, and the closers it needs
+        self._safe_end = 0
+        self._safe_closers = ""
+        self._stream_field = stream_field
+        self._streaming = False
+        self._decoded: List[str] = []
+        self._unicode: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        """Whether the root object has been closed."""
+        return self._end is not None
+
+    @property
+    def start(self) -> Optional[int]:
+        """Offset of the root object's opening brace, if one was seen."""
+        return self._start
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._chunks)
+
+    def feed(self, text: str) -> str:
+        """
+        Scan the next fragment of the response.
+
+        Returns:
+            The decoded text this fragment added to ``stream_field`` (empty if none)
+        """
+        self._chunks.append(text)
+        for offset, char in enumerate(text):
+            if self._end is not None:
+                break
+            self._scan(char, self._position + offset)
+        self._position += len(text)
+        decoded = "".join(self._decoded)
+        self._decoded = []
+        return decoded
+
+    def document(self) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Return the parsed object, repaired if the response was cut off.
+
+        Returns:
+            Tuple of (object or None if no object was found, name of the
+            top-level field whose value was cut off or None)
+        """
+        if self._start is None:
+            return None, None
+        text = "".join(self._chunks)
+        if self._end is not None:
+            return json.loads(text[self._start:self._end], strict=False), None
+        repaired = text[self._start:self._safe_end] + self._safe_closers
+        return json.loads(repaired, strict=False), self._open_key
+
+    def _scan(self, char: str, index: int) -> None:
+        if self._start is None:
+            if char == "{":
+                self._start = index
+                self._open(char, index)
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+                if self._streaming:
+                    self._decode_escape(char)
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._streaming = False
+                if self._string_is_key:
+                    if len(self._stack) == 1:
+                        self._last_key = "".join(self._key_chars)
+                    return
+                self._value_done(index + 1)
+                return
+            elif self._streaming:
+                self._decode_char(char)
+            if self._string_is_key and len(self._stack) == 1:
+                self._key_chars.append(char)
+            return
+
+        if self._in_scalar:
+            if char not in SCALAR_TERMINATORS:
+                return
+            self._in_scalar = False
+            self._value_done(index)
+
+        top = self._stack[-1]
+        if char == '"':
+            self._in_string = True
+            self._string_is_key = top[0] == "}" and top[1]
+            self._key_chars = []
+            self._streaming = (
+                self._stream_field is not None and not self._string_is_key
+                and len(self._stack) == 1 and self._open_key == self._stream_field
+            )
+        elif char in "{[":
+            self._open(char, index)
+        elif char in "}]":
+            self._stack.pop()
+            if not self._stack:
+                self._end = index + 1
+                return
+            self._value_done(index + 1)
+        elif char == ":":
+            top[1] = False
+            if len(self._stack) == 1:
+                self._open_key = self._last_key
+        elif char == ",":
+            top[1] = top[0] == "}"
+        elif not char.isspace():
+            self._in_scalar = True
+
+    def _decode_escape(self, char: str) -> None:
+        if char == "u":
+            self._unicode = ""
+        else:
+            self._decoded.append(JSON_ESCAPES.get(char, char))
+
+    def _decode_char(self, char: str) -> None:
+        if self._unicode is None:
+            self._decoded.append(char)
+            return
+        self._unicode += char
+        if len(self._unicode) < 4:
+            return
+        try:
+            code = int(self._unicode, 16)
+        except ValueError:
+            # Not valid JSON; the final document reports it
+            code = None
+        self._unicode = None
+        if code is None:
+            return
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._decoded.append(chr(code))
+
+    def _open(self, char: str, index: int) -> None:
+        self._stack.append(["}" if char == "{" else "]", char == "{"])
+        self._mark_safe(index + 1)
+
+    def _value_done(self, end: int) -> None:
+        self._mark_safe(end)
+        if len(self._stack) == 1:
+            self._open_key = None
+
+    def _mark_safe(self, end: int) -> None:
+        self._safe_end = end
+        self._safe_closers = "".join(entry[0] for entry in reversed(self._stack))
+
+def parse_json_response(operation: str, content: str) -> ParsedResponse:
+    """Extract, repair and validate the JSON object in a complete response."""
+    parser = StreamingJSONParser()
+    parser.feed(content)
+    return parse_streamed_response(operation, parser)
+
+def parse_streamed_response(operation: str, parser: StreamingJSONParser) -> ParsedResponse:
+    """Validate the object collected by a parser that has been fed a whole response."""
+    try:
+        data, incomplete_key = _document(parser)
+    except ValueError as e:
+        logger.warning(f"Unparseable {operation} response: {e}")
+        data, incomplete_key = None, None
+    return validate_response(operation, data or {}, incomplete_key)
+
+def _document(parser: StreamingJSONParser) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    The parser's document, or that of the first later brace that starts a valid object.
+
+    Prose before the JSON can contain a stray ``{`` (e.g. "the {x} placeholder"),
+    which the parser takes for the root object.
+
+    Raises:
+        ValueError: If no brace in the response starts a valid object
+    """
+    try:
+        return parser.document()
+    except ValueError as e:
+        error = e
+    text = parser.text
+    start = text.find("{", parser.start + 1)
+    while start != -1:
+        candidate = StreamingJSONParser()
+        candidate.feed(text[start:])
+        try:
+            return candidate.document()
+        except ValueError:
+            start = text.find("{", start + 1)
+    raise error
+
+def validate_response(operation: str, data: Dict[str, Any], incomplete_key: Optional[str] = None) -> ParsedResponse:
+    """
+    Validate each required field of a response against the API schemas.
+
+    Args:
+        operation: One of analyze, refactor, suggest or review
+        data: The (possibly partial) response object
+        incomplete_key: Top-level field that was cut off, treated as missing
+
+    Returns:
+        ParsedResponse with the valid fields and the names of the missing ones
+    """
+    value = {}
+    missing = []
+    if operation == "analyze":
+        analysis, invalid = _validate_analysis(data)
+        if not invalid:
+            value = analysis
+        else:
+            value = {field: data[field] for field in REQUIRED_FIELDS["analyze"] if field in data and field not in invalid}
+            missing = invalid
+    else:
+        for field in REQUIRED_FIELDS[operation]:
+            field_value = _validate_field(field, data.get(field))
+            if field_value is None:
+                missing.append(field)
+            else:
+                value[field] = field_value
+
+    if incomplete_key in REQUIRED_FIELDS[operation] and incomplete_key not in missing:
+        missing.append(incomplete_key)
+        value.pop(incomplete_key, None)
+    return ParsedResponse(value, missing)
+
+def merge_responses(operation: str, parsed: ParsedResponse, repair: ParsedResponse) -> ParsedResponse:
+    """Fill the missing fields of ``parsed`` with the valid fields of a follow-up response."""
+    value = dict(parsed.value)
+    value.update({field: repair.value[field] for field in parsed.missing if field in repair.value})
+    return validate_response(operation, value)
+
+def _validate_field(field: str, value: Any) -> Any:
+    """Return the validated value of a non-analysis field, or None if it is unusable."""
+    if field in ("refactored_code", "patch", "explanation"):
+        return value if isinstance(value, str) else None
+    if field == "analysis":
+        if not isinstance(value, dict):
+            return None
+        analysis, invalid = _validate_analysis(value)
+        return None if invalid else analysis
+    if field == "suggestions":
+        if not isinstance(value, list):
+            return None
+        suggestions = []
+        for suggestion in value:
+            try:
+                suggestions.append(CodeSuggestion(**suggestion).model_dump())
+            except (TypeError, ValidationError):
+                # One malformed suggestion is not worth another call
+                logger.warning(f"Dropping invalid suggestion: {suggestion}")
+        return suggestions
+    if field == "issues":
+        # Reworded static-analysis issues, matched back by index
+        if not isinstance(value, list):
+            return None
+        return [
+            issue for issue in value
+            if isinstance(issue, dict) and isinstance(issue.get("index"), int)
+            and isinstance(issue.get("description"), str) and isinstance(issue.get("suggestion"), str)
+        ]
+    return value
+
+def _validate_analysis(data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    try:
+        return CodeAnalysisResult(**data).model_dump(), []
+    except ValidationError as e:
+        invalid = []
+        for error in e.errors():
+            field = str(error["loc"][0]) if error["loc"] else ""
+            if field in REQUIRED_FIELDS["analyze"] and field not in invalid:
+                invalid.append(field)
+        return {}, invalid or list(REQUIRED_FIELDS["analyze"])
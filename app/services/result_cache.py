@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, UTC
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.code_refactoring import AIResultCache
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Two-tier, content-addressed cache for AI service results.
+
+    The first tier is an in-process LRU dictionary; the second is the
+    ``ai_result_cache`` table so results survive restarts and are shared
+    between workers. Both tiers honour a TTL and a maximum entry count.
+    """
+
+    # Persistent-tier eviction runs once every this many writes
+    PRUNE_INTERVAL = 100
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: int = 86400,
+        persistent: bool = True,
+        db_max_entries: int = 100000,
+        session_factory=SessionLocal
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.db_max_entries = db_max_entries
+        self.session_factory = session_factory
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls) -> Optional["ResultCache"]:
+        """Build a cache from application settings, or None if caching is disabled."""
+        if not settings.RESULT_CACHE_ENABLED:
+            return None
+        return cls(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+            persistent=settings.RESULT_CACHE_PERSISTENT,
+            db_max_entries=settings.RESULT_CACHE_DB_MAX_ENTRIES
+        )
+
+    @staticmethod
+    def normalize_code(code: str) -> str:
+        """Normalize line endings and trailing whitespace so cosmetic differences share a key."""
+        lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+    @classmethod
+    def make_key(
+        cls,
+        operation: str,
+        code: str,
+        language: Optional[str],
+        focus_areas: Optional[List[str]],
+        model: str,
+        prompt_version: str,
+        context: Optional[str] = None
+    ) -> str:
+        """
+        Build the cache key for a service call.
+
+        Args:
+            operation: Service operation name
+            code: The source code sent to the model
+            language: Programming language of the code
+            focus_areas: Optional refactoring focus areas (order-insensitive)
+            model: Model name used for the call
+            prompt_version: Version of the prompt template
+            context: Optional extra prompt context (e.g. the outline sent with a chunk)
+
+        Returns:
+            str: Hex SHA-256 digest identifying the request
+        """
+        payload = {
+            "operation": operation,
+            "code": cls.normalize_code(code),
+            "language": (language or "").strip().lower(),
+            "focus_areas": sorted({area.strip().lower() for area in focus_areas or []}),
+            "model": model,
+            "prompt_version": prompt_version
+        }
+        if context:
+            payload["context"] = context
+        encoded = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key``, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._get_persistent(key) if self.persistent else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.persistent_hits += 1
+        self._set_memory(key, value)
+        return value
+
+    def set(self, key: str, operation: str, model: str, value: Any) -> None:
+        """Store a JSON-serializable ``value`` in both tiers."""
+        self._set_memory(key, value)
+        if self.persistent:
+            self._set_persistent(key, operation, model, value)
+
+    def clear(self) -> None:
+        """Drop every in-process entry (the persistent tier is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters for both tiers."""
+        with self._lock:
+            return {
+                "memory_entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses
+            }
+
+    def _set_memory(self, key: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_persistent(self, key: str) -> Optional[Any]:
+        db = self.session_factory()
+        try:
+            now = datetime.now(UTC)
+            entry = db.query(AIResultCache).filter(
+                AIResultCache.key == key,
+                AIResultCache.expires_at > now
+            ).first()
+            if not entry:
+                return None
+            entry.hit_count += 1
+            entry.last_accessed_at = now
+            db.commit()
+            return json.loads(entry.result)
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            logger.warning(f"Persistent result cache lookup failed: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _set_persistent(self, key: str, operation: str, model: str, value: Any) -> None:
+        db = self.session_factory()
+        try:
+            now = datetime.now(UTC)
+            db.merge(AIResultCache(
+                key=key,
+                operation=operation,
+                model=model,
+                result=json.dumps(value),
+                hit_count=0,
+                created_at=now,
+                last_accessed_at=now,
+                expires_at=now + timedelta(seconds=self.ttl_seconds)
+            ))
+            db.commit()
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                self._prune_persistent(db)
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning(f"Persistent result cache write failed: {e}")
+        finally:
+            db.close()
+
+    def _prune_persistent(self, db) -> None:
+        """Delete expired rows, then the least recently used rows beyond the size limit."""
+        db.query(AIResultCache).filter(
+            AIResultCache.expires_at <= datetime.now(UTC)
+        ).delete(synchronize_session=False)
+        overflow = db.query(AIResultCache).count() - self.db_max_entries
+        if overflow > 0:
+            stale_keys = db.query(AIResultCache.key).order_by(
+                AIResultCache.last_accessed_at
+            ).limit(overflow).subquery()
+            db.query(AIResultCache).filter(
+                AIResultCache.key.in_(stale_keys.select())
+            ).delete(synchronize_session=False)
+        db.commit()
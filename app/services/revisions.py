@@ -0,0 +1,181 @@
+"""
+Incremental refactoring of resubmitted files.
+
+A revision is a refactoring submitted with the id of an earlier one. Both
+versions are split into top-level units (functions, classes, blocks); a unit
+whose text is unchanged since the parent keeps the parent's refactored output,
+and only runs of changed units are sent to the model. The refactored text of
+every unit is stored keyed by the hash of its original text, so the next
+revision can reuse it directly.
+
+When the parent's refactoring added units of its own (a new import block, an
+extracted helper) they belong to no original unit and stitching would drop
+them, leaving reused units referring to undefined names, so such revisions
+are refactored in full.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.models.code_refactoring import CodeRefactoring
+from app.services.chunking import Chunk, is_valid, join_chunks, split_into_chunks, stitch_results
+from app.services.deduplication import same_focus_areas
+from app.services.result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+def unit_key(text: str) -> str:
+    """Hash of a unit's text, insensitive to line endings and trailing whitespace."""
+    return hashlib.sha256(ResultCache.normalize_code(text).encode('utf-8')).hexdigest()
+
+def split_units(code: str, language: str) -> List[Chunk]:
+    """Split code into top-level units without merging small neighbours."""
+    return split_into_chunks(code, language, max_chars=1)
+
+def match_units(units: List[Chunk], refactored_code: str, language: str) -> Dict[str, str]:
+    """
+    Map original units to their refactored counterparts by kind and name.
+
+    Only named units whose name is unique in both versions are matched, plus
+    units the refactoring left untouched; other blocks and overloaded names
+    are left to the model.
+
+    Args:
+        units: Top-level units of the original code
+        refactored_code: The refactored version of the same code
+        language: Programming language of the code
+
+    Returns:
+        Dictionary of unit key to refactored unit text
+    """
+    refactored_units = split_units(refactored_code, language)
+    original_names = Counter((unit.kind, unit.name) for unit in units if unit.name)
+    refactored_names = Counter((unit.kind, unit.name) for unit in refactored_units if unit.name)
+    refactored_by_name = {(unit.kind, unit.name): unit.text for unit in refactored_units if unit.name}
+    unchanged = {unit_key(unit.text) for unit in refactored_units}
+
+    matched = {}
+    for unit in units:
+        key = unit_key(unit.text)
+        name = (unit.kind, unit.name)
+        if unit.name and original_names[name] == 1 and refactored_names[name] == 1:
+            matched[key] = refactored_by_name[name]
+        elif key in unchanged:
+            matched[key] = unit.text
+    return matched
+
+def prior_unit_outputs(parent: CodeRefactoring, language: str) -> Dict[str, str]:
+    """Refactored text of the parent's units, from its stored results or by matching names."""
+    if parent.unit_results:
+        try:
+            return json.loads(parent.unit_results)
+        except ValueError:
+            logger.warning(f"Ignoring unreadable unit results of refactoring {parent.id}")
+    return match_units(split_units(parent.original_code, language), parent.refactored_code, language)
+
+def added_units(prior: Dict[str, str], refactored_code: str, language: str) -> List[Chunk]:
+    """Units of the refactored code that are no original unit's output, such as helpers the model extracted."""
+    outputs = {unit_key(text) for text in prior.values()}
+    return [unit for unit in split_units(refactored_code, language) if unit_key(unit.text) not in outputs]
+
+def plan_revision(units: List[Chunk], prior: Dict[str, str]) -> List[Tuple[Chunk, Optional[str]]]:
+    """
+    Group units into segments to reuse or refactor.
+
+    Each unchanged unit is its own segment carrying its prior output; runs of
+    adjacent changed units are merged into one segment (output None) so they
+    are refactored together in a single model call.
+    """
+    segments: List[Tuple[Chunk, Optional[str]]] = []
+    for unit in units:
+        output = prior.get(unit_key(unit.text))
+        if output is None and segments and segments[-1][1] is None:
+            last = segments[-1][0]
+            merged = Chunk(
+                last.kind if last.kind == unit.kind else 'block',
+                ", ".join(filter(None, [last.name, unit.name])),
+                last.start_line,
+                unit.end_line,
+                join_chunks([last.text, unit.text])
+            )
+            segments[-1] = (merged, None)
+        else:
+            segments.append((unit, output))
+    return segments
+
+async def refactor_revision(refactoring: CodeRefactoring, ai_service, language: str) -> bool:
+    """
+    Refactor a revision by reusing its parent's output for unchanged units.
+
+    Applies when the parent completed in the same language and with the same
+    focus areas, every unit of its refactored code is the output of one of its
+    original units, and at least one unit is unchanged; otherwise the caller
+    refactors the whole file. Analysis
+    covers the whole revision and suggestions are not regenerated.
+
+    Args:
+        refactoring: A refactoring with ``parent_id`` set
+        ai_service: Async AI service used for the changed units and the analysis
+        language: Programming language of the revision
+
+    Returns:
+        True if the refactoring's results were set, False if it was not applicable
+    """
+    parent = refactoring.parent
+    if (
+        parent is None
+        or parent.status != "completed"
+        or parent.refactored_code is None
+        or (parent.language or "").lower() != language.lower()
+        or not same_focus_areas(parent.focus_areas, refactoring.focus_areas)
+    ):
+        return False
+
+    prior = prior_unit_outputs(parent, language)
+    added = added_units(prior, parent.refactored_code, language)
+    if added:
+        logger.info(
+            f"Refactoring {parent.id} added {len(added)} units with no original counterpart; "
+            f"revision {refactoring.id} is refactored in full"
+        )
+        return False
+
+    units = split_units(refactoring.original_code, language)
+    segments = plan_revision(units, prior)
+    reused = sum(1 for _, output in segments if output is not None)
+    if not reused:
+        return False
+
+    async def run_segment(segment: Chunk, output: Optional[str]) -> Tuple[str, str]:
+        if output is not None:
+            return output, f"unchanged since revision {parent.revision}; its refactoring was reused."
+        return await ai_service.refactor_code(segment.text, language, refactoring.focus_areas)
+
+    # Changed segments run concurrently, bounded by the service's own concurrency limit
+    results, analysis = await asyncio.gather(
+        asyncio.gather(*(run_segment(segment, output) for segment, output in segments)),
+        ai_service.analyze_code_quality(refactoring.original_code, language)
+    )
+    chunks = [segment for segment, _ in segments]
+    refactored_code, explanation = stitch_results(chunks, list(results), language)
+
+    unit_results: Dict[str, str] = {}
+    for segment, output in segments:
+        if output is not None:
+            unit_results[unit_key(segment.text)] = output
+    for (segment, output), (refactored, _) in zip(segments, results):
+        if output is None and is_valid(refactored, language):
+            unit_results.update(match_units(split_units(segment.text, language), refactored, language))
+
+    refactoring.refactored_code = refactored_code
+    refactoring.explanation = explanation
+    refactoring.analysis_result = analysis
+    refactoring.unit_results = json.dumps(unit_results)
+    logger.info(
+        f"Revision {refactoring.revision} of {refactoring.id} reused {reused} of {len(units)} units "
+        f"from {parent.id}"
+    )
+    return True
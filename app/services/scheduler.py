@@ -0,0 +1,188 @@
+"""
+Priority and fairness scheduling of model calls.
+
+Every model call runs under a ``Schedule``: a priority class (``interactive``
+before ``bulk``), the tenant it is made for and an optional deadline. The
+schedule of the current request or job is set with ``scheduling`` and read
+by the ``FairScheduler`` that hands out the process's model call slots:
+
+1. Lower priority classes are served first.
+2. Within a class, calls whose deadline is less than
+   SCHEDULER_DEADLINE_SLACK_SECONDS away go first, earliest deadline first.
+3. The rest are ordered by weighted fair queuing across tenants (start-time
+   fair queuing): each call gets a virtual finish time advanced by
+   ``1 / weight`` from its tenant's previous one, so a tenant with thousands
+   of queued calls does not delay a tenant with one.
+
+A tenant never holds more than SCHEDULER_TENANT_MAX_IN_FLIGHT slots. The job
+queue applies the same ordering and a per-tenant cap across workers when
+jobs are claimed (see ``job_queue.claim_job``).
+"""
+import asyncio
+import hashlib
+import itertools
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, UTC
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional
+
+from app.core.config import settings
+
+# Priority classes by rank; lower ranks are served first
+PRIORITY_CLASSES = {"interactive": 0, "bulk": 1}
+PRIORITY_NAMES = {rank: name for name, rank in PRIORITY_CLASSES.items()}
+
+# Tenant of requests made without an API key
+DEFAULT_TENANT = "anonymous"
+
+class Schedule(NamedTuple):
+    priority: str = "interactive"
+    tenant: str = DEFAULT_TENANT
+    deadline: Optional[datetime] = None  # naive UTC, like the stored timestamps
+
+_schedule: ContextVar[Schedule] = ContextVar("schedule", default=Schedule())
+
+@contextmanager
+def scheduling(
+    priority: str = "interactive", tenant: str = DEFAULT_TENANT, deadline: Optional[datetime] = None
+) -> Iterator[Schedule]:
+    """Schedule every model call made inside the block (including child tasks) as given."""
+    schedule = Schedule(priority, tenant, deadline)
+    token = _schedule.set(schedule)
+    try:
+        yield schedule
+    finally:
+        _schedule.reset(token)
+
+def current_schedule() -> Schedule:
+    return _schedule.get()
+
+def tenant_id(api_key: Optional[str]) -> str:
+    """Tenant of an API key; keys are hashed so they are never stored or logged."""
+    if not api_key:
+        return DEFAULT_TENANT
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+def tenant_weight(tenant: str) -> float:
+    """Fair-share weight of a tenant (SCHEDULER_TENANT_WEIGHTS, default 1)."""
+    return max(settings.SCHEDULER_TENANT_WEIGHTS.get(tenant, 1.0), 1e-6)
+
+def is_urgent(deadline: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    """Whether a deadline is close enough to jump ahead of fair-share ordering."""
+    if deadline is None:
+        return False
+    now = now or datetime.now(UTC).replace(tzinfo=None)
+    return deadline <= now + timedelta(seconds=settings.SCHEDULER_DEADLINE_SLACK_SECONDS)
+
+class _Waiter(NamedTuple):
+    key: tuple
+    tenant: str
+    start: float
+    future: asyncio.Future
+
+class FairScheduler:
+    """Grants a fixed number of concurrent slots in priority, deadline and fair-share order."""
+
+    def __init__(self, capacity: int, tenant_cap: int = 0):
+        self.capacity = capacity
+        self.tenant_cap = tenant_cap
+        self.in_use = 0
+        self.per_tenant: Counter = Counter()
+        # Start tag of the call granted last; new tenants start here, not at zero
+        self.virtual_time = 0.0
+        self._finish: Dict[str, float] = {}
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        """Number of calls waiting for a slot."""
+        return len(self._waiters)
+
+    def _eligible(self, tenant: str) -> bool:
+        return not self.tenant_cap or self.per_tenant[tenant] < self.tenant_cap
+
+    def _grant(self, tenant: str, start: float) -> None:
+        self.in_use += 1
+        self.per_tenant[tenant] += 1
+        self.virtual_time = max(self.virtual_time, start)
+
+    def _release(self, tenant: str) -> None:
+        self.in_use -= 1
+        self.per_tenant[tenant] -= 1
+        if not self.per_tenant[tenant]:
+            del self.per_tenant[tenant]
+        self._dispatch()
+        self._forget_idle_tenants()
+
+    def _forget_idle_tenants(self) -> None:
+        """
+        Drop the finish tags of tenants with nothing in flight or waiting.
+
+        Once a tag is at or below the virtual time the tenant would start from
+        the virtual time anyway, so its entry only costs memory. An idle
+        scheduler has no backlog to share fairly, so all tags are dropped.
+        """
+        if not self.in_use and not self._waiters:
+            self._finish.clear()
+            return
+        waiting = {waiter.tenant for waiter in self._waiters}
+        self._finish = {
+            tenant: finish for tenant, finish in self._finish.items()
+            if finish > self.virtual_time or tenant in self.per_tenant or tenant in waiting
+        }
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the best waiting calls whose tenant is under its cap."""
+        while self.in_use < self.capacity:
+            # Waiters cancelled since the last dispatch still sit in the list until their task resumes
+            self._waiters = [waiter for waiter in self._waiters if not waiter.future.done()]
+            eligible = [waiter for waiter in self._waiters if self._eligible(waiter.tenant)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda waiter: waiter.key)
+            self._waiters.remove(waiter)
+            self._grant(waiter.tenant, waiter.start)
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, schedule: Optional[Schedule] = None) -> AsyncIterator[None]:
+        """Hold one slot for the duration of the block, waiting for it in scheduling order."""
+        schedule = schedule or current_schedule()
+        tenant = schedule.tenant
+        start = max(self.virtual_time, self._finish.get(tenant, 0.0))
+        finish = start + 1.0 / tenant_weight(tenant)
+        self._finish[tenant] = finish
+
+        if self.in_use < self.capacity and self._eligible(tenant) and not self._waiters:
+            self._grant(tenant, start)
+        else:
+            deadline = schedule.deadline.timestamp() if is_urgent(schedule.deadline) else float("inf")
+            key = (PRIORITY_CLASSES.get(schedule.priority, 0), deadline, finish, next(self._sequence))
+            waiter = _Waiter(key, tenant, start, asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+            self._dispatch()
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Granted just as the caller was cancelled
+                    self._release(tenant)
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._forget_idle_tenants()
+                raise
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+# Process-wide scheduler of model calls, created on first use
+_scheduler: Optional[FairScheduler] = None
+
+def get_scheduler() -> FairScheduler:
+    """Return the scheduler bounding in-flight model calls in this process."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler(settings.OPENAI_MAX_CONCURRENCY, settings.SCHEDULER_TENANT_MAX_IN_FLIGHT)
+    return _scheduler
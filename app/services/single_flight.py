@@ -0,0 +1,53 @@
+"""
+In-process coalescing of identical concurrent calls.
+
+The first caller for a key starts the computation; callers arriving while it
+runs await the same task instead of starting their own, and all of them get
+its result (or its exception). The computation is shielded from the
+cancellation of any single caller, so a client disconnecting does not fail
+the others. Nothing is kept once the task finishes; caching finished results
+is the result cache's job.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+class SingleFlight:
+    """Registry of in-flight calls keyed by what they compute."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run ``call`` unless an identical call is already in flight.
+
+        Args:
+            key: Identity of the computation
+            call: Starts the computation; only invoked by the first caller
+
+        Returns:
+            Tuple of (result, shared) where ``shared`` is True for callers that
+            joined a computation started by another caller
+        """
+        future = self._calls.get(key)
+        shared = future is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future), shared
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            future.exception()
@@ -0,0 +1,443 @@
+"""
+Deterministic code-quality analysis without a model call.
+
+Measures cyclomatic complexity, length and nesting depth of every function and
+finds duplicated blocks of lines. Python is analyzed with ``ast``; brace
+languages with a token scan that tells function bodies from control blocks;
+other languages (and Python that does not parse) per top-level function, or
+per method of a top-level class, from the chunker, with nesting taken from
+indentation. ``analyze_code`` returns the
+fields of ``CodeAnalysisResult``.
+"""
+import ast
+import hashlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.chunking import BRACE_LANGUAGES, Chunk, split_into_chunks
+from app.services.fingerprinting import KEYWORDS, tokenize_code
+
+# Thresholds above which a metric is reported as an issue
+COMPLEXITY_THRESHOLD = 10
+FUNCTION_LENGTH_THRESHOLD = 50
+NESTING_THRESHOLD = 4
+MAX_LINE_LENGTH = 100
+
+# Smallest run of identical non-trivial lines reported as duplicated
+MIN_DUPLICATE_LINES = 6
+
+# Keywords that add a decision point (``else if`` is counted through its ``if``)
+BRANCH_KEYWORDS = {
+    'if', 'elif', 'elsif', 'for', 'foreach', 'while', 'until', 'unless', 'case', 'when',
+    'catch', 'except', 'rescue', 'guard'
+}
+
+# Keywords that open a control block rather than a function body
+CONTROL_KEYWORDS = BRANCH_KEYWORDS | {
+    'else', 'do', 'try', 'finally', 'switch', 'match', 'loop', 'select', 'defer',
+    'synchronized', 'using', 'lock', 'with', 'unsafe'
+}
+
+# Keywords that introduce a function declaration
+FUNCTION_KEYWORDS = {'def', 'fun', 'func', 'fn', 'function'}
+
+PYTHON_NESTING_NODES = tuple(
+    getattr(ast, name) for name in ('If', 'For', 'AsyncFor', 'While', 'With', 'AsyncWith', 'Try', 'TryStar', 'Match')
+    if hasattr(ast, name)
+)
+PYTHON_BRANCH_NODES = tuple(
+    getattr(ast, name) for name in ('If', 'For', 'AsyncFor', 'While', 'IfExp', 'ExceptHandler', 'match_case')
+    if hasattr(ast, name)
+)
+
+class FunctionMetrics(NamedTuple):
+    name: str
+    start_line: int    # 1-based, inclusive
+    end_line: int      # 1-based, inclusive
+    complexity: int    # McCabe cyclomatic complexity
+    nesting: int       # deepest nesting of control blocks in the body
+
+    @property
+    def length(self) -> int:
+        return self.end_line - self.start_line + 1
+
+class DuplicateBlock(NamedTuple):
+    first_line: int    # start of the earlier copy
+    second_line: int   # start of the later copy
+    length: int        # number of non-trivial lines repeated
+
+class StaticAnalysis(NamedTuple):
+    functions: List[FunctionMetrics]
+    duplicates: List[DuplicateBlock]
+    long_lines: List[int]
+    line_count: int
+    max_nesting: int
+
+def measure(code: str, language: str) -> StaticAnalysis:
+    """
+    Compute the raw metrics of a piece of code.
+
+    Args:
+        code: Source code to measure
+        language: Programming language of the code
+
+    Returns:
+        StaticAnalysis with per-function metrics, duplicated blocks and long lines
+    """
+    language = (language or '').lower()
+    measured = _python_functions(code) if language == 'python' else None
+    if measured is None and language in BRACE_LANGUAGES:
+        measured = _brace_functions(code, language)
+    if measured is None:
+        measured = _unit_functions(code, language)
+    functions, max_nesting = measured
+
+    lines = code.splitlines()
+    return StaticAnalysis(
+        functions=functions,
+        duplicates=find_duplicates(lines),
+        long_lines=[number for number, line in enumerate(lines, 1) if len(line) > MAX_LINE_LENGTH],
+        line_count=len(lines),
+        max_nesting=max_nesting
+    )
+
+def analyze_code(code: str, language: str) -> Dict[str, Any]:
+    """
+    Analyze code quality locally.
+
+    Args:
+        code: Source code to analyze
+        language: Programming language of the code
+
+    Returns:
+        Dict with the fields of CodeAnalysisResult
+    """
+    return to_analysis_result(measure(code, language))
+
+def to_analysis_result(analysis: StaticAnalysis) -> Dict[str, Any]:
+    """Turn raw metrics into scores, issues and an assessment."""
+    issues = []
+    for function in analysis.functions:
+        if function.complexity > COMPLEXITY_THRESHOLD:
+            issues.append(_issue(
+                "complexity", "high" if function.complexity > 2 * COMPLEXITY_THRESHOLD else "medium",
+                f"`{function.name}` has a cyclomatic complexity of {function.complexity} "
+                f"(threshold {COMPLEXITY_THRESHOLD}).",
+                [function.start_line],
+                "Split it into smaller functions or replace conditional chains with lookups or polymorphism."
+            ))
+        if function.length > FUNCTION_LENGTH_THRESHOLD:
+            issues.append(_issue(
+                "readability", "medium" if function.length > 2 * FUNCTION_LENGTH_THRESHOLD else "low",
+                f"`{function.name}` is {function.length} lines long (threshold {FUNCTION_LENGTH_THRESHOLD}).",
+                [function.start_line],
+                "Extract cohesive steps into well-named helper functions."
+            ))
+        if function.nesting >= NESTING_THRESHOLD:
+            issues.append(_issue(
+                "complexity", "high" if function.nesting > NESTING_THRESHOLD + 1 else "medium",
+                f"`{function.name}` nests control blocks {function.nesting} levels deep.",
+                [function.start_line],
+                "Use early returns or guard clauses, or extract the inner blocks into functions."
+            ))
+    for block in analysis.duplicates:
+        issues.append(_issue(
+            "best_practice", "medium",
+            f"{block.length} lines starting at line {block.first_line} are repeated at line {block.second_line}.",
+            [block.first_line, block.second_line],
+            "Extract the repeated code into a shared function."
+        ))
+    if analysis.long_lines:
+        issues.append(_issue(
+            "readability", "low",
+            f"{len(analysis.long_lines)} line(s) exceed {MAX_LINE_LENGTH} characters.",
+            analysis.long_lines,
+            "Wrap long lines or extract sub-expressions into named variables."
+        ))
+
+    worst_complexity = max((function.complexity for function in analysis.functions), default=1)
+    long_functions = sum(1 for function in analysis.functions if function.length > FUNCTION_LENGTH_THRESHOLD)
+    complexity_score = 1 + (worst_complexity - 1) // 3 + max(0, analysis.max_nesting - 2)
+    readability_score = (
+        10
+        - long_functions
+        - max(0, analysis.max_nesting - NESTING_THRESHOLD + 1)
+        - len(analysis.duplicates)
+        - min(2, len(analysis.long_lines) // 5 + (1 if analysis.long_lines else 0))
+    )
+    return {
+        "complexity_score": max(1, min(10, complexity_score)),
+        "readability_score": max(1, min(10, readability_score)),
+        "issues": issues,
+        "overall_assessment": (
+            f"{analysis.line_count} lines, {len(analysis.functions)} function(s) with a maximum cyclomatic "
+            f"complexity of {worst_complexity} and nesting depth of {analysis.max_nesting}; "
+            f"{len(issues)} issue(s) found."
+        )
+    }
+
+def _issue(issue_type: str, severity: str, description: str, line_numbers: List[int], suggestion: str) -> Dict[str, Any]:
+    return {
+        "type": issue_type,
+        "severity": severity,
+        "description": description,
+        "line_numbers": line_numbers,
+        "suggestion": suggestion
+    }
+
+def find_duplicates(lines: List[str], min_lines: int = MIN_DUPLICATE_LINES) -> List[DuplicateBlock]:
+    """
+    Find repeated runs of at least ``min_lines`` non-trivial lines.
+
+    Lines are compared after stripping whitespace; blank lines and lines made
+    only of brackets and punctuation are skipped, so they neither count towards
+    nor break a run.
+    """
+    significant = [
+        (number, line.strip()) for number, line in enumerate(lines, 1)
+        if any(char.isalnum() for char in line)
+    ]
+    first_seen: Dict[bytes, int] = {}
+    matches: List[Tuple[int, int]] = []
+    for index in range(len(significant) - min_lines + 1):
+        window = "\n".join(text for _, text in significant[index:index + min_lines])
+        digest = hashlib.blake2b(window.encode('utf-8'), digest_size=16).digest()
+        earlier = first_seen.setdefault(digest, index)
+        # Overlapping windows are a run of identical lines, not a copied block
+        if earlier != index and earlier + min_lines <= index:
+            matches.append((earlier, index))
+
+    duplicates = []
+    previous: Optional[Tuple[int, int]] = None
+    covered_until = -1
+    for earlier, later in matches:
+        if previous and earlier == previous[0] + 1 and later == previous[1] + 1:
+            # Consecutive matching windows extend the same block
+            block = duplicates[-1]
+            duplicates[-1] = block._replace(length=block.length + 1)
+        elif later <= covered_until:
+            # Already reported as part of another copy
+            continue
+        else:
+            duplicates.append(DuplicateBlock(significant[earlier][0], significant[later][0], min_lines))
+        previous = (earlier, later)
+        covered_until = later + min_lines - 1
+    return duplicates
+
+def _python_functions(code: str) -> Optional[Tuple[List[FunctionMetrics], int]]:
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    functions = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            complexity, nesting = _python_metrics(node)
+            functions.append(FunctionMetrics(node.name, node.lineno, node.end_lineno, complexity, nesting))
+    functions.sort(key=lambda function: function.start_line)
+    module_nesting = _python_metrics(tree)[1]
+    return functions, max([module_nesting] + [function.nesting for function in functions])
+
+def _python_metrics(root: ast.AST) -> Tuple[int, int]:
+    """Complexity and nesting of a function (or module), excluding nested functions and classes."""
+    complexity = 1
+    nesting = 0
+    stack = [(child, 0) for child in ast.iter_child_nodes(root)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if isinstance(node, PYTHON_BRANCH_NODES):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += 1 + len(node.ifs)
+
+        child_depth = depth
+        if isinstance(node, PYTHON_NESTING_NODES):
+            child_depth = depth + 1
+            nesting = max(nesting, child_depth)
+        for child in ast.iter_child_nodes(node):
+            # An elif is written at the depth of its if
+            is_elif = isinstance(node, ast.If) and node.orelse == [child] and isinstance(child, ast.If)
+            stack.append((child, depth if is_elif else child_depth))
+    return complexity, nesting
+
+def _is_branch(tokens: List[Tuple[str, str, int]], index: int) -> bool:
+    kind, text, _ = tokens[index]
+    if kind == 'name':
+        return text in BRANCH_KEYWORDS
+    if kind != 'op':
+        return False
+    previous = tokens[index - 1][1] if index > 0 else ''
+    if text in '&|':
+        # Count a && / || pair once, on its second character
+        return previous == text and (index < 2 or tokens[index - 2][1] != text)
+    if text != '?' or previous == '?' or index + 1 == len(tokens):
+        return False
+    # A ternary is followed by an operand; ?. ?? and nullable type markers are not
+    following_kind, following, _ = tokens[index + 1]
+    return following_kind in ('name', 'number', 'string') or following in ('(', '[', '!', '-')
+
+def _brace_functions(code: str, language: str) -> Optional[Tuple[List[FunctionMetrics], int]]:
+    tokens = tokenize_code(code, language)
+    functions = []
+    max_nesting = 0
+    # One [kind, name, start_line, complexity, nesting] entry per open brace
+    stack: List[list] = []
+    statement: List[Tuple[str, str, int]] = []
+    previous_statement: List[Tuple[str, str, int]] = []
+    parentheses = 0
+    for index, token in enumerate(tokens):
+        kind, text, line = token
+        if kind == 'newline':
+            # Lines end statements only outside parentheses (multi-line signatures and conditions)
+            if parentheses == 0 and statement:
+                previous_statement, statement = statement, []
+            continue
+        if kind == 'op' and text == '{':
+            # A brace on its own line belongs to the statement above it
+            block_kind, name = _classify_block(statement or previous_statement)
+            if block_kind == 'control':
+                depth = 1 + sum(1 for entry in _enclosing_blocks(stack) if entry[0] == 'control')
+                max_nesting = max(max_nesting, depth)
+                function = _innermost_function(stack)
+                if function is not None:
+                    function[4] = max(function[4], depth)
+            stack.append([block_kind, name, line, 1, 0])
+            statement, previous_statement = [], []
+            continue
+        if kind == 'op' and text == '}':
+            if not stack:
+                return None
+            entry = stack.pop()
+            if entry[0] == 'function':
+                functions.append(FunctionMetrics(entry[1], entry[2], line, entry[3], entry[4]))
+            statement, previous_statement = [], []
+            continue
+        if kind == 'op' and text == ';' and parentheses == 0:
+            statement, previous_statement = [], []
+            continue
+        if kind == 'op' and text in '()':
+            parentheses = max(0, parentheses + (1 if text == '(' else -1))
+        statement.append(token)
+        if _is_branch(tokens, index):
+            function = _innermost_function(stack)
+            if function is not None:
+                function[3] += 1
+    if stack:
+        return None
+    functions.sort(key=lambda function: function.start_line)
+    return functions, max_nesting
+
+def _enclosing_blocks(stack: List[list]) -> List[list]:
+    """Open blocks inside the innermost function (or all of them at top level)."""
+    for position in range(len(stack) - 1, -1, -1):
+        if stack[position][0] == 'function':
+            return stack[position + 1:]
+    return stack
+
+def _innermost_function(stack: List[list]) -> Optional[list]:
+    for entry in reversed(stack):
+        if entry[0] == 'function':
+            return entry
+    return None
+
+def _classify_block(statement: List[Tuple[str, str, int]]) -> Tuple[str, str]:
+    """Classify the statement before an opening brace as a control block, a function body or another block."""
+    texts = [text for _, text, _ in statement]
+    if not texts:
+        return 'other', ''
+    if statement[0][0] == 'name' and texts[0] in CONTROL_KEYWORDS:
+        return 'control', ''
+
+    arrow = any(texts[position:position + 2] == ['=', '>'] for position in range(len(texts) - 1))
+    if arrow:
+        # Arrow functions are named by the variable they are assigned to
+        for position in range(1, len(texts)):
+            if texts[position] == '=' and texts[position + 1] != '>' and statement[position - 1][0] == 'name':
+                return 'function', statement[position - 1][1]
+        return 'function', '<anonymous>'
+
+    keyword = any(text in FUNCTION_KEYWORDS for text in texts)
+    if not keyword:
+        # C-style signatures end with the parameter list, optionally followed by
+        # qualifiers such as `const` or `throws IOException`
+        if ')' not in texts:
+            return 'other', ''
+        tail = texts[len(texts) - 1 - texts[::-1].index(')') + 1:]
+        if any(not (text.isidentifier() or text in ('.', ',')) for text in tail):
+            return 'other', ''
+    followers = ('(', '<') if keyword else ('(',)
+    for position in range(len(statement) - 1):
+        kind, text, _ = statement[position]
+        if kind == 'name' and text not in KEYWORDS and texts[position + 1] in followers:
+            return 'function', text
+    return 'function', '<anonymous>'
+
+def _unit_functions(code: str, language: str) -> Tuple[List[FunctionMetrics], int]:
+    lines = code.splitlines()
+    tokens = tokenize_code(code, language)
+    functions = []
+    max_nesting = 0
+    for chunk in split_into_chunks(code, language, max_chars=1):
+        if chunk.kind == 'class':
+            # A class is not one long function; its methods are measured one by one
+            units = _member_functions(lines, tokens, chunk)
+        elif chunk.kind == 'function':
+            units = [(chunk.name, chunk.start_line, chunk.end_line)]
+        else:
+            max_nesting = max(max_nesting, _indent_nesting(lines[chunk.start_line - 1:chunk.end_line]))
+            continue
+        for name, start_line, end_line in units:
+            nesting = _indent_nesting(lines[start_line - 1:end_line])
+            max_nesting = max(max_nesting, nesting)
+            unit_tokens = [token for token in tokens if start_line <= token[2] <= end_line]
+            complexity = 1 + sum(1 for index in range(len(unit_tokens)) if _is_branch(unit_tokens, index))
+            functions.append(FunctionMetrics(name, start_line, end_line, complexity, nesting))
+    return functions, max_nesting
+
+def _member_functions(
+    lines: List[str], tokens: List[Tuple[str, str, int]], chunk: Chunk
+) -> List[Tuple[str, int, int]]:
+    """(name, start line, end line) of the outermost functions declared in a class unit."""
+    starts = {}
+    for index in range(len(tokens) - 1):
+        kind, text, line = tokens[index]
+        if kind != 'name' or text not in FUNCTION_KEYWORDS or not chunk.start_line < line <= chunk.end_line:
+            continue
+        name = tokens[index + 1][1]
+        # Ruby class methods: def self.name
+        if name == 'self' and index + 3 < len(tokens) and tokens[index + 2][1] == '.':
+            name = tokens[index + 3][1]
+        starts.setdefault(line, name)
+    if not starts:
+        return []
+
+    indents = {line: _indent(lines[line - 1]) for line in starts}
+    # Functions nested in a method belong to that method
+    outermost = sorted(line for line in starts if indents[line] == min(indents.values()))
+    members = []
+    for start_line, next_start in zip(outermost, outermost[1:] + [chunk.end_line + 1]):
+        end_line = next_start - 1
+        # Leave out trailing blank lines and the class's own closing line (e.g. Ruby's ``end``)
+        while end_line > start_line and (
+            not lines[end_line - 1].strip() or _indent(lines[end_line - 1]) < indents[start_line]
+        ):
+            end_line -= 1
+        members.append((starts[start_line], start_line, end_line))
+    return members
+
+def _indent(line: str) -> int:
+    expanded = line.expandtabs(4)
+    return len(expanded) - len(expanded.lstrip())
+
+def _indent_nesting(lines: List[str]) -> int:
+    """Indentation levels below a unit's body, as a proxy for nesting."""
+    widths = sorted({
+        len(line.expandtabs(4)) - len(line.expandtabs(4).lstrip())
+        for line in lines if line.strip()
+    })
+    # The unit's own line and its body are not nesting
+    return max(0, len(widths) - 2)
@@ -0,0 +1,287 @@
+"""
+Client-side traffic control for model calls.
+
+Every call goes through one process-wide ``TrafficController``. It does four things:
+
+* It paces calls with token buckets sized to the requests/min and tokens/min quotas.
+* It retries transient failures (429s, timeouts, 5xx) with jittered exponential
+  backoff, honouring ``Retry-After``.
+* For async calls, it can send a hedged duplicate when the first attempt is slow.
+* It opens a circuit breaker after repeated failures, so callers fail fast while
+  the endpoint recovers.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import openai
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ModelUnavailableError(Exception):
+    """Raised when the model endpoint cannot serve a call right now; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+class CircuitOpenError(ModelUnavailableError):
+    """Raised without calling the model while the circuit breaker is open."""
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``per_minute`` units per minute.
+
+    ``reserve`` always succeeds and returns how long the caller must wait, so
+    concurrent callers queue up fairly instead of polling.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` units, returning the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            # Requests larger than the bucket would never fit; let them through once it is full
+            self._available -= min(amount, self.capacity)
+            return 0.0 if self._available >= 0 else -self._available / self.rate
+
+    def try_take(self, amount: float) -> bool:
+        """Take ``amount`` units only if they are available right now."""
+        with self._lock:
+            self._refill()
+            if self._available < amount:
+                return False
+            self._available -= amount
+            return True
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive transient failures.
+
+    While open, calls are rejected for ``reset_seconds``; then a single trial
+    call is let through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go through.
+
+        Returns:
+            Whether the call is the half-open trial; its caller must record
+            an outcome or ``abandon_trial``
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining <= 0 and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            raise CircuitOpenError("Model endpoint circuit is open", max(remaining, 1.0))
+
+    def abandon_trial(self) -> None:
+        """Let another call make the trial after this one ended without an outcome (e.g. was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(f"Opening model circuit for {self.reset_seconds}s after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed call is worth retrying (rate limits, timeouts, connection and server errors)."""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the server's ``Retry-After`` hint from a failed call, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+class TrafficController:
+    """Rate limiting, retries, hedging and circuit breaking for model calls."""
+
+    def __init__(
+        self,
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 150000,
+        max_retries: int = 4,
+        retry_base_seconds: float = 1.0,
+        retry_max_seconds: float = 60.0,
+        hedge_after_seconds: float = 0.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+
+    @classmethod
+    def from_settings(cls) -> "TrafficController":
+        return cls(
+            requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            retry_base_seconds=settings.OPENAI_RETRY_BASE_SECONDS,
+            retry_max_seconds=settings.OPENAI_RETRY_MAX_SECONDS,
+            hedge_after_seconds=settings.OPENAI_HEDGE_AFTER_SECONDS,
+            failure_threshold=settings.OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+            reset_seconds=settings.OPENAI_CIRCUIT_RESET_SECONDS
+        )
+
+    def call(self, send: Callable[[], Any], tokens: int) -> Any:
+        """
+        Make a blocking call under rate limits, retries and the circuit breaker.
+
+        Args:
+            send: Performs the call
+            tokens: Tokens the call counts against the tokens/min quota
+
+        Raises:
+            ModelUnavailableError: If the circuit is open or retries are exhausted
+        """
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                time.sleep(self._pace(tokens))
+                result = send()
+            except Exception as e:
+                time.sleep(self._on_failure(e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                if trial:
+                    self.breaker.abandon_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, send: Callable[[], Awaitable[Any]], tokens: int, hedge: bool = True) -> Any:
+        """Async counterpart of ``call``; slow attempts may be hedged with a duplicate request."""
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                await asyncio.sleep(self._pace(tokens))
+                if hedge and self.hedge_after_seconds > 0:
+                    result = await self._hedged(send, tokens)
+                else:
+                    result = await send()
+            except Exception as e:
+                await asyncio.sleep(self._on_failure(e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (client gone, hedge lost): no outcome, so the trial must not stay taken
+                if trial:
+                    self.breaker.abandon_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _pace(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def _on_failure(self, error: Exception, attempt: int) -> float:
+        """Return the delay before retrying, or raise if the call should not be retried."""
+        if not is_transient(error):
+            # The endpoint answered, so this says nothing about its health
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        hint = retry_after_seconds(error)
+        if attempt >= self.max_retries:
+            raise ModelUnavailableError(
+                f"Model call failed after {attempt + 1} attempts: {error}", hint or self.retry_max_seconds
+            ) from error
+        # Full jitter keeps retrying clients from synchronizing
+        delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+        if hint is not None:
+            delay = max(delay, hint)
+        logger.warning(f"Transient model error (attempt {attempt + 1}), retrying in {delay:.1f}s: {error}")
+        return delay
+
+    async def _hedged(self, send: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        """Race a duplicate request against a slow first attempt, if quota allows."""
+        first = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after_seconds)
+        if done or not (self.requests.try_take(1) and self.tokens.try_take(tokens)):
+            return await first
+
+        pending = {first, asyncio.ensure_future(send())}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or not pending:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+_controller: Optional[TrafficController] = None
+
+def get_traffic_controller() -> TrafficController:
+    """Return the process-wide traffic controller shared by every service instance."""
+    global _controller
+    if _controller is None:
+        _controller = TrafficController.from_settings()
+    return _controller
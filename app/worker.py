@@ -0,0 +1,140 @@
+"""
+Refactoring worker entry point.
+
+Claims jobs from the durable queue and runs up to N of them concurrently,
+each with its own database session:
+
+    python -m app.worker --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Optional, Tuple
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import job_queue
+from app.services.backends import get_ai_service
+from app.services.prompt_builder import PromptTooLargeError
+from app.services.traffic import CircuitOpenError
+from app.services.refactoring_pipeline import process_refactoring
+from app.services.scheduler import PRIORITY_CLASSES, PRIORITY_NAMES, Schedule, scheduling
+
+logger = logging.getLogger(__name__)
+
+class Worker:
+    """Pool of concurrent job slots pulling from the refactoring job queue."""
+
+    def __init__(self, ai_service, concurrency: int = None, poll_interval: float = None):
+        self.ai_service = ai_service
+        self.concurrency = concurrency or settings.WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.WORKER_POLL_INTERVAL_SECONDS
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Run every slot until ``stop_event`` is set; in-flight jobs are allowed to finish."""
+        logger.info(f"Worker {self.worker_id} starting with {self.concurrency} slots")
+        # The first slots only take interactive jobs, so a bulk backlog never occupies every slot
+        reserved = min(settings.SCHEDULER_INTERACTIVE_WORKER_SLOTS, self.concurrency - 1)
+        await asyncio.gather(*(
+            self._run_slot(
+                f"{self.worker_id}-{slot}", stop_event, PRIORITY_CLASSES["interactive"] if slot < reserved else None
+            )
+            for slot in range(self.concurrency)
+        ))
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    async def _run_slot(self, slot_id: str, stop_event: asyncio.Event, max_priority: Optional[int] = None) -> None:
+        while not stop_event.is_set():
+            try:
+                claimed = await asyncio.to_thread(self._claim, slot_id, max_priority)
+            except Exception as e:
+                logger.error(f"Slot {slot_id} failed to claim a job: {e}")
+                claimed = None
+
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_job(slot_id, *claimed)
+
+    async def _run_job(self, slot_id: str, job_id: UUID, refactoring_id: UUID, schedule: Schedule) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(slot_id, job_id))
+        db = SessionLocal()
+        try:
+            # Model calls of the job wait for process slots in the job's priority and tenant
+            with scheduling(*schedule):
+                await process_refactoring(refactoring_id, db, self.ai_service)
+        except CircuitOpenError as e:
+            db.rollback()
+            await asyncio.to_thread(self._finish, job_queue.defer_job, job_id, slot_id, e.retry_after, str(e))
+        except Exception as e:
+            logger.error(f"Job {job_id} for refactoring {refactoring_id} failed: {e}", exc_info=True)
+            db.rollback()
+            # Oversized inputs fail the same way on every attempt, so don't retry them
+            retryable = not isinstance(e, PromptTooLargeError)
+            await asyncio.to_thread(self._finish, job_queue.fail_job, job_id, slot_id, str(e), retryable)
+        else:
+            await asyncio.to_thread(self._finish, job_queue.complete_job, job_id, slot_id)
+        finally:
+            heartbeat.cancel()
+            db.close()
+
+    async def _heartbeat(self, slot_id: str, job_id: UUID) -> None:
+        """Keep extending the job lease so long-running jobs are not reclaimed."""
+        interval = settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await asyncio.to_thread(self._finish, job_queue.extend_lease, job_id, slot_id):
+                    logger.warning(f"Slot {slot_id} lost the lease on job {job_id}")
+                    return
+            except Exception as e:
+                logger.error(f"Failed to extend lease on job {job_id}: {e}")
+
+    @staticmethod
+    def _claim(slot_id: str, max_priority: Optional[int] = None) -> Optional[Tuple[UUID, UUID, Schedule]]:
+        db = SessionLocal()
+        try:
+            job = job_queue.claim_job(db, slot_id, max_priority)
+            if job is None:
+                return None
+            return job.id, job.refactoring_id, Schedule(PRIORITY_NAMES.get(job.priority, "bulk"), job.tenant, job.deadline)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _finish(operation, *args):
+        db = SessionLocal()
+        try:
+            return operation(db, *args)
+        finally:
+            db.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run refactoring queue workers.")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY,
+                        help="Number of jobs processed concurrently")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        worker = Worker(get_ai_service(), concurrency=args.concurrency)
+        await worker.run(stop_event)
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import pytest
 import httpx
 import time
 import asyncio
+import json
 
 BASE_URL = "http://127.0.0.1:8000/api/refactoring"
 
@@ -72,4 +73,53 @@ async def test_get_nonexistent_refactoring():
         non_existent_id = "00000000-0000-0000-0000-000000000000"
         response = await client.get(f"{BASE_URL}/{non_existent_id}")
         assert response.status_code == 404
-        assert response.json()["detail"] == "Refactoring not found" 
\ No newline at end of file
+        assert response.json()["detail"] == "Refactoring not found" 
+
+@pytest.mark.asyncio
+async def test_create_and_track_batch():
+    """Submit several snippets in one batch and poll aggregate progress."""
+    async with httpx.AsyncClient() as client:
+        batch_payload = {
+            "items": [{"original_code": SAMPLE_PYTHON_CODE, "language": "python"} for _ in range(3)]
+        }
+        response = await client.post(BASE_URL + "/batch", json=batch_payload)
+
+        assert response.status_code == 200
+        batch_id = response.json()["id"]
+        assert response.json()["total"] == 3
+
+        start_time = time.time()
+        timeout = 60
+
+        while time.time() - start_time < timeout:
+            status_response = await client.get(f"{BASE_URL}/batch/{batch_id}")
+            assert status_response.status_code == 200
+            status_data = status_response.json()
+
+            assert status_data["failed"] == 0
+            if status_data["completed"] == 3:
+                break
+
+            await asyncio.sleep(2)
+        else:
+            pytest.fail("Batch processing timed out.")
+
+        assert status_data["processing"] == 0
+
+@pytest.mark.asyncio
+async def test_refactoring_status_events():
+    """Subscribe to pushed status events instead of polling."""
+    async with httpx.AsyncClient(timeout=60) as client:
+        response = await client.post(BASE_URL + "/", json={"original_code": SAMPLE_PYTHON_CODE, "language": "python"})
+        assert response.status_code == 200
+        refactoring_id = response.json()["id"]
+
+        statuses = []
+        async with client.stream("GET", f"{BASE_URL}/{refactoring_id}/events") as events:
+            assert events.headers["content-type"].startswith("text/event-stream")
+            async for line in events.aiter_lines():
+                if line.startswith("data: "):
+                    statuses.append(json.loads(line[len("data: "):])["status"])
+
+        assert statuses[0] in ("processing", "completed")
+        assert statuses[-1] == "completed"
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.routes import code_refactoring as routes
+from app.schemas.code_refactoring import CodeAnalysisResult, CodeSuggestion
+from app.services import prompt_builder
+from app.services.backends import available_backends, create_backend
+
+SAMPLE_PYTHON_CODE = """
+def inefficient_sum(numbers):   
+    s = 0
+    for n in numbers:
+        s += n
+    return s
+"""
+
+def test_registry_lists_backends_and_rejects_unknown_names():
+    assert {"openai", "openai_compatible", "deterministic", "mock"} <= set(available_backends())
+    with pytest.raises(ValueError):
+        create_backend("nonexistent")
+
+def test_deterministic_backend_is_repeatable_and_schema_valid():
+    """Identical input gives identical output that matches the API schemas."""
+    backend = create_backend("deterministic")
+    first = asyncio.run(backend.review_code(SAMPLE_PYTHON_CODE, "python"))
+    second = asyncio.run(backend.review_code(SAMPLE_PYTHON_CODE, "python"))
+
+    assert first == second
+    CodeAnalysisResult(**first["analysis"])
+    assert [CodeSuggestion(**suggestion).category for suggestion in first["suggestions"]] == ["best_practice"]
+    assert first["refactored_code"].startswith("def inefficient_sum(numbers):\n")
+    assert "inefficient_sum" in asyncio.run(backend.explain_code(SAMPLE_PYTHON_CODE, "python"))
+
+def test_estimates_are_sized_for_the_active_backend_model(monkeypatch):
+    """A self-hosted model's context window bounds the estimate, without changing the shared table."""
+    monkeypatch.setattr(settings, "AI_BACKEND_BASE_URL", "http://localhost:8000/v1")
+    monkeypatch.setattr(settings, "AI_BACKEND_MODEL", "local-coder")
+    monkeypatch.setattr(settings, "AI_BACKEND_CONTEXT_WINDOW", 4096)
+    windows = dict(prompt_builder.MODEL_CONTEXT_WINDOWS)
+    backend = create_backend("openai_compatible")
+    monkeypatch.setattr(routes, "ai_service", backend)
+
+    estimate = asyncio.run(routes.estimate_tokens(SAMPLE_PYTHON_CODE, "refactor", "python"))
+    assert (estimate.model, estimate.context_window) == ("local-coder", 4096)
+    assert backend.estimate_tokens("refactor", SAMPLE_PYTHON_CODE, "python").context_window == 4096
+    assert prompt_builder.MODEL_CONTEXT_WINDOWS == windows
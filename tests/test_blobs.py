@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+from app.models.code_refactoring import CodeBlob, CodeRefactoring, _store_pending_blobs
+from app.services import blobs
+from app.services.blobs import BlobCodecError, blob_hash, decode_blob, encode_blob
+
+CODE = "".join(f"def handler_{i}(request):\n    return respond(request, status={i})\n\n" for i in range(40))
+
+class RecordingSession:
+    """Stands in for a flushing session, recording the blob inserts."""
+
+    def __init__(self, *instances):
+        self.new = list(instances)
+        self.dirty = []
+        self.executed = []
+
+    def execute(self, statement, rows):
+        self.executed.append((statement, rows))
+
+@pytest.mark.parametrize("codec", ["zstd", "zlib", "none"])
+def test_blobs_round_trip_with_every_codec(monkeypatch, codec):
+    """Every codec decodes back to the exact text; small texts are never compressed."""
+    monkeypatch.setattr(settings, "BLOB_COMPRESSION", codec)
+    blob = encode_blob(CODE)
+    assert blob.hash == blob_hash(CODE)
+    assert blob.size == len(CODE.encode('utf-8'))
+    assert decode_blob(blob.codec, memoryview(blob.data)) == CODE
+    if codec != "none":
+        assert len(blob.data) < blob.size / 4
+    assert encode_blob("x = 1\n").codec == "none"
+
+def test_zstd_falls_back_to_zlib_without_the_package(monkeypatch):
+    """Blobs stay writable without zstandard; reading a zstd blob then fails loudly."""
+    monkeypatch.setattr(settings, "BLOB_COMPRESSION", "zstd")
+    monkeypatch.setattr(blobs, "zstandard", None)
+    blob = encode_blob(CODE)
+    assert blob.codec == "zlib"
+    with pytest.raises(BlobCodecError):
+        decode_blob("zstd", blob.data)
+
+def test_identical_code_is_stored_once():
+    """Refactorings reference blobs by hash and a flush inserts each distinct text once."""
+    first = CodeRefactoring(original_code=CODE, status="processing")
+    second = CodeRefactoring(original_code=CODE, status="processing")
+    second.refactored_code = "respond = print\n"
+    assert first.original_hash == second.original_hash == blob_hash(CODE)
+    assert first.original_code == CODE
+    assert second.refactored_code == "respond = print\n"
+
+    session = RecordingSession(first, second)
+    _store_pending_blobs(session, None, None)
+    (statement, rows), = session.executed
+    assert "ON CONFLICT (hash) DO NOTHING" in str(statement.compile(dialect=postgresql.dialect()))
+    assert sorted(row["hash"] for row in rows) == sorted({blob_hash(CODE), blob_hash("respond = print\n")})
+
+    # Already stored blobs are not inserted again on the next flush
+    session.executed = []
+    _store_pending_blobs(session, None, None)
+    assert session.executed == []
+
+def test_stored_code_is_read_from_the_blob():
+    """Loaded rows decompress their blob on first access."""
+    blob = encode_blob(CODE)
+    refactoring = CodeRefactoring(original_hash=blob.hash, status="completed")
+    refactoring.original_blob = CodeBlob(**blob._asdict())
+    assert refactoring.original_code == CODE
+    assert refactoring.refactored_code is None
@@ -0,0 +1,92 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.async_ai_refactoring import AsyncAIRefactoringService
+from app.services.chunking import Chunk, is_valid, join_chunks, outline, split_into_chunks, stitch_results
+
+PYTHON_MODULE = '''import os
+
+LIMIT = 10
+
+# Sums numbers
+def total(numbers):
+    return sum(numbers)
+
+@staticmethod
+def helper():
+    return os.getcwd()
+
+class Store:
+    def get(self, key):
+        return key
+'''
+
+JAVASCRIPT_MODULE = '''import fs from 'fs';
+
+function read(path) {
+  return fs.readFileSync(path, "}");
+}
+
+class Reader {
+  open() { return true; }
+}
+'''
+
+def test_python_chunks_follow_top_level_units():
+    """Python is split on top-level definitions and reassembles exactly."""
+    chunks = split_into_chunks(PYTHON_MODULE, 'python', max_chars=1)
+    assert [(chunk.kind, chunk.name) for chunk in chunks] == [
+        ('block', ''), ('block', ''), ('function', 'total'), ('function', 'helper'), ('class', 'Store')
+    ]
+    assert chunks[2].text.startswith("# Sums numbers")
+    assert join_chunks([chunk.text for chunk in chunks]) == PYTHON_MODULE
+
+def test_small_units_are_merged_up_to_limit():
+    """Adjacent units are merged while they fit the size limit."""
+    assert len(split_into_chunks(PYTHON_MODULE, 'python', max_chars=10000)) == 1
+
+def test_brace_language_chunks_ignore_braces_in_strings():
+    """Brace languages split where depth returns to zero, ignoring braces in strings."""
+    chunks = split_into_chunks(JAVASCRIPT_MODULE, 'javascript', max_chars=1)
+    assert [chunk.name for chunk in chunks] == ['', 'read', 'Reader']
+    assert join_chunks([chunk.text for chunk in chunks]) == JAVASCRIPT_MODULE
+    assert is_valid(JAVASCRIPT_MODULE, 'javascript')
+    assert not is_valid(JAVASCRIPT_MODULE + "}", 'javascript')
+
+def test_outline_lists_imports_and_signatures():
+    """The shared outline names imports and every unit."""
+    chunks = split_into_chunks(PYTHON_MODULE, 'python', max_chars=1)
+    assert outline(chunks, 'python') == "import os\ndef total(numbers):\ndef helper():\nclass Store:"
+
+def test_stitch_keeps_original_for_unparseable_chunk():
+    """A chunk whose refactored output does not parse keeps its original text."""
+    chunks = split_into_chunks(PYTHON_MODULE, 'python', max_chars=1)
+    results = [(chunk.text, "unchanged") for chunk in chunks]
+    results[2] = ("def total(numbers:\n", "broken")
+    results[4] = ("class Store:\n    def get(self, key):\n        return key.strip()\n", "strip keys")
+
+    code, explanation = stitch_results(chunks, results, 'python')
+    assert "def total(numbers):" in code
+    assert "return key.strip()" in code
+    assert is_valid(code, 'python')
+    assert "total: left unchanged" in explanation
+
+def test_async_chunks_run_at_most_chunk_max_parallel_at_a_time(monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_MAX_PARALLEL", 2)
+    service = AsyncAIRefactoringService()
+    running = []
+    peak = []
+
+    async def execute_code(operation, code, language, focus_areas, context):
+        running.append(code)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(code)
+        return {"refactored_code": code, "explanation": ""}
+
+    monkeypatch.setattr(service, "_execute_code", execute_code)
+    chunks = [Chunk("function", f"f{i}", i + 1, i + 1, f"def f{i}(): pass\n") for i in range(6)]
+    results = asyncio.run(service._execute_chunks("refactor", chunks, "python", [], ""))
+
+    assert max(peak) == 2
+    assert [result["refactored_code"] for result in results] == [chunk.text for chunk in chunks]
@@ -0,0 +1,95 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.models.code_refactoring import CodeRefactoring
+from app.services.ai_refactoring import AIRefactoringService
+from app.services.diffs import PatchError, apply_patch, unified_diff
+from app.services.result_cache import ResultCache
+
+ORIGINAL_CODE = "".join(f"def scale_{i}(value):\n    return value * {i}\n\n\n" for i in range(12))
+
+def test_unified_diff_round_trips():
+    """Applying a generated diff reproduces the refactored code, final newline included."""
+    refactored = ORIGINAL_CODE.replace("value * 3", "3 * value").rstrip("\n")
+    diff = unified_diff(ORIGINAL_CODE, refactored)
+
+    assert diff.startswith("--- original\n+++ refactored\n@@ ")
+    assert apply_patch(ORIGINAL_CODE, diff) == refactored
+    assert apply_patch(ORIGINAL_CODE, unified_diff(ORIGINAL_CODE, ORIGINAL_CODE)) == ORIGINAL_CODE
+
+def test_model_patches_are_located_by_context():
+    """Fences, wrong or missing line numbers and unindented blank lines are tolerated."""
+    patch = (
+        "```diff\n"
+        "@@ -1,4 +1,4 @@\n"
+        " def scale_5(value):\n"
+        "-    return value * 5\n"
+        "+    return 5 * value\n"
+        "\n"
+        "@@ ... @@\n"
+        " def scale_9(value):\n"
+        "-    return value * 9\n"
+        "+    return 9 * value\n"
+        "```\n"
+    )
+    patched = apply_patch(ORIGINAL_CODE, patch)
+    assert patched == ORIGINAL_CODE.replace("value * 5", "5 * value").replace("value * 9", "9 * value")
+
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL_CODE, "@@ -1 +1 @@\n-def missing(value):\n+def found(value):\n")
+
+def test_refactored_code_is_stored_as_a_diff_when_smaller():
+    """Small edits keep only a diff; rewrites keep the full text."""
+    refactoring = CodeRefactoring(original_code=ORIGINAL_CODE)
+    refactoring.refactored_code = ORIGINAL_CODE.replace("value * 7", "7 * value")
+    assert refactoring.refactored_hash is None
+    assert len(refactoring.refactored_patch) < len(ORIGINAL_CODE) / 2
+    assert refactoring.refactored_code == ORIGINAL_CODE.replace("value * 7", "7 * value")
+
+    refactoring.refactored_code = "scale = lambda value, factor: value * factor\n"
+    assert refactoring.refactored_patch is None
+    assert refactoring.refactored_code == "scale = lambda value, factor: value * factor\n"
+
+class PatchCompletions:
+    def __init__(self, patch):
+        self.patch = patch
+        self.calls = []
+
+    def create(self, **request):
+        self.calls.append(request)
+        if "unified diff" in request["messages"][-1]["content"]:
+            content = {"patch": self.patch, "explanation": "Put the factor first."}
+        else:
+            content = {"refactored_code": ORIGINAL_CODE, "explanation": "Full rewrite."}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(content)))])
+
+def make_service(monkeypatch, patch) -> AIRefactoringService:
+    monkeypatch.setattr(settings, "AI_FUSED_MODE", False)
+    monkeypatch.setattr(settings, "AI_DIFF_MODE", True)
+    monkeypatch.setattr(settings, "AI_DIFF_MIN_LINES", 10)
+    monkeypatch.setattr(settings, "ROUTER_SMALL_MODEL", "")
+    service = AIRefactoringService()
+    service.cache = ResultCache(persistent=False)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=PatchCompletions(patch)))
+    return service
+
+def test_diff_mode_applies_the_model_patch(monkeypatch):
+    """The model answers with a patch, which is applied to the input."""
+    patch = "@@ -1,2 +1,2 @@\n def scale_0(value):\n-    return value * 0\n+    return 0\n"
+    service = make_service(monkeypatch, patch)
+
+    refactored_code, explanation = service.refactor_code(ORIGINAL_CODE, "python")
+    assert refactored_code == ORIGINAL_CODE.replace("return value * 0", "return 0")
+    assert explanation == "Put the factor first."
+    assert len(service.client.chat.completions.calls) == 1
+
+def test_unusable_patch_falls_back_to_full_code(monkeypatch):
+    """A patch that does not apply is replaced by a full-text refactoring call."""
+    service = make_service(monkeypatch, "@@ -1 +1 @@\n-def missing():\n+def found():\n")
+
+    refactored_code, explanation = service.refactor_code(ORIGINAL_CODE, "python")
+    assert explanation == "Full rewrite."
+    assert "unified diff" not in service.client.chat.completions.calls[-1]["messages"][-1]["content"]
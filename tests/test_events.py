@@ -0,0 +1,24 @@
+import asyncio
+import uuid
+
+from app.routes import code_refactoring as routes
+
+async def collect(events) -> list:
+    return [event async for event in events]
+
+def test_refactoring_events_recover_a_missed_notification(monkeypatch):
+    """A quiet interval re-reads the stored status, so a lost notification does not stall the stream."""
+    monkeypatch.setattr(routes, "SSE_KEEPALIVE_SECONDS", 0.01)
+    stored = iter(["processing", "completed"])
+
+    async def read_status(refactoring_id):
+        return next(stored)
+
+    monkeypatch.setattr(routes, "_read_status", read_status)
+    refactoring_id = uuid.uuid4()
+    queue = routes.broadcaster.subscribe(refactoring_id)
+
+    events = asyncio.run(asyncio.wait_for(collect(routes._refactoring_events(refactoring_id, "processing", queue)), 1))
+    assert events[1] == ": keep-alive\n\n"
+    assert events[-1].startswith("event: status\n") and '"status": "completed"' in events[-1]
+    assert len(events) == 3
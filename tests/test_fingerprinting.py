@@ -0,0 +1,114 @@
+import uuid
+
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+from app.models.code_refactoring import CodeFingerprint, CodeRefactoring
+from app.services.deduplication import find_duplicate
+from app.services.fingerprinting import fingerprint_code, similarity
+from app.services.prompt_builder import FewShotExample, build_request
+
+SAMPLE_PYTHON_CODE = """
+def inefficient_sum(numbers):
+    s = 0
+    for n in numbers:
+        s += n
+    return s
+
+def count_positive(values):
+    total = 0
+    for value in values:
+        if value > 0:
+            total += 1
+    return total
+"""
+
+def test_formatting_and_comments_do_not_change_the_exact_hash():
+    """Whitespace and comments are ignored, but Python indentation is not."""
+    reformatted = SAMPLE_PYTHON_CODE.replace("s += n", "s+=n  # accumulate").replace("\n\n", "\n\n\n")
+    reindented = SAMPLE_PYTHON_CODE.replace("    return s\n", "return s\n")
+
+    original = fingerprint_code(SAMPLE_PYTHON_CODE, "python")
+    assert fingerprint_code(reformatted, "python").exact_hash == original.exact_hash
+    assert fingerprint_code(reindented, "python").exact_hash != original.exact_hash
+
+def test_renamed_identifiers_share_the_canonical_form():
+    """Renaming identifiers keeps the canonical hash and a near-identical signature."""
+    renamed = SAMPLE_PYTHON_CODE.replace("numbers", "items").replace("total", "count")
+
+    original = fingerprint_code(SAMPLE_PYTHON_CODE, "python")
+    copy = fingerprint_code(renamed, "python")
+    assert copy.exact_hash != original.exact_hash
+    assert copy.canonical_hash == original.canonical_hash
+    assert similarity(copy.signature, original.signature) == 1.0
+    assert set(copy.bands) & set(original.bands)
+
+def test_similar_code_scores_above_unrelated_code():
+    """An edited copy is far more similar than unrelated code in another style."""
+    edited = SAMPLE_PYTHON_CODE.replace("if value > 0:", "if value >= 0 and value != 7:")
+    unrelated = "class Config:\n    def __init__(self, path):\n        self.path = path\n        self.data = {}\n"
+
+    original = fingerprint_code(SAMPLE_PYTHON_CODE, "python")
+    assert similarity(fingerprint_code(edited, "python").signature, original.signature) > 0.5
+    assert similarity(fingerprint_code(unrelated, "python").signature, original.signature) < 0.3
+
+def test_c_style_comments_are_stripped():
+    """Line and block comments are ignored for brace languages, but strings are kept."""
+    code = "function add(a, b) {\n  return a + b;\n}\n"
+    commented = "/* adds */ function add(a, b) { // sum\n  return a + b;\n}"
+
+    assert fingerprint_code(code, "javascript").exact_hash == fingerprint_code(commented, "javascript").exact_hash
+    assert fingerprint_code('x = "a // b";', "javascript").exact_hash != fingerprint_code('x = "a";', "javascript").exact_hash
+
+def test_few_shot_example_precedes_the_request():
+    """An example is sent as a prior exchange and dropped when it does not fit."""
+    example = FewShotExample(SAMPLE_PYTHON_CODE, "def inefficient_sum(numbers):\n    return sum(numbers)\n", "Used sum().")
+
+    request = build_request("gpt-4", "refactor", SAMPLE_PYTHON_CODE, "python", ["readability"], example=example)
+    assert [message["role"] for message in request["messages"]] == ["system", "user", "assistant", "user"]
+    assert "return sum(numbers)" in request["messages"][2]["content"]
+
+    large_example = example._replace(original_code=SAMPLE_PYTHON_CODE * 150)
+    request = build_request("gpt-4", "refactor", SAMPLE_PYTHON_CODE, "python", ["readability"], example=large_example)
+    assert len(request["messages"]) == 2
+
+class CandidateQuery:
+    """Records the filters of the candidate query and returns no candidates."""
+
+    def __init__(self):
+        self.criteria = []
+
+    def join(self, *args):
+        return self
+
+    def filter(self, *criteria):
+        self.criteria.extend(criteria)
+        return self
+
+    def order_by(self, *columns):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def all(self):
+        return []
+
+    def sql(self):
+        return [str(criterion.compile(dialect=postgresql.dialect())) for criterion in self.criteria]
+
+def test_duplicates_are_only_looked_up_within_the_tenant(monkeypatch):
+    """Another tenant's code and results are not reused or shown as examples unless allowed."""
+    refactoring = CodeRefactoring(id=uuid.uuid4(), original_code="x = 1", language="python", tenant="a")
+    fingerprint = fingerprint_code("x = 1", "python")
+    row = CodeFingerprint(language="python", exact_hash=fingerprint.exact_hash, bands=fingerprint.bands)
+
+    query = CandidateQuery()
+    assert find_duplicate(type("Session", (), {"query": lambda self, *entities: query})(), refactoring, row) is None
+    assert "code_refactorings.tenant = %(tenant_1)s" in query.sql()
+    assert "code_refactorings.refactored_hash IS NOT NULL OR code_refactorings.refactored_patch IS NOT NULL" in query.sql()
+
+    monkeypatch.setattr(settings, "DEDUP_ACROSS_TENANTS", True)
+    query = CandidateQuery()
+    find_duplicate(type("Session", (), {"query": lambda self, *entities: query})(), refactoring, row)
+    assert not any("tenant" in sql for sql in query.sql())
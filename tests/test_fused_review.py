@@ -0,0 +1,110 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.services import refactoring_pipeline
+from app.services.ai_refactoring import AIRefactoringService
+from app.services.result_cache import ResultCache
+
+SAMPLE_PYTHON_CODE = """
+def inefficient_sum(numbers):
+    s = 0
+    for n in numbers:
+        s += n
+    return s
+"""
+
+REVIEW_RESPONSE = {
+    "analysis": {
+        "complexity_score": 3,
+        "readability_score": 6,
+        "issues": [{"type": "readability", "severity": "low", "description": "Manual loop", "line_numbers": [3, 4]}],
+        "overall_assessment": "Works, but not idiomatic."
+    },
+    "suggestions": [{
+        "category": "best_practice",
+        "priority": "medium",
+        "title": "Use sum()",
+        "description": "Replace the loop with the built-in.",
+        "example": "return sum(numbers)",
+        "rationale": "Shorter and faster."
+    }],
+    "refactored_code": "def efficient_sum(numbers):\n    return sum(numbers)\n",
+    "explanation": "Replaced the loop with sum()."
+}
+
+class RecordingCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **request):
+        self.calls.append(request)
+        message = SimpleNamespace(content=json.dumps(REVIEW_RESPONSE))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def make_service() -> AIRefactoringService:
+    service = AIRefactoringService()
+    service.cache = ResultCache(persistent=False)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=RecordingCompletions()))
+    return service
+
+def test_one_call_serves_analysis_refactoring_and_suggestions(monkeypatch):
+    """The worker's combined review returns analysis, refactoring and suggestions from one call."""
+    monkeypatch.setattr(settings, "STATIC_ANALYSIS_ENABLED", False)
+    service = make_service()
+
+    review = service.review_code(SAMPLE_PYTHON_CODE, "python")
+
+    assert len(service.client.chat.completions.calls) == 1
+    assert review["analysis"]["readability_score"] == 6
+    assert review["refactored_code"].startswith("def efficient_sum")
+    assert review["explanation"] == "Replaced the loop with sum()."
+    assert review["suggestions"][0]["title"] == "Use sum()"
+
+def test_single_purpose_calls_are_not_fused(monkeypatch):
+    """Asking only for suggestions does not pay for a full review, even in fused mode."""
+    monkeypatch.setattr(settings, "AI_FUSED_MODE", True)
+    service = make_service()
+
+    service.review_code(SAMPLE_PYTHON_CODE, "python")
+    service.suggest_improvements(SAMPLE_PYTHON_CODE, "python")
+
+    calls = service.client.chat.completions.calls
+    assert len(calls) == 2
+    assert calls[1]["messages"] != calls[0]["messages"]
+
+def test_invalid_review_falls_back_without_caching():
+    """A review that does not match the API schemas is rejected."""
+    service = make_service()
+    REVIEW_RESPONSE["analysis"]["complexity_score"] = 42
+    try:
+        review = service.review_code(SAMPLE_PYTHON_CODE, "python")
+    finally:
+        REVIEW_RESPONSE["analysis"]["complexity_score"] = 3
+
+    assert review["refactored_code"] == SAMPLE_PYTHON_CODE
+    assert review["suggestions"] == []
+    assert service.cache.stats()["memory_entries"] == 0
+
+def test_fused_review_keeps_the_static_analysis(monkeypatch):
+    """The local analysis is saved before the review call and is not replaced by the model's."""
+    monkeypatch.setattr(settings, "STATIC_ANALYSIS_ENABLED", True)
+    saved = []
+    monkeypatch.setattr(
+        refactoring_pipeline, "notify_status", lambda db, refactoring_id, status, batch_id, stage=None: saved.append(stage)
+    )
+    refactoring = SimpleNamespace(
+        id=None, batch_id=None, original_code=SAMPLE_PYTHON_CODE, focus_areas=None, analysis_result=None
+    )
+    db = SimpleNamespace(commit=lambda: None)
+
+    class ReviewService:
+        async def review_code(self, code, language, focus_areas, example):
+            assert saved == ["analysis"]
+            return REVIEW_RESPONSE
+
+    asyncio.run(refactoring_pipeline._run_review(refactoring, db, ReviewService(), "python"))
+
+    assert refactoring.analysis_result["overall_assessment"] != REVIEW_RESPONSE["analysis"]["overall_assessment"]
+    assert refactoring.refactored_code == REVIEW_RESPONSE["refactored_code"]
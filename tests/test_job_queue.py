@@ -0,0 +1,214 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app import worker as worker_module
+from app.core.config import settings
+from app.models.code_refactoring import CodeRefactoring, RefactoringJob
+from app.services import job_queue
+from app.services.prompt_builder import PromptTooLargeError
+from app.services.scheduler import Schedule
+from app.services.traffic import CircuitOpenError
+
+class FakeQuery:
+    """Builds the real statement of an ORM query and answers it from the fake session."""
+
+    def __init__(self, session, entity):
+        self.session = session
+        self.entity = entity
+        self.statement = select(entity)
+        self.criteria = []
+
+    def filter(self, *criteria):
+        self.criteria.extend(criteria)
+        self.statement = self.statement.where(*criteria)
+        return self
+
+    def order_by(self, *columns):
+        self.statement = self.statement.order_by(*columns)
+        return self
+
+    def with_for_update(self, **options):
+        self.statement = self.statement.with_for_update(**options)
+        return self
+
+    def _id(self):
+        for criterion in self.criteria:
+            if getattr(getattr(criterion, "left", None), "key", None) == "id":
+                return criterion.right.value
+        return None
+
+    def first(self):
+        self.session.queries.append(str(self.statement.compile(dialect=postgresql.dialect())))
+        row_id = self._id()
+        if self.entity is CodeRefactoring:
+            return self.session.refactorings.get(row_id)
+        if row_id is not None:
+            return next((job for job in self.session.jobs if job.id == row_id), None)
+        # Claim query: the runnable rows in the order the database would return them
+        return self.session.runnable.pop(0) if self.session.runnable else None
+
+    def all(self):
+        return []
+
+class FakeQueueSession:
+    """Session holding jobs and refactorings in memory; statements are compiled for Postgres and kept."""
+
+    def __init__(self, jobs=(), refactorings=(), runnable=None):
+        self.jobs = list(jobs)
+        self.refactorings = {refactoring.id: refactoring for refactoring in refactorings}
+        self.runnable = list(self.jobs if runnable is None else runnable)
+        self.queries = []
+        self.executed = []
+        self.commits = 0
+
+    def query(self, entity):
+        return FakeQuery(self, entity)
+
+    def execute(self, statement, params=None):
+        self.executed.append(str(statement))
+
+    def flush(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+def make_job(**fields) -> RefactoringJob:
+    values = dict(
+        id=uuid.uuid4(), refactoring_id=uuid.uuid4(), status="queued", attempts=0,
+        max_attempts=settings.JOB_MAX_ATTEMPTS, available_at=datetime.now(UTC), flight_key=None
+    )
+    values.update(fields)
+    return RefactoringJob(**values)
+
+def make_refactoring(job: RefactoringJob) -> CodeRefactoring:
+    return CodeRefactoring(id=job.refactoring_id, status="processing", batch_id=None)
+
+def test_claim_leases_the_first_runnable_job():
+    """The claimed job is marked running and leased to the worker for the visibility timeout."""
+    job = make_job()
+    db = FakeQueueSession([job])
+
+    assert job_queue.claim_job(db, "worker-1") is job
+    assert (job.status, job.attempts, job.locked_by) == ("running", 1, "worker-1")
+    lease = job.locked_until - datetime.now(UTC)
+    assert timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS - 5) < lease <= timedelta(
+        seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS
+    )
+    assert db.commits == 1
+
+def test_claim_query_skips_locked_rows_and_reclaims_expired_leases():
+    """Workers never block on each other's rows, and running jobs whose lease expired are runnable again."""
+    db = FakeQueueSession()
+    assert job_queue.claim_job(db, "worker-1", max_priority=0) is None
+
+    sql = db.queries[0]
+    assert sql.endswith("FOR UPDATE SKIP LOCKED")
+    assert "refactoring_jobs.status = %(status_1)s AND refactoring_jobs.available_at <= %(available_at_1)s" in sql
+    assert "refactoring_jobs.status = %(status_2)s AND refactoring_jobs.locked_until < %(locked_until_1)s" in sql
+    assert "refactoring_jobs.priority <= %(priority_1)s" in sql
+    order = sql[sql.index("ORDER BY"):]
+    assert order.index("refactoring_jobs.priority") < order.index("NULLS LAST") < order.index(
+        "refactoring_jobs.virtual_finish"
+    ) < order.index("refactoring_jobs.available_at")
+    assert db.commits == 1
+
+def test_claim_dead_letters_expired_jobs_out_of_attempts():
+    """A lease that expired on the final attempt fails the refactoring; the next runnable job is claimed."""
+    exhausted = make_job(status="running", attempts=3, max_attempts=3, locked_by="gone", last_error="Timed out")
+    fresh = make_job()
+    refactoring = make_refactoring(exhausted)
+    db = FakeQueueSession([exhausted, fresh], [refactoring])
+
+    assert job_queue.claim_job(db, "worker-1") is fresh
+    assert (exhausted.status, exhausted.locked_by) == ("dead", None)
+    assert refactoring.status == "failed"
+    assert refactoring.explanation == "Refactoring failed: Timed out"
+
+def test_failed_attempts_back_off_exponentially(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_SECONDS", 10)
+    job = make_job(status="running", attempts=2, max_attempts=3, locked_by="worker-1")
+    db = FakeQueueSession([job])
+
+    job_queue.fail_job(db, job.id, "worker-1", "Rate limited")
+    assert (job.status, job.attempts, job.locked_by, job.last_error) == ("queued", 2, None, "Rate limited")
+    delay = job.available_at - datetime.now(UTC)
+    assert timedelta(seconds=15) < delay <= timedelta(seconds=20)
+
+@pytest.mark.parametrize("attempts, retryable", [(3, True), (1, False)])
+def test_final_and_permanent_failures_dead_letter(attempts, retryable):
+    job = make_job(status="running", attempts=attempts, max_attempts=3, locked_by="worker-1")
+    refactoring = make_refactoring(job)
+    db = FakeQueueSession([job], [refactoring])
+
+    job_queue.fail_job(db, job.id, "worker-1", "Prompt too large", retryable)
+    assert job.status == "dead"
+    assert refactoring.status == "failed"
+    assert any("pg_notify" in statement for statement in db.executed)
+
+def test_deferred_jobs_keep_their_attempts():
+    """An outage requeues the job without using up an attempt."""
+    job = make_job(status="running", attempts=1, locked_by="worker-1")
+    db = FakeQueueSession([job])
+
+    job_queue.defer_job(db, job.id, "worker-1", 30, "Circuit open")
+    assert (job.status, job.attempts, job.locked_by) == ("queued", 0, None)
+    assert job.available_at - datetime.now(UTC) > timedelta(seconds=25)
+
+def test_workers_that_lost_the_lease_change_nothing():
+    """A job reclaimed by another worker is not completed or failed by the old one."""
+    job = make_job(status="running", attempts=1, locked_by="worker-2")
+    db = FakeQueueSession([job])
+
+    job_queue.fail_job(db, job.id, "worker-1", "boom")
+    job_queue.complete_job(db, job.id, "worker-1")
+    assert (job.status, job.locked_by, job.last_error) == ("running", "worker-2", None)
+
+class ClosingSession:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.mark.parametrize("error, operation, extra", [
+    (None, job_queue.complete_job, ()),
+    (CircuitOpenError("open", 12.0), job_queue.defer_job, (12.0, "open")),
+    (RuntimeError("boom"), job_queue.fail_job, ("boom", True)),
+    (PromptTooLargeError("refactor", 9000, 500, 8192), job_queue.fail_job, (
+        "refactor request needs 9000 input and at least 500 output tokens, but the model context window is 8192 tokens",
+        False
+    )),
+])
+def test_job_outcomes_complete_defer_or_fail(monkeypatch, error, operation, extra):
+    """Outages defer the job, oversized inputs fail it for good, other errors are retried."""
+    finished = []
+
+    async def process(refactoring_id, db, ai_service):
+        if error is not None:
+            raise error
+
+    monkeypatch.setattr(worker_module, "SessionLocal", ClosingSession)
+    monkeypatch.setattr(worker_module, "process_refactoring", process)
+    monkeypatch.setattr(worker_module.Worker, "_finish", staticmethod(lambda *args: finished.append(args)))
+
+    job_id, refactoring_id = uuid.uuid4(), uuid.uuid4()
+    worker = worker_module.Worker(ai_service=None, concurrency=1)
+    asyncio.run(worker._run_job("slot-0", job_id, refactoring_id, Schedule()))
+    assert finished == [(operation, job_id, "slot-0", *extra)]
+
+def test_reserved_slots_only_claim_interactive_jobs(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_INTERACTIVE_WORKER_SLOTS", 1)
+    slots = []
+
+    async def run_slot(self, slot_id, stop_event, max_priority=None):
+        slots.append(max_priority)
+
+    monkeypatch.setattr(worker_module.Worker, "_run_slot", run_slot)
+    asyncio.run(worker_module.Worker(ai_service=None, concurrency=3).run(asyncio.Event()))
+    assert slots == [0, None, None]
@@ -0,0 +1,154 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.routes import code_refactoring as routes
+from app.schemas.code_refactoring import CodeRefactoringBatchCreate, CodeRefactoringCreate
+from app.services.ai_refactoring import AIRefactoringService
+from app.services.language_detection import DetectionResult, get_detector
+
+# Held-out snippets, not part of the training corpus
+ACCURACY_SAMPLES = [
+    ('python', "import json\n\ndef load(path):\n    with open(path) as f:\n        return json.load(f)\n"),
+    ('python', "class Config:\n    def __init__(self, values=None):\n        self.values = values or {}\n\n    def get(self, key, default=None):\n        return self.values.get(key, default)\n"),
+    ('javascript', "const sum = (arr) => arr.reduce((a, b) => a + b, 0);\nconsole.log(sum([1, 2, 3]));\n"),
+    ('javascript', "function Counter() {\n  let count = 0;\n  return { inc: () => ++count };\n}\nmodule.exports = Counter;\n"),
+    ('typescript', "interface Props {\n  title: string;\n  count?: number;\n}\nexport const render = (props: Props): string => `${props.title}`;\n"),
+    ('typescript', "export class Queue<T> {\n  private items: T[] = [];\n  enqueue(item: T): void { this.items.push(item); }\n}\n"),
+    ('java', "public class Counter {\n    private int count = 0;\n\n    public synchronized void increment() {\n        count++;\n    }\n}\n"),
+    ('java', "import java.util.Map;\nimport java.util.HashMap;\n\npublic class Registry {\n    private final Map<String, Integer> map = new HashMap<>();\n}\n"),
+    ('cpp', "#include <string>\n#include <iostream>\n\nint main() {\n    std::string name = \"x\";\n    std::cout << name << std::endl;\n}\n"),
+    ('cpp', "class Shape {\npublic:\n    virtual double area() const = 0;\n    virtual ~Shape() = default;\n};\n"),
+    ('csharp', "using System;\n\nnamespace App\n{\n    public class Logger\n    {\n        public void Log(string msg) => Console.WriteLine(msg);\n    }\n}\n"),
+    ('csharp', "public interface IRepository<T>\n{\n    Task<T> GetAsync(int id);\n    public string Name { get; set; }\n}\n"),
+    ('go', "package util\n\nfunc Max(a, b int) int {\n    if a > b {\n        return a\n    }\n    return b\n}\n"),
+    ('go', "func handler(w http.ResponseWriter, r *http.Request) {\n    name := r.URL.Query().Get(\"name\")\n    fmt.Fprintf(w, \"Hello %s\", name)\n}\n"),
+    ('rust', "fn add(a: i32, b: i32) -> i32 {\n    a + b\n}\n\nfn main() {\n    let x = add(1, 2);\n    println!(\"{}\", x);\n}\n"),
+    ('rust', "pub struct Point {\n    x: f64,\n}\n\nimpl Point {\n    pub fn new(x: f64) -> Self {\n        Point { x }\n    }\n}\n"),
+    ('php', "<?php\n$name = $_GET['name'];\necho \"Hello \" . htmlspecialchars($name);\n"),
+    ('php', "<?php\nclass Cart {\n    private $items = [];\n    public function add($item) {\n        $this->items[] = $item;\n    }\n}\n"),
+    ('ruby', "class Dog\n  def initialize(name)\n    @name = name\n  end\n\n  def bark\n    puts \"Woof\"\n  end\nend\n"),
+    ('ruby', "require 'net/http'\n\nitems.each_with_index do |item, i|\n  puts \"#{i}: #{item}\"\nend\n"),
+    ('swift', "import SwiftUI\n\nstruct ContentView: View {\n    var body: some View {\n        Text(\"Hello\")\n    }\n}\n"),
+    ('swift', "func divide(_ a: Int, by b: Int) -> Int? {\n    guard b != 0 else { return nil }\n    return a / b\n}\n"),
+    ('kotlin', "fun greet(name: String): String {\n    val message = \"Hello, $name\"\n    return message\n}\n"),
+    ('kotlin', "class Repository(private val api: Api) {\n    suspend fun load(): List<Item> = api.items()\n}\n"),
+    ('scala', "object Main extends App {\n  val xs = List(1, 2, 3)\n  println(xs.map(_ * 2))\n}\n"),
+    ('scala', "def factorial(n: Int): Int = n match {\n  case 0 => 1\n  case _ => n * factorial(n - 1)\n}\n"),
+    ('r', "x <- c(1, 2, 3)\ny <- x * 2\nplot(x, y)\n"),
+    ('r', "add <- function(a, b) {\n  a + b\n}\nresult <- add(1, 2)\nprint(result)\n"),
+    ('matlab', "function y = double_it(x)\n    y = 2 * x;\nend\n"),
+    ('matlab', "M = zeros(3, 3);\nfor k = 1:3\n    M(k, k) = k;\nend\ndisp(M);\n"),
+    ('sql', "SELECT name, COUNT(*) FROM employees GROUP BY department ORDER BY name;\n"),
+    ('sql', "update accounts set balance = balance - 100 where id = 42;\n"),
+    ('html', "<!DOCTYPE html>\n<html>\n<body>\n  <p>Hi</p>\n</body>\n</html>\n"),
+    ('html', "<table>\n  <tr><td>1</td><td>2</td></tr>\n</table>\n<a href=\"/\">Home</a>\n"),
+    ('css', "h1 {\n  font-size: 24px;\n  margin-bottom: 10px;\n}\n\n.box {\n  border: 1px solid #000;\n}\n"),
+    ('css', "nav a:hover {\n  color: red;\n  text-decoration: none;\n}\n"),
+    ('scss', "$base: 16px;\n\n.header {\n  font-size: $base;\n  &:hover { color: blue; }\n}\n"),
+    ('scss', "@mixin rounded($r) {\n  border-radius: $r;\n}\n.btn {\n  @include rounded(4px);\n}\n"),
+    ('sass', "$base: 16px\n\n.header\n  font-size: $base\n  &:hover\n    color: blue\n"),
+    ('sass', "=rounded($r)\n  border-radius: $r\n\n.btn\n  +rounded(4px)\n"),
+]
+
+def test_detector_covers_supported_languages():
+    """Every language the service supports can be detected."""
+    assert set(get_detector().languages) == set(AIRefactoringService().supported_languages)
+
+def test_detector_accuracy_on_held_out_samples():
+    """The detector classifies held-out snippets with high accuracy."""
+    results = get_detector().predict_batch([code for _, code in ACCURACY_SAMPLES])
+    misses = [
+        (expected, result.language)
+        for (expected, _), result in zip(ACCURACY_SAMPLES, results)
+        if result.language != expected
+    ]
+    assert len(misses) <= len(ACCURACY_SAMPLES) // 10, misses
+
+def test_batch_matches_single_predictions():
+    """Batch detection returns the same results as one-by-one detection."""
+    detector = get_detector()
+    snippets = [code for _, code in ACCURACY_SAMPLES[:6]]
+    assert detector.predict_batch(snippets) == [detector.predict(code) for code in snippets]
+
+def test_empty_input_has_zero_confidence():
+    """Input without any features is reported with zero confidence."""
+    assert get_detector().predict("   \n").confidence == 0.0
+
+# Held-out single statements, the inputs most often submitted without a language
+SHORT_ACCURACY_SAMPLES = [
+    ('sql', "SELECT * FROM users;"),
+    ('sql', "select name from users where id = 3;"),
+    ('python', "print(1)"),
+    ('python', "x = 1"),
+    ('javascript', "console.log(x);"),
+    ('ruby', "puts 'hi'"),
+    ('php', "echo $name;"),
+    ('go', "fmt.Println(x)"),
+    ('r', "x <- 1"),
+    ('java', "System.out.println(x);"),
+    ('cpp', "std::cout << x;"),
+    ('html', "<h1>Title</h1>"),
+]
+
+def test_detector_accuracy_on_single_statements():
+    """Short snippets are classified correctly and confidently."""
+    results = get_detector().predict_batch([code for _, code in SHORT_ACCURACY_SAMPLES])
+    assert [(result.language, result.confident) for result in results] == [
+        (expected, True) for expected, _ in SHORT_ACCURACY_SAMPLES
+    ]
+
+def test_confident_detections_are_correct():
+    """Confidence separates reliable detections from guesses on ambiguous input."""
+    samples = ACCURACY_SAMPLES + SHORT_ACCURACY_SAMPLES
+    results = get_detector().predict_batch([code for _, code in samples])
+    assert all(result.language == expected for (expected, _), result in zip(samples, results) if result.confident)
+    assert not get_detector().predict("let x = 5").confident
+
+class BatchSession:
+    """Async session accepting a batch submission; bulk inserted rows and queued jobs are kept."""
+
+    def __init__(self):
+        self.rows = []
+        self.jobs = []
+
+    async def run_sync(self, function, items):
+        if function is routes.enqueue_refactorings:
+            self.jobs = items
+        return {}
+
+    def add(self, row):
+        self.row = row
+
+    async def flush(self):
+        self.row.id = uuid.uuid4()
+
+    async def execute(self, statement, rows):
+        if statement.table.name == "code_refactorings":
+            self.rows = rows
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, row):
+        pass
+
+def test_batch_items_with_an_ambiguous_language_fail_alone(monkeypatch):
+    """Languages of a batch are detected in one call; an undetectable item does not reject the others."""
+    calls = []
+    monkeypatch.setattr(routes, "ai_service", SimpleNamespace(
+        detect_languages=lambda codes: calls.append(codes) or [DetectionResult("python", 0.9), DetectionResult("go", 0.1)]
+    ))
+    batch = CodeRefactoringBatchCreate(items=[
+        CodeRefactoringCreate(original_code="print(1)"),
+        CodeRefactoringCreate(original_code="x"),
+        CodeRefactoringCreate(original_code="SELECT 1;", language="SQL"),
+    ])
+    db = BatchSession()
+
+    asyncio.run(routes.create_refactoring_batch(batch, db, "tenant"))
+
+    assert calls == [["print(1)", "x"]]
+    assert [(row["language"], row["status"]) for row in db.rows] == [("python", "processing"), (None, "failed"), ("sql", "processing")]
+    assert "pass language" in db.rows[1]["explanation"]
+    assert [job.refactoring_id for job in db.jobs] == [db.rows[0]["id"], db.rows[2]["id"]]
@@ -0,0 +1,66 @@
+import json
+from types import SimpleNamespace
+
+from app.services.ai_refactoring import AIRefactoringService
+from app.services.model_router import ModelRouter, record_decisions
+from app.services.result_cache import ResultCache
+
+SAMPLE_PYTHON_CODE = """
+def inefficient_sum(numbers):
+    s = 0
+    for n in numbers:
+        s += n
+    return s
+"""
+
+def make_router(**overrides) -> ModelRouter:
+    options = dict(
+        large_model="gpt-4",
+        small_model="gpt-4o-mini",
+        small_max_code_tokens=400,
+        small_max_refactor_tokens=200,
+        small_languages=["python"],
+        large_focus_areas=["security"]
+    )
+    options.update(overrides)
+    return ModelRouter(**options)
+
+def test_small_snippets_use_the_small_model():
+    """Size, language and focus areas decide the model."""
+    router = make_router()
+
+    assert router.route("explain", SAMPLE_PYTHON_CODE, "python").model == "gpt-4o-mini"
+    assert router.route("explain", SAMPLE_PYTHON_CODE * 40, "python").reason == "size"
+    assert router.route("explain", SAMPLE_PYTHON_CODE, "scala").reason == "language"
+    assert router.route("refactor", SAMPLE_PYTHON_CODE, "python", ["Security"]).reason == "focus_areas"
+    assert make_router(small_model="").route("explain", SAMPLE_PYTHON_CODE, "python").model == "gpt-4"
+
+def test_latency_budget_routes_larger_snippets_to_the_small_model():
+    """When the main model would exceed the latency budget, the faster model is used."""
+    router = make_router(latency_budget_seconds=20)
+    decision = router.route("refactor", SAMPLE_PYTHON_CODE * 10, "python")
+
+    assert decision.model == "gpt-4o-mini"
+    assert decision.reason == "budget"
+
+def test_invalid_small_model_output_escalates():
+    """Output that fails validation on the small model is redone on the main model."""
+    responses = {
+        "gpt-4o-mini": {"explanation": "no code"},
+        "gpt-4": {"refactored_code": "def efficient_sum(numbers):\n    return sum(numbers)\n", "explanation": "Used sum()."}
+    }
+
+    def create(**request):
+        message = SimpleNamespace(content=json.dumps(responses[request["model"]]))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    service = AIRefactoringService()
+    service.cache = ResultCache(persistent=False)
+    service.router = make_router()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    with record_decisions() as decisions:
+        result = service._execute("refactor", SAMPLE_PYTHON_CODE, "python", ["readability"])
+
+    assert result["explanation"] == "Used sum()."
+    assert [(decision.model, decision.escalated) for decision in decisions] == [("gpt-4", True)]
@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.models.code_refactoring import CodeRefactoring, RefactoringFeedback
+from app.routes.code_refactoring import _list_item
+from app.schemas.code_refactoring import CodeRefactoringCreate, CodeRefactoringPage
+from app.services.pagination import InvalidCursorError, decode_cursor, encode_cursor, keyset_statement, to_page
+
+def make_refactoring(index: int) -> CodeRefactoring:
+    return CodeRefactoring(
+        id=uuid.uuid4(), original_code=f"x = {index}\n", language="python", status="completed",
+        revision=1, created_at=datetime(2025, 7, 1, 12, index), updated_at=datetime(2025, 7, 1, 12, index)
+    )
+
+def test_cursor_round_trips_and_rejects_garbage():
+    """Cursors are opaque but decode back to the row position."""
+    created_at, refactoring_id = datetime(2025, 7, 1, 12, 30, 15, 250), uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, refactoring_id)) == (created_at, refactoring_id)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+
+def test_keyset_page_continues_after_the_cursor():
+    """A page filters on (created_at, id), fetches one extra row and points past its last row."""
+    statement = keyset_statement(select(CodeRefactoring), 2, encode_cursor(datetime(2025, 7, 2), uuid.uuid4()))
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "(code_refactorings.created_at, code_refactorings.id) < (" in sql
+    assert "ORDER BY code_refactorings.created_at DESC, code_refactorings.id DESC" in sql
+    assert "LIMIT" in sql
+
+    rows = [make_refactoring(index) for index in range(3)]
+    page = to_page(rows, 2)
+    assert page.items == rows[:2]
+    assert decode_cursor(page.next_cursor) == (rows[1].created_at, rows[1].id)
+    assert to_page(rows[:2], 2).next_cursor is None
+
+def test_list_items_omit_code_unless_requested():
+    """Lean items carry metadata and feedback; code bodies and diffs are opt-in."""
+    refactoring = make_refactoring(0)
+    refactoring.refactored_code = "x = 0  # zero\n"
+    refactoring.feedback = [RefactoringFeedback(
+        id=uuid.uuid4(), refactoring_id=refactoring.id, rating=5, comment=None, created_at=datetime(2025, 7, 1)
+    )]
+
+    lean = CodeRefactoringPage(items=[_list_item(refactoring, False, False, False)]).items[0]
+    assert lean.original_code is None and lean.refactored_code is None
+    assert lean.feedback[0].rating == 5
+
+    with_diff = CodeRefactoringPage(items=[_list_item(refactoring, True, False, True)]).items[0]
+    assert with_diff.refactored_code is None
+    assert "+x = 0  # zero" in with_diff.refactored_diff
+
+def test_list_items_carry_the_stored_analysis_as_is():
+    """JSONB analyses are passed through and validated only by the response model."""
+    refactoring = make_refactoring(0)
+    refactoring.feedback = []
+    refactoring.analysis_result = {
+        "complexity_score": 2,
+        "readability_score": 8,
+        "issues": [{"type": "security", "severity": "critical", "description": "eval", "line_numbers": [1]}],
+        "overall_assessment": "Risky."
+    }
+
+    item = _list_item(refactoring, False, True, False)
+    assert item["analysis_result"] is refactoring.analysis_result
+    assert CodeRefactoringPage(items=[item]).items[0].analysis_result.issues[0]["severity"] == "critical"
+
+def test_submitted_languages_are_stored_lowercase():
+    """The language filter compares lowercase, so submissions are normalized the same way."""
+    assert CodeRefactoringCreate(original_code="x = 1", language=" Python ").language == "python"
+    assert CodeRefactoringCreate(original_code="x = 1", language="").language is None
+    assert CodeRefactoringCreate(original_code="x = 1").language is None
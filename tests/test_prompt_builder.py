@@ -0,0 +1,31 @@
+import pytest
+
+from app.services.prompt_builder import PromptTooLargeError, build_request, count_tokens, fits_single_call
+
+SAMPLE_PYTHON_CODE = """
+def inefficient_sum(numbers):
+    s = 0
+    for n in numbers:
+        s += n
+    return s
+"""
+
+def test_max_tokens_scales_with_input():
+    """Larger inputs get a larger output budget, capped by the operation maximum."""
+    small = build_request("gpt-4", "refactor", SAMPLE_PYTHON_CODE, "python", ["readability"])
+    large = build_request("gpt-4", "refactor", SAMPLE_PYTHON_CODE * 20, "python", ["readability"])
+
+    assert small["model"] == "gpt-4"
+    assert small["messages"][1]["content"].count("inefficient_sum") == 1
+    assert 512 <= small["max_tokens"] < large["max_tokens"] <= 4096
+    assert count_tokens(SAMPLE_PYTHON_CODE, "gpt-4") > 0
+
+def test_oversized_input_is_rejected_before_any_call():
+    """Inputs that cannot fit the context window raise instead of truncating."""
+    huge_code = SAMPLE_PYTHON_CODE * 400
+
+    with pytest.raises(PromptTooLargeError) as excinfo:
+        build_request("gpt-4", "analyze", huge_code, "python")
+    assert excinfo.value.context_window == 8192
+    assert not fits_single_call("gpt-4", "refactor", huge_code, "python")
+    assert fits_single_call("gpt-4o", "analyze", huge_code, "python")
@@ -0,0 +1,77 @@
+import json
+
+from app.services.response_parsing import StreamingJSONParser, merge_responses, parse_json_response
+
+ANALYSIS = {
+    "complexity_score": 3,
+    "readability_score": 6,
+    "issues": [{"type": "readability", "severity": "low", "description": "Manual loop {with braces}"}],
+    "overall_assessment": "Works, but \"not\" idiomatic."
+}
+
+REFACTORING = {
+    "refactored_code": "def efficient_sum(numbers):\n    return sum(numbers)\n",
+    "explanation": "Replaced the loop with sum()."
+}
+
+def test_json_is_extracted_from_fences_and_prose():
+    """Markdown fences and text around the object are ignored."""
+    content = f"Here is the analysis:\n```json\n{json.dumps(ANALYSIS, indent=2)}\n```\nLet me know if you need more."
+    parsed = parse_json_response("analyze", content)
+
+    assert parsed.missing == []
+    assert parsed.value["overall_assessment"] == ANALYSIS["overall_assessment"]
+
+def test_truncated_stream_keeps_complete_fields_only():
+    """A cut-off string value is reported missing rather than returned truncated."""
+    content = json.dumps({"explanation": REFACTORING["explanation"], **{"refactored_code": REFACTORING["refactored_code"]}})
+    parser = StreamingJSONParser()
+    for index in range(0, len(content) - 12, 5):
+        parser.feed(content[index:index + 5])
+
+    assert not parser.complete
+    document, incomplete_key = parser.document()
+    assert document == {"explanation": REFACTORING["explanation"]}
+    assert incomplete_key == "refactored_code"
+
+def test_missing_fields_are_filled_from_a_follow_up_response():
+    """Only the missing fields need to come from the follow-up response."""
+    parsed = parse_json_response("refactor", json.dumps({"explanation": REFACTORING["explanation"]}))
+    assert parsed.missing == ["refactored_code"]
+
+    repair = parse_json_response("refactor", json.dumps({"refactored_code": REFACTORING["refactored_code"]}))
+    merged = merge_responses("refactor", parsed, repair)
+
+    assert merged.missing == []
+    assert merged.value == REFACTORING
+
+def test_invalid_analysis_fields_and_suggestions():
+    """Out-of-range analysis fields are missing; malformed suggestions are dropped."""
+    parsed = parse_json_response("analyze", json.dumps({**ANALYSIS, "complexity_score": 42}))
+    assert parsed.missing == ["complexity_score"]
+    assert "complexity_score" not in parsed.value
+
+    suggestions = parse_json_response("suggest", json.dumps({"suggestions": [{"title": "incomplete"}]}))
+    assert suggestions.missing == []
+    assert suggestions.value == {"suggestions": []}
+
+def test_streamed_field_is_decoded_as_it_arrives():
+    """Only the chosen field's text comes out, with escapes decoded even when split across fragments."""
+    code = 'print("café \U0001F600")\n\treturn "\\\\"\n'
+    content = "```json\n" + json.dumps({"refactored_code": code, "explanation": "Kept \"it\"."}) + "\n```"
+    parser = StreamingJSONParser("refactored_code")
+
+    streamed = "".join(parser.feed(content[index:index + 3]) for index in range(0, len(content), 3))
+    assert streamed == code
+    assert parser.document() == ({"refactored_code": code, "explanation": "Kept \"it\"."}, None)
+
+def test_stray_brace_before_the_json_is_skipped():
+    """A brace in the prose before the object does not hide the object."""
+    content = f"Replace the {{name}} placeholder; here is the result: {json.dumps(REFACTORING)}"
+    parsed = parse_json_response("refactor", content)
+
+    assert parsed.missing == []
+    assert parsed.value == REFACTORING
+
+    unclosed = parse_json_response("refactor", f"Note: {{ see below\n```json\n{json.dumps(REFACTORING)}\n```")
+    assert unclosed.value == REFACTORING
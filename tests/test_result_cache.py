@@ -0,0 +1,39 @@
+import time
+
+from app.services.result_cache import ResultCache
+
+SAMPLE_PYTHON_CODE = """
+def inefficient_sum(numbers):
+    s = 0
+    for n in numbers:
+        s += n
+    return s
+"""
+
+def test_cache_key_ignores_cosmetic_differences():
+    """Line endings, trailing whitespace and focus area order share a key."""
+    key = ResultCache.make_key("refactor", SAMPLE_PYTHON_CODE, "python", ["performance", "readability"], "gpt-4", "1")
+    noisy_code = SAMPLE_PYTHON_CODE.replace("\n", "  \r\n")
+    assert key == ResultCache.make_key("refactor", noisy_code, "Python", ["readability", "performance"], "gpt-4", "1")
+    assert key != ResultCache.make_key("refactor", SAMPLE_PYTHON_CODE, "python", None, "gpt-4", "1")
+    assert key != ResultCache.make_key("refactor", SAMPLE_PYTHON_CODE, "python", ["performance", "readability"], "gpt-4", "2")
+
+def test_memory_tier_lru_eviction_and_counters():
+    """The in-process tier evicts the least recently used entry."""
+    cache = ResultCache(max_entries=2, persistent=False)
+    cache.set("a", "explain", "gpt-4", "A")
+    cache.set("b", "explain", "gpt-4", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "explain", "gpt-4", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats() == {"memory_entries": 2, "memory_hits": 3, "persistent_hits": 0, "misses": 1}
+
+def test_memory_tier_ttl_expiry():
+    """Entries are not served after their TTL."""
+    cache = ResultCache(ttl_seconds=0, persistent=False)
+    cache.set("a", "explain", "gpt-4", "A")
+    time.sleep(0.01)
+    assert cache.get("a") is None
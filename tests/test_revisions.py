@@ -0,0 +1,123 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.services.revisions import refactor_revision, unit_key
+
+ORIGINAL_CODE = """import math
+
+
+def area(radius):
+    return math.pi * radius ** 2
+
+
+def perimeter(radius):
+    return 2 * math.pi * radius
+
+
+def describe(radius):
+    return f"r={radius}"
+"""
+
+REFACTORED_CODE = """import math
+
+
+def area(radius: float) -> float:
+    return math.pi * radius ** 2
+
+
+def perimeter(radius: float) -> float:
+    return math.tau * radius
+
+
+def describe(radius: float) -> str:
+    return f"r={radius}"
+"""
+
+class RecordingService:
+    def __init__(self):
+        self.refactored = []
+
+    async def refactor_code(self, code, language, focus_areas=None, example=None):
+        self.refactored.append(code)
+        return code.replace("(radius)", "(radius: float)"), "Added type hints."
+
+    async def analyze_code_quality(self, code, language, use_model=None):
+        return {"complexity_score": 2, "readability_score": 8, "issues": [], "overall_assessment": "Fine."}
+
+def make_parent(**overrides):
+    fields = dict(
+        id="parent", status="completed", language="python", revision=1, focus_areas=None,
+        original_code=ORIGINAL_CODE, refactored_code=REFACTORED_CODE, unit_results=None
+    )
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+def make_revision(code, parent):
+    return SimpleNamespace(
+        id="child", original_code=code, parent=parent, revision=parent.revision + 1, focus_areas=None,
+        refactored_code=None, explanation=None, analysis_result=None, unit_results=None
+    )
+
+def test_only_changed_units_are_refactored():
+    """Unchanged functions reuse the parent's output; the edited one goes to the model."""
+    code = ORIGINAL_CODE.replace('f"r={radius}"', 'f"radius={radius}"')
+    revision = make_revision(code, make_parent())
+    service = RecordingService()
+
+    assert asyncio.run(refactor_revision(revision, service, "python"))
+    assert len(service.refactored) == 1
+    assert "def describe(radius)" in service.refactored[0]
+    assert "def area(radius: float) -> float:" in revision.refactored_code
+    assert "math.tau * radius" in revision.refactored_code
+    assert 'def describe(radius: float):\n    return f"radius={radius}"' in revision.refactored_code
+    assert revision.analysis_result["readability_score"] == 8
+
+def test_stored_unit_results_carry_over_to_the_next_revision():
+    """A revision's unit results let the following revision reuse the model's output."""
+    code = ORIGINAL_CODE.replace('f"r={radius}"', 'f"radius={radius}"')
+    first = make_revision(code, make_parent())
+    asyncio.run(refactor_revision(first, RecordingService(), "python"))
+    first.status, first.language = "completed", "python"
+
+    stored = json.loads(first.unit_results)
+    describe_unit = 'def describe(radius):\n    return f"radius={radius}"\n'
+    assert stored[unit_key(describe_unit)].startswith("def describe(radius: float)")
+
+    second = make_revision(code, first)
+    service = RecordingService()
+    assert asyncio.run(refactor_revision(second, service, "python"))
+    assert service.refactored == []
+    assert second.refactored_code == first.refactored_code
+
+def test_not_applicable_without_a_usable_parent():
+    """Failed parents, other languages and fully rewritten files fall back to a full refactoring."""
+    service = RecordingService()
+    assert not asyncio.run(refactor_revision(make_revision(ORIGINAL_CODE, make_parent(status="failed")), service, "python"))
+    assert not asyncio.run(refactor_revision(make_revision(ORIGINAL_CODE, make_parent(language="ruby")), service, "python"))
+    assert not asyncio.run(refactor_revision(make_revision("x = 1\n", make_parent()), service, "python"))
+    assert service.refactored == []
+
+def test_parent_refactorings_that_added_units_are_redone_in_full():
+    """Helpers and imports the model added belong to no original unit, so stitching would lose them."""
+    original = "def foo(xs):\n    return len(xs)\n\n\ndef bar(xs):\n    total = 0\n    for x in xs:\n        total += x\n    return total\n"
+    refactored = (
+        "from functools import reduce\n\n\ndef _add(a, b):\n    return a + b\n\n\n"
+        "def foo(xs):\n    return len(xs)\n\n\ndef bar(xs):\n    return reduce(_add, xs, 0)\n"
+    )
+    parent = make_parent(original_code=original, refactored_code=refactored)
+    service = RecordingService()
+
+    revision = make_revision(original.replace("total += x", "total += 2 * x"), parent)
+    assert not asyncio.run(refactor_revision(revision, service, "python"))
+    assert service.refactored == []
+
+def test_revisions_with_other_focus_areas_are_redone_in_full():
+    service = RecordingService()
+    revision = make_revision(ORIGINAL_CODE.replace('f"r={radius}"', 'f"radius={radius}"'), make_parent())
+    revision.focus_areas = ["performance"]
+    assert not asyncio.run(refactor_revision(revision, service, "python"))
+
+    revision = make_revision(ORIGINAL_CODE.replace('f"r={radius}"', 'f"radius={radius}"'), make_parent(focus_areas=["Performance"]))
+    revision.focus_areas = ["performance"]
+    assert asyncio.run(refactor_revision(revision, service, "python"))
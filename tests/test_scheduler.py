@@ -0,0 +1,180 @@
+import asyncio
+from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.schemas.code_refactoring import CodeRefactoringCreate
+from app.services.job_queue import JobSpec, _virtual_finishes
+from app.services.scheduler import FairScheduler, Schedule, current_schedule, scheduling, tenant_id
+
+def run_order(scheduler: FairScheduler, schedules) -> list:
+    """Names of the schedules in the order their slots were granted, behind one held slot."""
+    order = []
+
+    async def call(name, schedule):
+        async with scheduler.slot(schedule):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot(Schedule(tenant="holder")):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        calls = []
+        for name, schedule in schedules:
+            calls.append(asyncio.create_task(call(name, schedule)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *calls)
+
+    asyncio.run(main())
+    return order
+
+def test_interactive_calls_go_before_bulk():
+    order = run_order(FairScheduler(1), [
+        ("bulk-1", Schedule("bulk", "a")),
+        ("bulk-2", Schedule("bulk", "a")),
+        ("interactive", Schedule("interactive", "b")),
+    ])
+    assert order == ["interactive", "bulk-1", "bulk-2"]
+
+def test_tenants_share_slots_fairly():
+    """A tenant with one call does not wait behind another tenant's backlog."""
+    backlog = [(f"a{i}", Schedule("bulk", "a")) for i in range(4)]
+    order = run_order(FairScheduler(1), backlog + [("b0", Schedule("bulk", "b"))])
+    assert order.index("b0") <= 1
+
+def test_weights_give_tenants_proportional_shares(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_TENANT_WEIGHTS", {"a": 2.0})
+    schedules = [(f"a{i}", Schedule("bulk", "a")) for i in range(4)] + [(f"b{i}", Schedule("bulk", "b")) for i in range(4)]
+    order = run_order(FairScheduler(1), schedules)
+    assert [name[0] for name in order[:6]].count("a") == 4
+
+def test_urgent_deadlines_jump_the_fair_share_order():
+    soon = datetime.now(UTC).replace(tzinfo=None) + timedelta(seconds=5)
+    later = soon + timedelta(days=1)
+    order = run_order(FairScheduler(1), [
+        ("first", Schedule("bulk", "a")),
+        ("not-due", Schedule("bulk", "b", later)),
+        ("due", Schedule("bulk", "c", soon)),
+    ])
+    assert order[0] == "due"
+
+def test_tenant_cap_leaves_slots_to_other_tenants():
+    scheduler = FairScheduler(4, tenant_cap=2)
+    peak = {}
+
+    async def call(tenant):
+        async with scheduler.slot(Schedule(tenant=tenant)):
+            peak[tenant] = max(peak.get(tenant, 0), scheduler.per_tenant[tenant])
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call("a") for _ in range(6)), call("b"))
+
+    asyncio.run(main())
+    assert peak == {"a": 2, "b": 1}
+    assert scheduler.in_use == 0 and len(scheduler) == 0
+
+def test_cancelled_waiters_give_up_their_place():
+    scheduler = FairScheduler(1)
+
+    async def main():
+        async with scheduler.slot():
+            waiter = asyncio.create_task(scheduler.slot().__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert len(scheduler) == 0
+        assert scheduler.in_use == 0
+
+    asyncio.run(main())
+
+def test_scheduling_sets_the_context():
+    with scheduling("bulk", "a") as schedule:
+        assert current_schedule() == schedule == Schedule("bulk", "a")
+    assert current_schedule() == Schedule()
+
+def test_tenants_are_hashed_api_keys():
+    assert tenant_id(None) == "anonymous"
+    assert tenant_id("secret") == tenant_id("secret") != tenant_id("other")
+    assert "secret" not in tenant_id("secret")
+
+def test_deadlines_are_stored_as_naive_utc():
+    item = CodeRefactoringCreate(original_code="x = 1", deadline="2025-01-01T12:00:00+02:00")
+    assert item.deadline == datetime(2025, 1, 1, 10, 0)
+    assert item.priority is None
+
+class FairShareSession:
+    """Answers the virtual time and per-tenant finish queries of ``_virtual_finishes``."""
+
+    def __init__(self, virtual_time, last):
+        self.virtual_time = virtual_time
+        self.last = last
+
+    def query(self, *columns):
+        result = SimpleNamespace(scalar=lambda: self.virtual_time, all=lambda: list(self.last.items()))
+        result.filter = result.group_by = lambda *args: result
+        return result
+
+def test_new_jobs_start_at_the_queue_virtual_time(monkeypatch):
+    """A tenant's jobs queue behind its own backlog, not behind other tenants'."""
+    monkeypatch.setattr(settings, "SCHEDULER_TENANT_WEIGHTS", {"b": 2.0})
+    db = FairShareSession(10.0, {"a": 500.0})
+    jobs = [JobSpec(None, tenant="a", cost=100), JobSpec(None, tenant="b", cost=100), JobSpec(None, tenant="b", cost=100)]
+    assert _virtual_finishes(db, jobs) == [600.0, 60.0, 110.0]
+
+def test_waiter_cancelled_while_a_slot_is_released_does_not_leak_it():
+    """A release in the same step as a waiter's cancellation hands the slot on instead of losing it."""
+    scheduler = FairScheduler(1)
+
+    async def wait(tenant):
+        async with scheduler.slot(Schedule(tenant=tenant)):
+            return tenant
+
+    async def main():
+        held = scheduler.slot(Schedule(tenant="a"))
+        await held.__aenter__()
+        cancelled = asyncio.create_task(wait("b"))
+        await asyncio.sleep(0)
+        # The waiter's future is cancelled at once, but its task only resumes after the release
+        cancelled.cancel()
+        await held.__aexit__(None, None, None)
+        outcome = await asyncio.gather(cancelled, return_exceptions=True)
+        assert isinstance(outcome[0], asyncio.CancelledError)
+        assert scheduler.in_use == 0 and not scheduler.per_tenant and len(scheduler) == 0
+        assert await asyncio.wait_for(wait("c"), timeout=1) == "c"
+
+    asyncio.run(main())
+
+def test_idle_tenants_are_forgotten():
+    """Finish tags are dropped once their tenants are idle, so one-off tenants do not accumulate."""
+    scheduler = FairScheduler(2)
+
+    async def call(tenant):
+        async with scheduler.slot(Schedule(tenant=tenant)):
+            await asyncio.sleep(0)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot(Schedule(tenant="busy")):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        await call("one-off")
+        assert "busy" in scheduler._finish
+        release.set()
+        await holder
+        for index in range(100):
+            await call(f"tenant-{index}")
+        assert not scheduler._finish
+
+    asyncio.run(main())
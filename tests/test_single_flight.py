@@ -0,0 +1,134 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.services import async_ai_refactoring
+from app.services.async_ai_refactoring import AsyncAIRefactoringService
+from app.services.job_queue import JobSpec, enqueue_refactorings, flight_key
+from app.services.result_cache import ResultCache
+from app.services.single_flight import SingleFlight
+
+class SlowCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **request):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Adds two numbers."))])
+
+def make_service() -> AsyncAIRefactoringService:
+    service = AsyncAIRefactoringService()
+    service.cache = ResultCache(persistent=False)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions()))
+    return service
+
+def test_concurrent_callers_share_one_computation():
+    """Callers arriving while a key is in flight get its result; later callers start anew."""
+    flights = SingleFlight()
+    started = []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": len(started)}
+
+    async def main():
+        results = await asyncio.gather(*(flights.run("key", compute) for _ in range(5)))
+        again = await flights.run("key", compute)
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert [result for result, _ in results] == [{"value": 1}] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert again == ({"value": 2}, False)
+    assert len(flights) == 0
+
+def test_errors_reach_every_caller():
+    """A failed computation raises in every caller waiting on it."""
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flights.run("key", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+def test_identical_model_calls_in_flight_are_made_once(monkeypatch):
+    """A burst of identical requests costs one model call; each caller gets its own result."""
+    monkeypatch.setattr(settings, "ROUTER_SMALL_MODEL", "")
+    monkeypatch.setattr(async_ai_refactoring, "in_flight", SingleFlight())
+    service = make_service()
+
+    async def burst():
+        return await asyncio.gather(*(service.explain_code("def add(a, b):\n    return a + b\n", "python") for _ in range(8)))
+
+    explanations = asyncio.run(burst())
+    assert explanations == ["Adds two numbers."] * 8
+    assert service.client.chat.completions.calls == 1
+
+class FakeJobsSession:
+    """Records enqueue statements against a table of active jobs keyed by flight key."""
+
+    def __init__(self, active=None):
+        self.active = dict(active or {})
+        self.follows = {}
+        self.raised = []
+        self.locked = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if "pg_advisory_xact_lock" in sql:
+            self.locked = params["keys"]
+        elif sql.startswith("INSERT INTO refactoring_jobs"):
+            queued = []
+            for row in params:
+                if row["flight_key"] not in self.active:
+                    queued.append(row["refactoring_id"])
+                    if row["flight_key"]:
+                        self.active[row["flight_key"]] = row["refactoring_id"]
+            return SimpleNamespace(scalars=lambda: queued)
+        elif sql.startswith("UPDATE code_refactorings"):
+            self.follows.update({row["id"]: row["follows_id"] for row in params})
+        elif sql.startswith("UPDATE refactoring_jobs"):
+            self.raised.extend(params)
+
+    def query(self, *columns):
+        # Active jobs by flight key; fair-share lookups see an empty queue
+        rows = list(self.active.items()) if columns[0].key == "flight_key" else []
+        result = SimpleNamespace(all=lambda: rows, scalar=lambda: None)
+        result.filter = result.group_by = lambda *args: result
+        return result
+
+def test_identical_submissions_follow_one_job(monkeypatch):
+    """Duplicates within a call and of jobs already in flight get no job of their own."""
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    running = uuid.uuid4()
+    in_flight_key = flight_key("x = 1\n", "python", None)
+    db = FakeJobsSession({in_flight_key: running})
+
+    ids = [uuid.uuid4() for _ in range(4)]
+    new_key = flight_key("y = 2", "Python", ["readability"])
+    keys = [new_key, flight_key("y = 2   \r\n", "python", ["readability"]), flight_key("x = 1", "python", None), None]
+    followers = enqueue_refactorings(db, [JobSpec(refactoring_id, key) for refactoring_id, key in zip(ids, keys)])
+
+    assert keys[0] == keys[1]
+    assert followers == {ids[1]: ids[0], ids[2]: running}
+    assert db.follows == followers
+    assert db.locked == sorted({new_key, in_flight_key})
+    assert db.raised == [{"key": in_flight_key, "rank": 0, "due": None}]
+
+def test_flight_keys_are_off_when_disabled(monkeypatch):
+    """Without single-flight every submission gets its own job."""
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", False)
+    assert flight_key("x = 1\n", "python", None) is None
+
+def test_tenants_only_share_flights_when_allowed(monkeypatch):
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    assert flight_key("x = 1", "python", None, tenant="a") != flight_key("x = 1", "python", None, tenant="b")
+    monkeypatch.setattr(settings, "DEDUP_ACROSS_TENANTS", True)
+    assert flight_key("x = 1", "python", None, tenant="a") == flight_key("x = 1", "python", None, tenant="b")
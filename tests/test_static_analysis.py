@@ -0,0 +1,129 @@
+import json
+from types import SimpleNamespace
+
+from app.schemas.code_refactoring import CodeAnalysisResult
+from app.services.ai_refactoring import AIRefactoringService
+from app.services.result_cache import ResultCache
+from app.services.static_analysis import analyze_code, find_duplicates, measure
+
+SAMPLE_PYTHON_CODE = """
+def classify(values, limit):
+    result = []
+    for value in values:
+        if value > limit and value % 2 == 0:
+            for factor in range(2, value):
+                if value % factor == 0:
+                    while factor < limit:
+                        if factor in result:
+                            break
+                        factor += 1
+    return [value for value in result if value]
+
+def noop():
+    pass
+"""
+
+SAMPLE_JAVASCRIPT_CODE = """
+function classify(x, y) {
+  if (x > 0 && y > 0) {
+    for (let i = 0; i < x; i++) {
+      if (i % 2 === 0) { return i; }
+    }
+  } else if (x < 0 || y < 0) {
+    return x ? 1 : 2;
+  }
+  return 0;
+}
+
+const add = (a, b) => {
+  return a?.value ?? b;
+};
+"""
+
+SAMPLE_RUBY_CODE = """
+class Store
+  def initialize
+    @items = {}
+  end
+
+  def fetch(key)
+    if @items[key]
+      @items[key]
+    elsif key.nil?
+      nil
+    else
+      raise KeyError
+    end
+  end
+
+  def self.build
+    new
+  end
+end
+"""
+
+def test_python_metrics_come_from_the_syntax_tree():
+    """Complexity counts every decision point; nesting counts control blocks."""
+    functions = {function.name: function for function in measure(SAMPLE_PYTHON_CODE, "python").functions}
+
+    assert functions["classify"].complexity == 10
+    assert functions["classify"].nesting == 6
+    assert functions["noop"].complexity == 1
+    assert functions["noop"].length == 2
+
+def test_brace_languages_use_the_token_scan():
+    """Function bodies are told apart from control blocks without a parser."""
+    analysis = measure(SAMPLE_JAVASCRIPT_CODE, "javascript")
+    functions = {function.name: function for function in analysis.functions}
+
+    assert functions["classify"].complexity == 8
+    assert functions["classify"].nesting == 3
+    assert functions["add"].complexity == 1
+    assert analysis.max_nesting == 3
+
+def test_classes_of_other_languages_are_measured_per_method():
+    """A Ruby class is not reported as one long function; each method gets its own metrics."""
+    functions = measure(SAMPLE_RUBY_CODE, "ruby").functions
+
+    assert [(function.name, function.start_line, function.end_line) for function in functions] == [
+        ("initialize", 3, 5), ("fetch", 7, 15), ("build", 17, 19)
+    ]
+    assert [function.complexity for function in functions] == [1, 3, 1]
+
+def test_duplicated_blocks_are_reported_once():
+    """A copied block is one issue, whatever its length."""
+    block = ["total = 0", "for item in items:", "    total += item.price", "    count += 1", "log(total)", "save(total)", "notify(total)"]
+    lines = ["def a():"] + ["    " + line for line in block] + ["", "def b():"] + ["    " + line for line in block]
+
+    duplicates = find_duplicates(lines)
+    assert [(block.first_line, block.second_line, block.length) for block in duplicates] == [(2, 11, 7)]
+
+def test_analysis_fills_the_api_schema_without_a_model_call():
+    """The local analysis is a valid CodeAnalysisResult with the deep nesting reported."""
+    service = AIRefactoringService()
+    service.client = None
+
+    analysis = service.analyze_code_quality(SAMPLE_PYTHON_CODE, "python")
+    CodeAnalysisResult(**analysis)
+    assert analysis == analyze_code(SAMPLE_PYTHON_CODE, "python")
+    assert [issue["type"] for issue in analysis["issues"]] == ["complexity"]
+
+def test_model_only_rewords_selected_issues():
+    """With use_model the severe issues are sent with code excerpts and reworded in place."""
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        content = json.dumps({"issues": [{"index": 0, "description": "Too deep.", "suggestion": "Flatten it."}]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    service = AIRefactoringService()
+    service.cache = ResultCache(persistent=False)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    analysis = service.analyze_code_quality(SAMPLE_PYTHON_CODE, "python", use_model=True)
+    assert len(calls) == 1
+    assert "2: def classify(values, limit):" in calls[0]["messages"][1]["content"]
+    assert analysis["issues"][0]["description"] == "Too deep."
+    assert analysis["issues"][0]["suggestion"] == "Flatten it."
+    assert analysis["complexity_score"] == analyze_code(SAMPLE_PYTHON_CODE, "python")["complexity_score"]
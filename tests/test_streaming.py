@@ -0,0 +1,190 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.routes import code_refactoring as routes
+from app.services.async_ai_refactoring import AsyncAIRefactoringService
+from app.services.result_cache import ResultCache
+from app.services.scheduler import Schedule
+
+REFACTORING = {
+    "refactored_code": "def total(numbers):\n    return sum(numbers)\n",
+    "explanation": "Replaced the \"manual\" loop with sum()."
+}
+
+class FakeStream:
+    """Async iterator over completion chunks that can fail after a number of chunks."""
+
+    def __init__(self, fragments, fail_after=None):
+        self.fragments = fragments
+        self.fail_after = fail_after
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for index, fragment in enumerate(self.fragments):
+            if index == self.fail_after:
+                raise ConnectionError("stream reset")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=fragment))])
+
+class StreamingCompletions:
+    """Streams ``content`` in small fragments; non-streamed calls answer with ``repair``."""
+
+    def __init__(self, content, fail_after=None, repair=None):
+        self.content = content
+        self.fail_after = fail_after
+        self.repair = repair
+        self.calls = []
+
+    async def create(self, stream=False, **request):
+        self.calls.append(stream)
+        if stream:
+            fragments = [self.content[index:index + 4] for index in range(0, len(self.content), 4)]
+            return FakeStream(fragments, self.fail_after)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(self.repair)))])
+
+def make_service(monkeypatch, completions) -> AsyncAIRefactoringService:
+    monkeypatch.setattr(settings, "ROUTER_SMALL_MODEL", "")
+    service = AsyncAIRefactoringService()
+    service.cache = ResultCache(persistent=False)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return service
+
+async def collect(events) -> list:
+    return [event async for event in events]
+
+def test_refactoring_streams_only_the_decoded_code(monkeypatch):
+    """Clients receive the refactored code itself, not fragments of the JSON around it."""
+    content = "```json\n" + json.dumps(REFACTORING) + "\n```"
+    service = make_service(monkeypatch, StreamingCompletions(content))
+
+    events = asyncio.run(collect(service.stream_refactor_code("def total(n): ...", "python")))
+    tokens = [value for event, value in events if event == "token"]
+
+    assert "".join(tokens) == REFACTORING["refactored_code"]
+    assert not any("{" in token or "explanation" in token for token in tokens)
+    assert events[-1] == ("result", REFACTORING)
+
+def test_interrupted_stream_is_repaired(monkeypatch):
+    """A stream cut off after the code keeps what arrived and asks only for the missing explanation."""
+    content = json.dumps(REFACTORING)
+    cut = content.index('"explanation"') // 4 + 2
+    completions = StreamingCompletions(content, fail_after=cut, repair={"explanation": "Repaired."})
+    service = make_service(monkeypatch, completions)
+
+    events = asyncio.run(collect(service.stream_refactor_code("def total(n): ...", "python")))
+
+    assert completions.calls == [True, False]
+    assert "".join(value for event, value in events if event == "token") == REFACTORING["refactored_code"]
+    assert events[-1] == ("result", {**REFACTORING, "explanation": "Repaired."})
+
+class StreamingService:
+    """Stands in for the AI service behind the streaming routes."""
+
+    async def analyze_code_quality(self, code, language):
+        return {"complexity_score": 2}
+
+    async def stream_refactor_code(self, code, language, focus_areas):
+        for text in ("def total(numbers):\n", "    return sum(numbers)\n"):
+            yield "token", text
+        yield "result", REFACTORING
+
+    async def refactor_code(self, code, language, focus_areas):
+        return REFACTORING["refactored_code"], REFACTORING["explanation"]
+
+    async def stream_explain_code(self, code, language):
+        yield "token", "Sums "
+        yield "token", "numbers."
+        yield "result", "Sums numbers."
+
+class StoringSession:
+    """Async session holding one refactoring row; commits are counted."""
+
+    def __init__(self, row):
+        self.row = row
+        self.commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def get(self, model, refactoring_id):
+        return self.row
+
+    async def run_sync(self, function, *args):
+        pass
+
+    async def commit(self):
+        self.commits += 1
+
+def parse_events(events) -> list:
+    parsed = []
+    for event in events:
+        name, data = event.strip().split("\n")
+        parsed.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return parsed
+
+def test_refactoring_stream_route_emits_tokens_then_stores_the_result(monkeypatch):
+    row = SimpleNamespace(batch_id=None, status="processing")
+    session = StoringSession(row)
+    monkeypatch.setattr(routes, "ai_service", StreamingService())
+    monkeypatch.setattr(routes, "async_session", lambda: session)
+    refactoring_id = uuid.uuid4()
+
+    events = parse_events(asyncio.run(collect(routes._stream_refactoring(
+        refactoring_id, "def total(n): ...", "python", None, Schedule()
+    ))))
+
+    assert [name for name, _ in events] == ["created", "token", "token", "result"]
+    assert "".join(data["text"] for name, data in events if name == "token") == REFACTORING["refactored_code"]
+    assert events[-1][1]["refactored_code"] == REFACTORING["refactored_code"]
+    assert events[-1][1]["analysis_result"] == {"complexity_score": 2}
+    assert (row.status, row.refactored_code, session.commits) == ("completed", REFACTORING["refactored_code"], 1)
+
+def test_code_too_large_for_one_call_is_refactored_in_chunks(monkeypatch):
+    """Without a single call to stream, only the stored result is emitted."""
+    row = SimpleNamespace(batch_id=None, status="processing")
+    monkeypatch.setattr(routes, "ai_service", StreamingService())
+    monkeypatch.setattr(routes, "async_session", lambda: StoringSession(row))
+
+    events = parse_events(asyncio.run(collect(routes._stream_refactoring(
+        uuid.uuid4(), "def total(n): ...", "python", None, Schedule(), stream=False
+    ))))
+
+    assert [name for name, _ in events] == ["created", "result"]
+    assert row.refactored_code == REFACTORING["refactored_code"]
+
+def test_failed_stream_reports_an_error_and_queues_a_job(monkeypatch):
+    """A non-transient failure ends the stream with an error event; a worker takes the job over."""
+    class FailingService(StreamingService):
+        async def stream_refactor_code(self, code, language, focus_areas):
+            raise ValueError("prompt too large")
+            yield
+
+    queued = []
+    monkeypatch.setattr(routes, "ai_service", FailingService())
+    monkeypatch.setattr(routes, "_enqueue_stream_job", lambda *args: queued.append(args))
+    refactoring_id = uuid.uuid4()
+
+    events = parse_events(asyncio.run(collect(routes._stream_refactoring(
+        refactoring_id, "def total(n): ...", "python", None, Schedule()
+    ))))
+
+    assert events[-1] == ("error", {"id": str(refactoring_id), "status": "processing", "detail": "prompt too large"})
+    assert queued == [(refactoring_id, Schedule(), len("def total(n): ..."))]
+
+def test_explanation_stream_route_emits_tokens_then_the_explanation(monkeypatch):
+    monkeypatch.setattr(routes, "ai_service", StreamingService())
+
+    events = parse_events(asyncio.run(collect(routes._stream_explanation("def total(n): ...", "python", "a"))))
+
+    assert events == [
+        ("token", {"text": "Sums "}),
+        ("token", {"text": "numbers."}),
+        ("result", {"explanation": "Sums numbers.", "language": "python"})
+    ]
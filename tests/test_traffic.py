@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.services.traffic import CircuitBreaker, CircuitOpenError, ModelUnavailableError, TokenBucket, TrafficController
+
+def rate_limit_error(retry_after: str) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+def test_token_bucket_paces_beyond_capacity():
+    """Reservations beyond the bucket capacity wait for the refill."""
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(30) == pytest.approx(30.0, abs=0.1)
+    assert not bucket.try_take(1)
+
+def test_transient_errors_are_retried_until_success():
+    """429s are retried; a bad request is raised immediately."""
+    controller = TrafficController(max_retries=3, retry_base_seconds=0.001)
+    outcomes = [rate_limit_error("0"), rate_limit_error("0"), "ok"]
+
+    def send():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert controller.call(send, tokens=100) == "ok"
+    assert controller.breaker.state == "closed"
+
+    with pytest.raises(ValueError):
+        controller.call(lambda: (_ for _ in ()).throw(ValueError("bad request")), tokens=100)
+
+def test_circuit_opens_and_fails_fast():
+    """Exhausted retries open the circuit; further calls fail without reaching the model."""
+    controller = TrafficController(max_retries=1, retry_base_seconds=0.001, failure_threshold=2, reset_seconds=60)
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise rate_limit_error("0")
+
+    with pytest.raises(ModelUnavailableError):
+        controller.call(send, tokens=100)
+    with pytest.raises(CircuitOpenError) as excinfo:
+        controller.call(send, tokens=100)
+    assert len(calls) == 2
+    assert excinfo.value.retry_after > 0
+
+def test_half_open_trial_closes_circuit():
+    """After the reset timeout a single trial call decides the circuit state."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_cancelled_trial_does_not_keep_circuit_open():
+    """A half-open trial cancelled before it answers lets the next call make the trial."""
+    controller = TrafficController(failure_threshold=1, reset_seconds=0)
+    controller.breaker.record_failure()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def answer():
+        return "ok"
+
+    async def main():
+        trial = asyncio.create_task(controller.acall(hang, tokens=1))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        return await controller.acall(answer, tokens=1)
+
+    assert asyncio.run(main()) == "ok"
+    assert controller.breaker.state == "closed"